@@ -1,18 +1,28 @@
-import math
-
-
-def recursive_step(n):
-    sum = 0
-    for i in range(n):
-        a = math.pow(3, n-i-1) * math.pow(-1, i)
-        sum += a
-    return sum
+# the number of distinct 4 colorings of a cycle of length n > 1 is
+#
+#   sum_{m=1}^{n-2} (3^m - (-1)^m) / 4 + (1 + (-1)^n) / 2
+#     = (3^(n-1) + 3 * (-1)^n + 2) / 8
+#
+# which is always an integer. It is computed with python integers, so it is
+# exact for any n (floats are not past 3^n > 2^53)
 
 
 def calc_distinct_4_colorings_for_cycle(n):
     if (n == 1) or (n == 2):
         return 1
-    sum = 0
-    for i in range(n-2):
-        sum += recursive_step(i + 1)
-    return int(sum + (1 - math.pow(-1, n-1))/2)
+    sign = 1 if n % 2 == 0 else -1
+    return (3 ** (n - 1) + 3 * sign + 2) // 8
+
+
+# this will lazily generate the number of distinct 4 colorings of cycles of
+# length first to last (both included) as (n, number) pairs, each power of 3
+# being obtained from the previous one
+def iter_calc_distinct_4_colorings_for_cycles(first, last):
+    power = 3 ** (max(first, 2) - 1)
+    for n in range(first, last + 1):
+        if n < 2:
+            yield n, 1
+            continue
+        sign = 1 if n % 2 == 0 else -1
+        yield n, (power + 3 * sign + 2) // 8
+        power *= 3
@@ -3,31 +3,53 @@
 """Graph Coloring Utils CLI
 Usage:
   gcutils distinct_4_colorings_for_cycle <v> [--count | --calc | --compare]
+  gcutils distinct_4_colorings_for_cycle <v> [--output=<file>]
+  gcutils distinct_4_colorings_for_cycle --range=<a:b> [--output=<file>]
 
 Options:
   -h --help               Show help info
   --version               Show version
                           (you will need to have 'syk --test up' running)
-  --count                 Count the number of colorings individually
+  --count                 Count the number of colorings as they are generated
+                          (without generating each of them, but for v <= 16,
+                          where they are also generated and counted as a check)
   --calc                  Count the number of colorings using a formula
-  --compare               Compare the --count and --calc values
+  --compare               Compare the --count and --calc values (and the
+                          number of generated colorings for v <= 16)
+  --range=<a:b>           Compare the --count and --calc values for every v
+                          from a to b (both included), as a table (with the
+                          number of generated colorings for v <= 16)
+  -o --output=<file>      Write the colorings (or the table) to a file
+                          instead of stdout
 
 Description:
   distinct_4_colorings_for_cycle    Given a chordless cycle with v vertices,
                                     this will return all of the distinct,
-                                    valid 4 colorings of that cycle
+                                    valid 4 colorings of that cycle, one
+                                    per line as they are found
 """
+from itertools import islice
+
 from docopt import docopt
 from .__init__ import __version__
 
 from .find_distinct_4_colorings_for_cycle import (
-    find_distinct_4_colorings_for_cycle
+    count_distinct_4_colorings_for_cycle,
+    count_generated_distinct_4_colorings_for_cycle,
+    iter_count_distinct_4_colorings_for_cycles,
+    iter_distinct_4_colorings_for_cycle
 )
 from .calc_distinct_4_colorings_for_cycle import (
-    calc_distinct_4_colorings_for_cycle
+    calc_distinct_4_colorings_for_cycle,
+    iter_calc_distinct_4_colorings_for_cycles
 )
 
 
+# cycles up to this length also have their distinct colorings generated and
+# counted one by one, to check the generator against the --count value
+MAX_GENERATED_V = 16
+
+
 class bcolors:
     HEADER = '\033[95m'
     OKBLUE = '\033[94m'
@@ -47,10 +69,78 @@ def print_success(msg):
     print(bcolors.OKGREEN + msg + bcolors.ENDC)
 
 
+def write_lines(lines, output):
+    if output:
+        with open(output, 'w') as outfile:
+            for line in lines:
+                outfile.write(line + '\n')
+    else:
+        for line in lines:
+            print(line)
+
+
+# returns the first and last v of an 'a:b' range, None if it is not a valid
+# range of cycle lengths
+def parse_range(text):
+    try:
+        first, last = (int(bound) for bound in text.split(':'))
+    except ValueError:
+        return None
+    if first < 3 or last < first:
+        return None
+    return first, last
+
+
+# this will generate the lines of a table of the counted and calculated
+# values for every v from first to last (and of the number of generated
+# colorings, for v up to MAX_GENERATED_V), adding the v of the rows where they
+# are not equal to mismatches
+def compare_range(first, last, mismatches):
+    yield '\t'.join(['v', 'counted', 'generated', 'calculated', 'equal'])
+    counted = islice(
+        iter_count_distinct_4_colorings_for_cycles(), first - 3, last - 2
+    )
+    calculated = iter_calc_distinct_4_colorings_for_cycles(first, last)
+    for (v, calced_colorings), counted_colorings in zip(calculated, counted):
+        generated = '-'
+        equal = counted_colorings == calced_colorings
+        if v <= MAX_GENERATED_V:
+            generated_colorings = (
+                count_generated_distinct_4_colorings_for_cycle(v)
+            )
+            generated = str(generated_colorings)
+            equal = equal and generated_colorings == counted_colorings
+        if not equal:
+            mismatches.append(v)
+        yield '\t'.join([
+            str(v),
+            str(counted_colorings),
+            generated,
+            str(calced_colorings),
+            'yes' if equal else 'no'
+        ])
+
+
 def main():
     args = docopt(__doc__, version=__version__)
 
-    if args['distinct_4_colorings_for_cycle']:
+    if args['distinct_4_colorings_for_cycle'] and args['--range']:
+        bounds = parse_range(args['--range'])
+        if bounds is None:
+            print_fail(
+                "--range must be a:b with integers 3 <= a <= b"
+            )
+            return
+
+        mismatches = []
+        write_lines(compare_range(bounds[0], bounds[1], mismatches),
+                    args['--output'])
+        if mismatches:
+            print_fail('Not equal for v = ' + ', '.join(map(str, mismatches)))
+        else:
+            print_success('Equal')
+
+    elif args['distinct_4_colorings_for_cycle']:
         v = None
         non_int = False
 
@@ -64,23 +154,34 @@ def main():
             return
 
         if args['--count']:
-            colorings = find_distinct_4_colorings_for_cycle(v)
-            print(len(colorings))
+            counted_colorings = count_distinct_4_colorings_for_cycle(v)
+            print(counted_colorings)
+            if v <= MAX_GENERATED_V:
+                generated_colorings = (
+                    count_generated_distinct_4_colorings_for_cycle(v)
+                )
+                if generated_colorings != counted_colorings:
+                    print_fail('Generated: ' + str(generated_colorings))
         elif args['--calc']:
             calced_colorings = calc_distinct_4_colorings_for_cycle(v)
             print(calced_colorings)
         elif args['--compare']:
-            colorings = find_distinct_4_colorings_for_cycle(v)
             calced_colorings = calc_distinct_4_colorings_for_cycle(v)
-            counted_colorings = len(colorings)
+            counted_colorings = count_distinct_4_colorings_for_cycle(v)
+            generated_colorings = counted_colorings
             print('Counted: ', counted_colorings)
+            if v <= MAX_GENERATED_V:
+                generated_colorings = (
+                    count_generated_distinct_4_colorings_for_cycle(v)
+                )
+                print('Generated: ', generated_colorings)
             print('Calculated: ', calced_colorings)
-            if counted_colorings == calced_colorings:
+            if counted_colorings == calced_colorings == generated_colorings:
                 print_success('Equal')
             else:
                 print_fail('Not equal')
 
         else:
-            colorings = find_distinct_4_colorings_for_cycle(v)
-            for coloring in colorings:
-                print(coloring)
+            write_lines(
+                iter_distinct_4_colorings_for_cycle(v), args['--output']
+            )
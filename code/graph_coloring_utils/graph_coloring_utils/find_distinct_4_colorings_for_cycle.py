@@ -12,6 +12,14 @@
 #
 # a set of distinct colorings D is a set of colorings where no element in D
 # can be obtained via any number of color swaps of any other element in D
+#
+# color swaps can relabel the colors of a coloring in any way, so every set of
+# colorings obtained from one another by color swaps has exactly one coloring
+# whose colors first appear in the order 1, 2, 3, 4 (its 'canonical' coloring,
+# also the first one of the set when colorings are sorted). Distinct colorings
+# are generated directly as the canonical ones
+
+from itertools import islice
 
 COLORS = ['1', '2', '3', '4']
 COLORSWAPS = [
@@ -24,43 +32,51 @@ COLORSWAPS = [
 ]
 
 
-# this is a recursive function to get all of the possible colorings of for the
-# all of the vertices up to the ith vertex in a cycle of length n given the
-# previous i vertices have the coloring specificed
-def find_4_colorings_recursion(coloring, n, i):
-    new_colorings = []
-    for color in COLORS:
+# this will lazily generate all of the possible colorings (lists of colors) of
+# a cycle of length n, vertex by vertex: the colors of each vertex are tried in
+# order, so colorings come out sorted. Rather than recursing, the colors tried
+# so far for each vertex are kept in a stack, so only the coloring being built
+# is held in memory
+def iter_4_colorings(n):
+    coloring = []
+    # index in COLORS of the next color to try for each vertex colored so far
+    # (the last one is the vertex being colored)
+    next_colors = [0]
+    while next_colors:
+        i = len(next_colors)
+        color_index = next_colors[-1]
+        # every color was tried for this vertex, go back to the previous one
+        if color_index == len(COLORS):
+            next_colors.pop()
+            if coloring:
+                coloring.pop()
+            continue
+        next_colors[-1] += 1
+        color = COLORS[color_index]
         # next color cannot be same color as last color
-        if (len(coloring)) and (color == coloring[len(coloring) - 1]):
+        if coloring and color == coloring[-1]:
             continue
         # color that completes the cycle cannot be same color as first color
         # (in addition to condition above)
-        elif (len(coloring)) and (n < (i + 1)) and color == coloring[0]:
+        if coloring and i >= n and color == coloring[0]:
             continue
-        # add this color to our coloring
-        new_colorings = new_colorings + [coloring + [color]]
-
-    # if we have just found the last vertex in our cycle, exit
-    if n < (i + 1):
-        return new_colorings
-    else:
-        _all_colorings = []
-        # for all of our new colorings up to the ith vertex, find all of
-        # the colorings up to the (i + 1)th vertex
-        for new_coloring in new_colorings:
-            _new_colorings = find_4_colorings_recursion(new_coloring, n, i + 1)
-            _all_colorings = _all_colorings + _new_colorings
-        return _all_colorings
+        # if we have just colored the last vertex in our cycle, we have a
+        # coloring
+        if i >= n:
+            yield coloring + [color]
+            continue
+        coloring.append(color)
+        next_colors.append(0)
+
+
+# this will lazily generate all the possible colorings for a cycle of length n
+def iter_4_colorings_for_cycle(n):
+    return ('.'.join(coloring) for coloring in iter_4_colorings(n))
 
 
 # this will return all the possible colorings for a cycle of length n
 def find_4_colorings_for_cycle(n):
-    return list(map(
-            lambda coloring: '.'.join(
-                list(map(lambda color: str(color), coloring))
-            ),
-            find_4_colorings_recursion([], n, 1)
-            ))
+    return list(iter_4_colorings_for_cycle(n))
 
 
 # this will swap color A with color B for a particular coloring
@@ -94,22 +110,114 @@ def find_all_swaps(root_coloring):
     return prev_swaps
 
 
+# this will lazily generate all of the distinct valid 4 colorings of a cycle
+# of length n (lists of colors), sorted, like iter_4_colorings but only trying
+# the colors already used and the first unused one for each vertex. Every
+# partial coloring can be completed (the last vertex always has a color left
+# for n > 1), so each coloring takes O(n) to generate
+def iter_distinct_4_colorings(n):
+    coloring = []
+    # index in COLORS of the next color to try for each vertex colored so far
+    # (the last one is the vertex being colored)
+    next_colors = [0]
+    # number of colors used by the vertices before each vertex
+    used_colors = [0]
+    while next_colors:
+        i = len(next_colors)
+        color_index = next_colors[-1]
+        # every color was tried for this vertex, go back to the previous one
+        if color_index > used_colors[-1] or color_index == len(COLORS):
+            next_colors.pop()
+            used_colors.pop()
+            if coloring:
+                coloring.pop()
+            continue
+        next_colors[-1] += 1
+        color = COLORS[color_index]
+        # next color cannot be same color as last color
+        if coloring and color == coloring[-1]:
+            continue
+        # color that completes the cycle cannot be same color as first color
+        # (in addition to condition above)
+        if coloring and i >= n and color == coloring[0]:
+            continue
+        if i >= n:
+            yield coloring + [color]
+            continue
+        coloring.append(color)
+        next_colors.append(0)
+        used_colors.append(max(used_colors[-1], color_index + 1))
+
+
+# this will lazily generate all of the distinct valid 4 colorings of a cycle
+# of length n
+def iter_distinct_4_colorings_for_cycle(n):
+    return ('.'.join(coloring) for coloring in iter_distinct_4_colorings(n))
+
+
 # this will return all of the distinct valid 4 colorings of a cycle of length n
 def find_distinct_4_colorings_for_cycle(n):
-    colorings = find_4_colorings_for_cycle(n)
-    valid_colorings = []
-    coloring_dict = {}
-
-    for coloring in colorings:
-        coloring_dict[coloring] = True
-
-    for coloring in colorings:
-        if coloring_dict[coloring]:
-            valid_colorings = valid_colorings + [coloring]
-            coloring_dict[coloring] = 'ROOT'
-            swaps = find_all_swaps(coloring)
-            for swap in swaps:
-                if not coloring_dict[swap] == 'ROOT':
-                    coloring_dict[swap] = False
-
-    return valid_colorings
+    return list(iter_distinct_4_colorings_for_cycle(n))
+
+
+# this will count the colorings iter_distinct_4_colorings generates for a
+# cycle of length n by generating them (only feasible for small n, see
+# count_distinct_4_colorings_for_cycle)
+def count_generated_distinct_4_colorings_for_cycle(n):
+    return sum(1 for _ in iter_distinct_4_colorings(n))
+
+
+# this will extend partial colorings, counted by (colors used, last vertex has
+# the first color), by one vertex that does not close the cycle
+def extend_partial_colorings(counts):
+    next_counts = {}
+    for (used, last_is_first), partial_colorings in counts.items():
+        choices = []
+        if not last_is_first:
+            choices.append(((used, True), 1))
+        # the other colors already used, but the last one
+        others = used - 1 if last_is_first else used - 2
+        if others:
+            choices.append(((used, False), others))
+        if used < len(COLORS):
+            choices.append(((used + 1, False), 1))
+        for state, ways in choices:
+            next_counts[state] = (
+                next_counts.get(state, 0) + partial_colorings * ways
+            )
+    return next_counts
+
+
+# this will count the colorings completing partial colorings with a last
+# vertex, which has neither the first color nor the color before it
+def complete_partial_colorings(counts):
+    total = 0
+    for (used, last_is_first), partial_colorings in counts.items():
+        others = used - 1 if last_is_first else used - 2
+        if used < len(COLORS):
+            others += 1
+        total += partial_colorings * others
+    return total
+
+
+# this will lazily generate the number of colorings iter_distinct_4_colorings
+# generates for cycles of length 3, 4, 5... without generating them: the
+# choices left for a vertex only depend on how many colors are used so far and
+# on whether the last vertex has the first color, so the partial colorings
+# are counted by those two values, vertex by vertex, and the partial colorings
+# of each length are completed into the colorings of the next one
+def iter_count_distinct_4_colorings_for_cycles():
+    # (colors used, last vertex has the first color) -> partial colorings
+    counts = {(1, True): 1}
+    while True:
+        counts = extend_partial_colorings(counts)
+        yield complete_partial_colorings(counts)
+
+
+# this will count the colorings iter_distinct_4_colorings generates for a
+# cycle of length n (see iter_count_distinct_4_colorings_for_cycles)
+def count_distinct_4_colorings_for_cycle(n):
+    if n < 3:
+        return 1
+    counts = iter_count_distinct_4_colorings_for_cycles()
+    return next(islice(counts, n - 3, None))
@@ -2,21 +2,98 @@
 API for returning an anlyzing planar graphs
 """
 
+from contextlib import contextmanager
 import json
-from flask import Flask, Markup, request # pylint: disable=E0401
+import math
+import os
+import time
+from flask import Flask, Response, request # pylint: disable=E0401
 from flask_cors import CORS # pylint: disable=E0401
 
-from src.maximally_connected_planar_graph import MaximallyConnectedPlanarGraph
+from src.artifact_cache import (
+    ArtifactCache, artifact_key, choose_encoding, etag_matches, join_blocks
+)
+from src.generation_jobs import GenerationJobs
+from src.graph_arrays import COLUMN_FIELDS
+from src.metrics import METRICS
+from src.single_flight import file_lock
+from src.tiles import MAX_ZOOM, TILE_SIZE, is_tile
+from src.graph_cache import GraphCache
+from src.maximally_connected_planar_graph import (
+    MaximallyConnectedPlanarGraph, DATA_DIR, GRAPH_STORE, PIPELINE_VERSION
+)
 
 APP = Flask(__name__)
 CORS(APP)
 
+GRAPH_CACHE = GraphCache(int(os.environ.get('GRAPH_CACHE_MAX_SIZE', 512 * 1024 * 1024)))
+# arrays shared by every server process (see graph_store)
+GRAPH_STORE.max_size = int(os.environ.get('GRAPH_STORE_MAX_SIZE', 1024 * 1024 * 1024))
+
+ARTIFACT_CACHE = ArtifactCache(
+    DATA_DIR, int(os.environ.get('ARTIFACT_CACHE_MAX_SIZE', 256 * 1024 * 1024))
+)
+# seconds browsers and proxies may reuse an artifact without revalidating it
+ARTIFACT_MAX_AGE = int(os.environ.get('ARTIFACT_MAX_AGE', 60))
+
+GENERATION_JOBS = GenerationJobs(workers=int(os.environ.get('GENERATION_WORKERS', 2)))
+
+@APP.before_request
+def start_profile():
+    """ collects the pipeline stages of requests with the profile flag """
+    # in case a failed request left its profile behind
+    METRICS.stop_profile()
+    if request.args.get('profile'):
+        request.profile_start = time.perf_counter()
+        METRICS.start_profile()
+
+@APP.after_request
+def add_profile(response):
+    """ returns the stage breakdown of profiled requests in a Server-Timing header """
+    stages = METRICS.stop_profile()
+    if stages is not None:
+        stages.append(('total', time.perf_counter() - request.profile_start))
+        response.headers['Server-Timing'] = ', '.join(
+            '{};dur={:.3f}'.format(stage, seconds * 1000) for stage, seconds in stages
+        )
+    return response
+
+def get_graph(seed, num_points):
+    """ returns the graph for a seed, from the in-process cache if possible """
+    # graphs edited by another server process have a newer revision
+    return GRAPH_CACHE.get(
+        (seed, PIPELINE_VERSION, MaximallyConnectedPlanarGraph.revision(seed)),
+        lambda: MaximallyConnectedPlanarGraph(seed, num_points=num_points)
+    )
+
+@contextmanager
+def edited_graph(seed):
+    """ loads a stored graph to edit it, saving the edits (one editor per seed at a time) """
+    with file_lock(os.path.join(DATA_DIR, seed, 'edit.lock')):
+        triangle = MaximallyConnectedPlanarGraph(seed)
+        yield triangle
+        triangle.save_edits()
+        GRAPH_CACHE.invalidate(seed)
+
+def edit_planar_graph(seed, edit):
+    """ applies an edit to a stored graph, answering with the edit's result """
+    error = stored_graph_error(seed)
+    if error:
+        return error
+    try:
+        with edited_graph(seed) as triangle:
+            result = edit(triangle)
+    except ValueError as error:
+        return (str(error), 400)
+    return json.dumps(dict(result, revision=MaximallyConnectedPlanarGraph.revision(seed)))
+
 # this will return the probabilities associated with a particular user
 @APP.route("/planar-graphs", methods=['GET', 'DELETE'])
 def delete_all_planar_graphs():
     """ delete all planar graphs """
     if request.method == "DELETE":
         MaximallyConnectedPlanarGraph.delete_all()
+        GRAPH_CACHE.invalidate()
         return ('', 204)
     results = MaximallyConnectedPlanarGraph.list_all()
     return json.dumps(results)
@@ -24,21 +101,253 @@ def delete_all_planar_graphs():
 @APP.route('/planar-graphs/<seed>', methods=['DELETE'])
 def planar_graph(seed):
     """ delete planar graphs with specific seed """
+    if not MaximallyConnectedPlanarGraph.is_valid_seed(seed):
+        return ('Invalid seed', 400)
     MaximallyConnectedPlanarGraph.delete(seed)
+    GRAPH_CACHE.invalidate(seed)
     return ('', 204)
 
+@APP.route('/planar-graphs/<seed>', methods=['POST'])
+def generate_planar_graph(seed):
+    """ queues the generation of the planar graph with a specific seed """
+    if not MaximallyConnectedPlanarGraph.is_valid_seed(seed):
+        return ('Invalid seed', 400)
+    if MaximallyConnectedPlanarGraph.is_complete(seed):
+        return json.dumps({'job': None, 'status': 'done'})
+    num_points = request.args.get('num-points', default=200, type=int)
+    job = GENERATION_JOBS.submit(seed, num_points)
+    return job_response(job)
+
+@APP.route('/planar-graphs/<seed>/points', methods=['POST'])
+def insert_point(seed):
+    """ adds a point ({"x": ..., "y": ...}) to a planar graph """
+    point = request.get_json(force=True, silent=True) or {}
+    if not all(isinstance(point.get(key), (int, float)) for key in ('x', 'y')):
+        return ('Expected {"x": number, "y": number}', 400)
+    return edit_planar_graph(
+        seed, lambda triangle: {'node_id': triangle.insert_point(point['x'], point['y'])}
+    )
+
+@APP.route('/planar-graphs/<seed>/points/<int:node_id>', methods=['DELETE'])
+def remove_point(seed, node_id):
+    """
+    removes a node from a planar graph. The last node takes its id, which is
+    reported as {"moved": {"from": <old id>, "to": <node id>}} (null if the
+    last node was the one removed)
+    """
+    def edit(triangle):
+        moved_from = triangle.remove_point(node_id)
+        return {'moved': None if moved_from is None else {'from': moved_from, 'to': node_id}}
+    return edit_planar_graph(seed, edit)
+
+def coordinate_args(*names):
+    """ the given query arguments as finite numbers, None if any is missing or invalid """
+    values = [request.args.get(name, default=None, type=float) for name in names]
+    if any(value is None or not math.isfinite(value) for value in values):
+        return None
+    return values
+
+def stored_graph_error(seed):
+    """
+    the response for a seed whose graph cannot be read yet (None if it can):
+    404 if it was never generated, else as for generating_graph_response
+    (graphs stored by an older pipeline are rebuilt by a job)
+    """
+    if (
+            seed not in MaximallyConnectedPlanarGraph.list_all() and
+            GENERATION_JOBS.active(seed) is None
+    ):
+        return ('', 404)
+    return generating_graph_response(seed)
+
+def generating_graph_response(seed):
+    """
+    202 pointing to the generation job of a seed whose graph is not stored
+    yet, queuing one if there is none (None if the graph is stored), so
+    requests never generate a graph themselves. If the seed's last job
+    failed, its error is returned until a POST queues another one
+    """
+    if MaximallyConnectedPlanarGraph.is_complete(seed):
+        return None
+    job = GENERATION_JOBS.active(seed) or GENERATION_JOBS.failed(seed)
+    if job is None:
+        num_points = request.args.get('num-points', default=200, type=int)
+        job = GENERATION_JOBS.submit(seed, num_points)
+    return job_response(job)
+
+def query_planar_graph(seed, names, query):
+    """ answers a point location query (see SpatialIndex) on a stored graph """
+    error = stored_graph_error(seed)
+    if error:
+        return error
+    values = coordinate_args(*names)
+    if values is None:
+        return ('Expected numbers for {}'.format(', '.join(names)), 400)
+    return Response(json.dumps(query(get_graph(seed, None), *values)), mimetype='application/json')
+
+@APP.route('/planar-graphs/<seed>/nearest-node', methods=['GET'])
+def nearest_node(seed):
+    """ id of the node nearest to a point (?x=...&y=...) and its distance to it """
+    def query(triangle, x_coord, y_coord):
+        node_id, distance = triangle.nearest_node(x_coord, y_coord)
+        return {'node_id': node_id, 'distance': distance}
+    return query_planar_graph(seed, ('x', 'y'), query)
+
+@APP.route('/planar-graphs/<seed>/containing-triangle', methods=['GET'])
+def containing_triangle(seed):
+    """ node ids of the triangle containing a point (?x=...&y=...), null outside the graph """
+    return query_planar_graph(
+        seed, ('x', 'y'),
+        lambda triangle, x_coord, y_coord: {
+            'node_ids': triangle.containing_triangle(x_coord, y_coord)
+        }
+    )
+
+@APP.route('/planar-graphs/<seed>/nodes', methods=['GET'])
+def nodes_in_rect(seed):
+    """ ids of the nodes inside a rectangle (?min-x=...&min-y=...&max-x=...&max-y=...) """
+    return query_planar_graph(
+        seed, ('min-x', 'min-y', 'max-x', 'max-y'),
+        lambda triangle, *rect: {'node_ids': triangle.nodes_in_rect(*rect)}
+    )
+
+@APP.route('/jobs/<job_id>', methods=['GET'])
+def generation_job(job_id):
+    """ status, stage and progress of a generation job """
+    job = GENERATION_JOBS.get(job_id)
+    if job is None:
+        return ('', 404)
+    return json.dumps(job)
+
+def job_response(job):
+    """ 202 pointing to a queued or running generation job, 500 for a failed one """
+    if job['status'] == 'failed':
+        return Response(json.dumps(job), status=500, mimetype='application/json')
+    return Response(
+        json.dumps(job),
+        status=202,
+        mimetype='application/json',
+        headers={'Location': '/jobs/{}'.format(job['id']), 'Retry-After': '1'}
+    )
+
+@APP.route('/metrics', methods=['GET'])
+def metrics():
+    """ process metrics in the Prometheus text format """
+    stats = GRAPH_CACHE.stats()
+    store = GRAPH_STORE.stats()
+    text = METRICS.render([
+        ('graph_cache_requests_total', 'counter', 'Graph requests by result in the graph cache', {
+            (('result', 'hit'),): stats['hits'], (('result', 'miss'),): stats['misses']
+        }),
+        ('graph_cache_entries', 'gauge', 'Graphs in the graph cache', {(): stats['entries']}),
+        ('graph_cache_bytes', 'gauge', 'Approximate size of the graph cache', {(): stats['size']}),
+        ('graph_store_segments', 'gauge', 'Segments in the shared graph store', {
+            (('state', 'attached'),): store['attached'],
+            (('state', 'detached'),): store['segments'] - store['attached']
+        }),
+        ('graph_store_attachments', 'gauge', 'Segments attached by this process', {
+            (): store['attachments']
+        }),
+        ('graph_store_bytes', 'gauge', 'Size of the shared graph store', {(): store['size']}),
+        ('artifact_cache_bytes', 'gauge', 'Size of the on-disk artifact cache', {
+            (): ARTIFACT_CACHE.stats()['size']
+        })
+    ])
+    return Response(text, mimetype='text/plain; version=0.0.4')
+
+@APP.route('/graph-cache', methods=['GET'])
+def graph_cache_stats():
+    """ hit/miss counters and size of the graph cache, the shared store and the artifact cache """
+    return json.dumps(dict(
+        GRAPH_CACHE.stats(), store=GRAPH_STORE.stats(), artifacts=ARTIFACT_CACHE.stats()
+    ))
+
+def artifact_response(seed, name, params, mimetype, render):
+    """
+    Serves a rendered artifact from the on-disk cache. On a miss, it is
+    rendered (render() returns an iterable of text chunks) and sent chunk by
+    chunk while it is cached. Answers with 304 if the client already has it,
+    without building the graph. Profiled requests skip the cache and render
+    the artifact before answering, so their profile covers the rendering
+    """
+    if not MaximallyConnectedPlanarGraph.is_valid_seed(seed):
+        return ('', 404)
+    if request.args.get('profile'):
+        return Response(
+            b''.join(join_blocks(render())), mimetype=mimetype, headers={'Cache-Control': 'no-store'}
+        )
+    key = artifact_key(name, dict(
+        params,
+        pipeline_version=PIPELINE_VERSION,
+        revision=MaximallyConnectedPlanarGraph.revision(seed)
+    ))
+    headers = {
+        'Cache-Control': 'public, max-age={}'.format(ARTIFACT_MAX_AGE),
+        'Vary': 'Accept-Encoding'
+    }
+    info = ARTIFACT_CACHE.info(seed, key)
+    if info is not None:
+        encoding = choose_encoding(request.headers.get('Accept-Encoding'), info['encodings'])
+        hit_headers = dict(headers)
+        if encoding == 'identity':
+            hit_headers['ETag'] = '"{}"'.format(info['etag'])
+        else:
+            hit_headers['ETag'] = '"{}-{}"'.format(info['etag'], encoding)
+            hit_headers['Content-Encoding'] = encoding
+        if etag_matches(request.headers.get('If-None-Match'), info['etag']):
+            METRICS.inc('artifact_cache_requests_total', result='hit')
+            hit_headers.pop('Content-Encoding', None)
+            return Response(status=304, headers=hit_headers)
+        try:
+            size, body = ARTIFACT_CACHE.read(seed, key, encoding)
+        except FileNotFoundError: # evicted since it was looked up
+            pass
+        else:
+            METRICS.inc('artifact_cache_requests_total', result='hit')
+            hit_headers['Content-Length'] = str(size)
+            return Response(body, mimetype=mimetype, headers=hit_headers, direct_passthrough=True)
+
+    METRICS.inc('artifact_cache_requests_total', result='miss')
+    # sent as it is rendered and cached, so without an ETag (its content hash
+    # is only known at the end)
+    encoding = choose_encoding(request.headers.get('Accept-Encoding'))
+    if encoding != 'identity':
+        headers['Content-Encoding'] = encoding
+    return Response(
+        ARTIFACT_CACHE.stream(seed, key, render(), encoding),
+        mimetype=mimetype, headers=headers, direct_passthrough=True
+    )
+
 
 @APP.route('/planar-graphs/<seed>/graph.svg', methods=['GET'])
 def planar_graph_svg(seed):
     """ generates an svg for the given graph """
-    num_points = request.args.get('num-points', default=200, type=int)
-    triangle = MaximallyConnectedPlanarGraph(seed, num_points=num_points)
+    if not MaximallyConnectedPlanarGraph.is_valid_seed(seed):
+        return ('', 404)
+    generating = generating_graph_response(seed)
+    if generating:
+        return generating
     slice_origin_id = request.args.get('slice-origin-id', default=None, type=int)
     reverse_slice = request.args.get('reverse-slice', default=False, type=bool)
-    colored_nodes = dict(request.args)
-    colored_nodes.pop('slice_origin_id', None)
-    return Markup(
-        triangle.generate_svg(
+    num_nodes = MaximallyConnectedPlanarGraph.num_nodes(seed)
+    if slice_origin_id is not None and not 1 <= slice_origin_id <= num_nodes:
+        return ('slice-origin-id must be a node id from 1 to {}'.format(num_nodes), 400)
+    # only numeric keys are node colors (see iter_svg)
+    colored_nodes = {}
+    for key, color in request.args.items():
+        if key.isdigit():
+            colored_nodes[str(int(key))] = color
+
+    # num-points is left out of the key: it only matters to the job that
+    # generates the graph, and deleting a graph deletes its artifacts
+    params = {
+        'slice_origin_id': slice_origin_id,
+        'reverse_slice': reverse_slice,
+        'colored_nodes': colored_nodes
+    }
+    return artifact_response(
+        seed, 'graph.svg', params, 'image/svg+xml',
+        lambda: get_graph(seed, None).iter_svg(
             slice_origin_id=slice_origin_id,
             colored_nodes=colored_nodes,
             reverse_slice=reverse_slice
@@ -47,10 +356,70 @@ def planar_graph_svg(seed):
 
 @APP.route('/planar-graphs/<seed>/graph.json', methods=['GET'])
 def planar_graph_data(seed):
-    """ generates an svg for the given graph """
-    num_points = request.args.get('num-points', default=200, type=int)
-    triangle = MaximallyConnectedPlanarGraph(seed, num_points=num_points)
-    return triangle.to_json()
+    """
+    returns the graph data: by default as the node dictionaries of the
+    legacy data file format. format=columnar returns it in the columnar
+    format instead, limited to the comma separated fields (all of
+    COLUMN_FIELDS by default), and format=binary does the same in the graph
+    file format
+    """
+    if not MaximallyConnectedPlanarGraph.is_valid_seed(seed):
+        return ('', 404)
+    generating = generating_graph_response(seed)
+    if generating:
+        return generating
+    data_format = request.args.get('format', default='nodes')
+    if data_format == 'nodes':
+        return artifact_response(
+            seed, 'graph.json', {}, 'application/json',
+            lambda: [get_graph(seed, None).to_json()]
+        )
+    if data_format not in ('columnar', 'binary'):
+        return ('Unknown format: {}'.format(data_format), 400)
+
+    fields = None
+    if request.args.get('fields'):
+        requested = [field.strip() for field in request.args['fields'].split(',')]
+        unknown = [field for field in requested if field not in COLUMN_FIELDS]
+        if unknown:
+            return ('Unknown fields: {} (expected some of {})'.format(
+                ', '.join(unknown), ', '.join(COLUMN_FIELDS)
+            ), 400)
+        fields = [field for field in COLUMN_FIELDS if field in requested]
+    params = {'fields': fields or list(COLUMN_FIELDS)}
+    if data_format == 'binary':
+        return artifact_response(
+            seed, 'graph.columns.bin', params, 'application/octet-stream',
+            lambda: get_graph(seed, None).iter_columnar_binary(fields)
+        )
+    return artifact_response(
+        seed, 'graph.columns.json', params, 'application/json',
+        lambda: [get_graph(seed, None).to_columnar_json(fields)]
+    )
+
+@APP.route('/planar-graphs/<seed>/tiles.json', methods=['GET'])
+def planar_graph_tile_grid(seed):
+    """ the square covered by the tiles of a graph (zoom level 0) """
+    error = stored_graph_error(seed)
+    if error:
+        return error
+    origin, size = get_graph(seed, None).tile_grid()
+    return Response(json.dumps({
+        'origin': origin, 'size': size, 'tile_size': TILE_SIZE, 'max_zoom': MAX_ZOOM
+    }), mimetype='application/json')
+
+@APP.route('/planar-graphs/<seed>/tiles/<int:zoom>/<int:column>/<int:row>.svg', methods=['GET'])
+def planar_graph_tile(seed, zoom, column, row):
+    """ svg of one tile of a graph, with less detail at low zoom (see tiles.iter_tile_svg) """
+    if not is_tile(zoom, column, row):
+        return ('', 404)
+    error = stored_graph_error(seed)
+    if error:
+        return error
+    return artifact_response(
+        seed, 'tile.svg', {'zoom': zoom, 'column': column, 'row': row}, 'image/svg+xml',
+        lambda: get_graph(seed, None).iter_tile_svg(zoom, column, row)
+    )
 
 if __name__ == "__main__":
     APP.run(host='0.0.0.0', debug=True)
@@ -0,0 +1,298 @@
+"""
+Scaling benchmark of the planar graph pipeline
+
+Runs every stage for a fixed set of seeds at increasing numbers of points,
+recording wall time (best of --repeat runs), peak traced memory and the net
+number of allocated memory blocks, and writes them to a json results file.
+Given a baseline (a previous results file), every stage that got slower or
+bigger than --tolerance times its baseline is reported and the script exits
+with status 1. Timings depend on the machine, so the baseline must be
+recorded on the machine it is compared on (e.g. by running the benchmark on
+the base branch first), which is why none is committed.
+
+    python benchmark.py --output results.json
+    python benchmark.py --sizes 100,1000 --baseline results.json
+
+Graphs are stored in a temporary data directory. Bigger sizes of a stage are
+skipped once it takes longer than --max-seconds (all of them once
+triangulating does).
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+import src.maximally_connected_planar_graph as planar_graph
+from src.delaunay import triangulate
+from src.graph_arrays import GraphArrays, clockwise_adjacency
+from src.level_elements import LevelElementFinder
+from src.maximally_connected_planar_graph import MaximallyConnectedPlanarGraph
+from src.point_sampler import sample_points
+from src.slices import SliceEngine
+from src.spatial_index import SpatialIndex
+from src.triangle_files import write_triangle_files
+
+SEEDS = ('41704775293917760', '55143455246012410', '82154199210050620')
+SIZES = (100, 1000, 10000, 100000, 1000000)
+# number of slices computed by the get_slice stage
+SLICE_QUERIES = 100
+
+
+def random_points(seed, num_points):
+    """
+    Returns num_points distinct integer points for a seed, spread over a
+    grid that grows with the number of points
+    """
+    rng = np.random.RandomState(int(seed) % (2 ** 32))
+    scale = int(np.ceil(np.sqrt(4 * num_points / (1500 * 1000))))
+    width, height = 1500 * scale, 1000 * scale
+    keys = np.zeros(0, dtype=np.int64)
+    while len(keys) < num_points:
+        keys = np.unique(np.concatenate([keys, rng.randint(0, width * height, num_points)]))
+    keys = rng.permutation(keys)[:num_points]
+    return np.stack([keys % width, keys // width], axis=1)
+
+
+def stages(seed, num_points, data_dir):
+    """
+    Returns the (name, setup) pairs of the stages for one seed and size,
+    setup() preparing the inputs of a stage and returning the function to
+    measure
+    """
+    points = random_points(seed, num_points)
+    triangulation = triangulate(points)
+    os.makedirs(os.path.join(data_dir, seed))
+    write_triangle_files(os.path.join(data_dir, seed), triangulation)
+    triangle = MaximallyConnectedPlanarGraph(seed)
+    graph = triangle.graph
+
+    def fresh_graph():
+        return GraphArrays(
+            triangulation.nodes, triangulation.is_boundary,
+            clockwise_adjacency(triangulation.nodes, triangulation.edges),
+            triangulation.triangles
+        )
+
+    def levels():
+        fresh = fresh_graph()
+        return lambda: triangle.get_levels(fresh)
+
+    def level_elements():
+        finder = LevelElementFinder(
+            graph.adjacency.offsets.tolist(), graph.adjacency.values.tolist(), graph.twin.tolist()
+        )
+        return lambda: [
+            triangle.identify_level_elements(finder, node_ids)
+            for node_ids in graph.levels.tolist()
+        ]
+
+    def special_nodes():
+        betweener_paths = [[] for _ in range(len(graph))]
+        return lambda: [
+            triangle.identify_special_nodes(graph, node_id, betweener_paths)
+            for node_ids in graph.levels.tolist() for node_id in node_ids
+        ]
+
+    def slices():
+        node_ids = range(0, len(graph), max(1, len(graph) // SLICE_QUERIES))
+
+        def run():
+            engine = SliceEngine(graph)
+            for node_id in node_ids:
+                engine.get_slice(node_id, is_origin=True)
+                engine.get_slice(node_id, is_reverse=True)
+        return run
+
+    result = [
+        ('sample_points', lambda: lambda: sample_points(seed, num_points)),
+        # includes triangulating the sampled points
+        ('generate_triangle', lambda: (
+            lambda: MaximallyConnectedPlanarGraph.generate_triangle(seed, num_points)
+        )),
+        ('triangulate', lambda: lambda: triangulate(points)),
+        # includes building the graph from the parsed triangulation
+        ('parse_triangle_files', lambda: triangle.parse_triangle_files),
+        ('clockwise_sort', lambda: (
+            lambda: clockwise_adjacency(triangulation.nodes, triangulation.edges)
+        )),
+        ('half_edge_embedding', lambda: fresh_graph),
+        # includes identify_level_elements
+        ('get_levels', levels),
+        ('identify_level_elements', level_elements),
+        ('identify_special_nodes', special_nodes),
+        ('get_slice', slices),
+        ('generate_svg', lambda: triangle.generate_svg),
+        ('spatial_index', lambda: lambda: SpatialIndex(graph)),
+        # the whole graph at the lowest level of detail
+        ('generate_tile', lambda: lambda: ''.join(triangle.iter_tile_svg(0, 0, 0))),
+        ('to_json', lambda: triangle.to_json),
+        ('to_columnar_json', lambda: triangle.to_columnar_json),
+        ('columnar_binary', lambda: lambda: b''.join(triangle.iter_columnar_binary()))
+    ]
+    return result
+
+
+def measure(setup, repeat, memory):
+    """
+    Returns the best wall time of a stage over repeat runs and, if memory is
+    set, its peak traced memory and net allocated blocks (measured in a
+    separate, slower run)
+    """
+    seconds = None
+    for _ in range(repeat):
+        run = setup()
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        seconds = elapsed if seconds is None else min(seconds, elapsed)
+
+    result = {'seconds': seconds, 'peak_bytes': None, 'blocks': None}
+    if memory:
+        run = setup()
+        blocks = sys.getallocatedblocks()
+        tracemalloc.start()
+        output = run()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result['peak_bytes'] = peak
+        result['blocks'] = sys.getallocatedblocks() - blocks
+        del output
+    return result
+
+
+def run_benchmark(seeds, sizes, repeat=3, memory=True, max_seconds=60.0):
+    """
+    Runs every stage for every seed and size, returning the list of results
+    """
+    results = []
+    too_slow = set()
+    original_data_dir = planar_graph.DATA_DIR
+    original_store_dir = planar_graph.GRAPH_STORE.directory
+    try:
+        for num_points in sizes:
+            # every other stage starts from a triangulation
+            if 'triangulate' in too_slow:
+                break
+            for seed in seeds:
+                data_dir = tempfile.mkdtemp()
+                planar_graph.DATA_DIR = data_dir
+                planar_graph.GRAPH_STORE.directory = os.path.join(data_dir, '.store')
+                try:
+                    for stage, setup in stages(seed, num_points, data_dir):
+                        if stage in too_slow:
+                            continue
+                        result = measure(setup, repeat, memory)
+                        result.update(stage=stage, seed=seed, num_points=num_points)
+                        results.append(result)
+                        print('{:>24} {:>8} {:>18} {:>10.4f}s {:>12} bytes'.format(
+                            stage, num_points, seed, result['seconds'], str(result['peak_bytes'])
+                        ), file=sys.stderr)
+                        if result['seconds'] > max_seconds:
+                            too_slow.add(stage)
+                finally:
+                    shutil.rmtree(data_dir)
+    finally:
+        planar_graph.DATA_DIR = original_data_dir
+        planar_graph.GRAPH_STORE.directory = original_store_dir
+    return results
+
+
+def summarize(results):
+    """
+    Returns the median of every measurement per (stage, number of points)
+    """
+    groups = {}
+    for result in results:
+        groups.setdefault((result['stage'], result['num_points']), []).append(result)
+    summary = {}
+    for key, group in groups.items():
+        summary[key] = {
+            name: None if group[0][name] is None else float(np.median([r[name] for r in group]))
+            for name in ('seconds', 'peak_bytes', 'blocks')
+        }
+    return summary
+
+
+def compare(results, baseline, tolerance, min_seconds):
+    """
+    Returns the list of regressions (as messages) of the results compared to
+    a baseline: stages whose median time or peak memory went over tolerance
+    times the baseline (times below min_seconds are considered noise)
+    """
+    regressions = []
+    current, previous = summarize(results), summarize(baseline)
+    for key in sorted(current):
+        if key not in previous:
+            continue
+        now, before = current[key], previous[key]
+        if (
+                now['seconds'] > before['seconds'] * tolerance and
+                now['seconds'] - before['seconds'] > min_seconds
+        ):
+            regressions.append('{} ({} points): {:.4f}s -> {:.4f}s'.format(
+                key[0], key[1], before['seconds'], now['seconds']
+            ))
+        if (
+                now['peak_bytes'] is not None and before['peak_bytes'] is not None and
+                now['peak_bytes'] > before['peak_bytes'] * tolerance
+        ):
+            regressions.append('{} ({} points): peak {:.0f} -> {:.0f} bytes'.format(
+                key[0], key[1], before['peak_bytes'], now['peak_bytes']
+            ))
+    return regressions
+
+
+def main():
+    """
+    Command line entry point
+    """
+    parser = argparse.ArgumentParser(description='Scaling benchmark of the planar graph pipeline')
+    parser.add_argument('--seeds', default=','.join(SEEDS), help='comma separated seeds')
+    parser.add_argument('--sizes', default=','.join(map(str, SIZES)), help='comma separated numbers of points') # pylint: disable=C0301
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per stage (best is kept)')
+    parser.add_argument('--no-memory', action='store_true', help='skip the memory measurements')
+    parser.add_argument('--max-seconds', type=float, default=60.0, help='skip bigger sizes of slower stages') # pylint: disable=C0301
+    parser.add_argument('--output', default='benchmark-results.json', help='results file')
+    parser.add_argument('--baseline', default='', help='results file to compare against (none by default)') # pylint: disable=C0301
+    parser.add_argument('--tolerance', type=float, default=1.25, help='allowed slowdown ratio')
+    parser.add_argument('--min-seconds', type=float, default=0.005, help='ignored time differences') # pylint: disable=C0301
+    args = parser.parse_args()
+
+    results = run_benchmark(
+        args.seeds.split(','),
+        [int(size) for size in args.sizes.split(',')],
+        repeat=args.repeat,
+        memory=not args.no_memory,
+        max_seconds=args.max_seconds
+    )
+    with open(args.output, 'w') as outfile:
+        json.dump({
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'results': results
+        }, outfile, indent=4)
+        outfile.close()
+
+    if args.baseline:
+        with open(args.baseline, 'r') as infile:
+            baseline = json.load(infile)['results']
+            infile.close()
+        regressions = compare(results, baseline, args.tolerance, args.min_seconds)
+        for regression in regressions:
+            print('REGRESSION', regression, file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
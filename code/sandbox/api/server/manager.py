@@ -2,10 +2,30 @@
 Manager
 """
 
+import sys
+
 from flask_script import Manager # pylint: disable=E0401
 from application import APP
+from src.pregenerate import parse_seeds, pregenerate
 
 manager = Manager(APP)
 
+@manager.option('-s', '--seeds', dest='seeds', default=None, help='comma separated seeds')
+@manager.option('-r', '--range', dest='seed_range', default=None, help='seeds start:stop')
+@manager.option('-f', '--seed-file', dest='seed_file', default=None, help='file with one seed per line') # pylint: disable=C0301
+@manager.option('-n', '--num-points', dest='num_points', type=int, default=200)
+@manager.option('-w', '--workers', dest='workers', type=int, default=None)
+@manager.option('--resume', dest='resume', action='store_true', help='skip complete seeds')
+def pregenerate_graphs(seeds, seed_range, seed_file, num_points, workers, resume): # pylint: disable=R0913
+    """ generates and stores planar graphs for many seeds in parallel """
+    failed = pregenerate(
+        parse_seeds(seeds, seed_range, seed_file),
+        num_points=num_points,
+        workers=workers,
+        resume=resume
+    )
+    if failed:
+        sys.exit(1)
+
 if __name__ == "__main__":
     manager.run()
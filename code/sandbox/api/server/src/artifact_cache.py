@@ -0,0 +1,271 @@
+"""
+On-disk cache of rendered graph artifacts (svg and json) and the helpers to
+serve them with HTTP caching and compression
+"""
+
+import hashlib
+import json
+import os
+import threading
+import zlib
+
+try:
+    import brotli # pylint: disable=E0401
+except ImportError:
+    brotli = None
+
+ENCODINGS = ('br', 'gzip', 'identity') if brotli else ('gzip', 'identity')
+BLOCK_SIZE = 64 * 1024
+# files of a stored artifact (whatever encodings this process supports)
+STORED_SUFFIXES = ('br', 'gzip', 'identity', 'json')
+
+
+def artifact_key(name, params):
+    """
+    Returns the cache key of an artifact for normalized request parameters
+    (a dictionary of json values)
+    """
+    normalized = json.dumps([name, params], sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(normalized.encode()).hexdigest()
+
+
+def choose_encoding(accept_encoding, available=ENCODINGS):
+    """
+    Returns the preferred encoding out of the available ones for an
+    Accept-Encoding header
+    """
+    qualities = {}
+    for part in (accept_encoding or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        qualities[coding.strip().lower()] = quality
+    for encoding in ENCODINGS:
+        # identity is acceptable unless it is explicitly refused
+        default = qualities.get('*', 1.0 if encoding == 'identity' else 0.0)
+        if encoding in available and qualities.get(encoding, default) > 0:
+            return encoding
+    return 'identity'
+
+
+def etag_matches(if_none_match, etag):
+    """
+    Checks whether an If-None-Match header matches the content hash of an
+    artifact (ignoring the encoding suffix of the tags we send)
+    """
+    for tag in (if_none_match or '').split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        tag = tag.strip('"')
+        if tag == '*' or tag.split('-')[0] == etag:
+            return True
+    return False
+
+
+def join_blocks(chunks):
+    """
+    Joins an iterable of text (or bytes) chunks into blocks of at least
+    BLOCK_SIZE bytes (but the last one)
+    """
+    pending = []
+    size = 0
+    for chunk in chunks:
+        data = chunk.encode() if isinstance(chunk, str) else chunk
+        pending.append(data)
+        size += len(data)
+        if size >= BLOCK_SIZE:
+            yield b''.join(pending)
+            pending = []
+            size = 0
+    if pending:
+        yield b''.join(pending)
+
+
+class ArtifactCache():
+    """
+    Rendered artifacts are stored per seed (so deleting a graph deletes them)
+    under <seed>/artifacts/, once per encoding, next to a small json file
+    holding their content hash, which is written last: an artifact without
+    it is incomplete and ignored. Once their total size goes over max_size
+    (bytes), the least recently used artifacts are evicted
+    """
+    def __init__(self, directory, max_size):
+        self.directory = directory
+        self.max_size = max_size
+
+    def path(self, seed, key, suffix):
+        """
+        Returns the path of one of the files of an artifact
+        """
+        return os.path.join(self.directory, seed, 'artifacts', '{}.{}'.format(key, suffix))
+
+    def info(self, seed, key):
+        """
+        Returns the content hash ('etag') and the stored encodings
+        ('encodings') of a cached artifact, or None if it is not cached
+        """
+        try:
+            with open(self.path(seed, key, 'json'), 'r') as infile:
+                info = json.load(infile)
+                # looking an artifact up makes it the most recently used one
+                os.utime(infile.fileno())
+                return info
+        except (OSError, ValueError):
+            return None
+
+    def read(self, seed, key, encoding):
+        """
+        Opens a cached artifact in one encoding and returns its size and an
+        iterator over its bytes, block by block (the file is opened right
+        away, so it can be streamed even if the artifact is deleted meanwhile).
+        Raises FileNotFoundError if it was evicted since info was called
+        """
+        infile = open(self.path(seed, key, encoding), 'rb')
+        size = os.fstat(infile.fileno()).st_size
+
+        def blocks():
+            with infile:
+                block = infile.read(BLOCK_SIZE)
+                while block:
+                    yield block
+                    block = infile.read(BLOCK_SIZE)
+        return size, blocks()
+
+    def write(self, seed, key, chunks):
+        """
+        Stores an artifact given as an iterable of text (or bytes) chunks,
+        compressing and hashing it on the fly. Returns its info (see info)
+        """
+        for _ in self.stream(seed, key, chunks):
+            pass
+        return self.info(seed, key)
+
+    def stream(self, seed, key, chunks, encoding='identity'):
+        """
+        Stores an artifact like write, generating its bytes in one of the
+        stored encodings as they are written, so it can be sent while it is
+        rendered. Chunks are compressed and written a block at a time (see
+        join_blocks). The artifact is only stored once every chunk went
+        through (closing the generator early leaves nothing behind)
+        """
+        os.makedirs(os.path.dirname(self.path(seed, key, 'json')), exist_ok=True)
+        temp_suffix = '{}.{}.tmp'.format(os.getpid(), threading.get_ident())
+        compressors = {
+            'identity': None,
+            # wbits 31: gzip container
+            'gzip': zlib.compressobj(6, zlib.DEFLATED, 31)
+        }
+        if brotli:
+            compressors['br'] = brotli.Compressor(mode=brotli.MODE_TEXT)
+        outfiles = {
+            name: open(self.path(seed, key, name + temp_suffix), 'wb')
+            for name in compressors
+        }
+        content_hash = hashlib.sha1()
+        try:
+            for data in join_blocks(chunks):
+                content_hash.update(data)
+                for name, compressor in compressors.items():
+                    if compressor is None:
+                        output = data
+                    elif name == 'br':
+                        output = compressor.process(data)
+                    else:
+                        output = compressor.compress(data)
+                    outfiles[name].write(output)
+                    if name == encoding and output:
+                        yield output
+            for name, compressor in compressors.items():
+                if name == 'br':
+                    output = compressor.finish()
+                elif compressor is not None:
+                    output = compressor.flush()
+                else:
+                    continue
+                outfiles[name].write(output)
+                if name == encoding and output:
+                    yield output
+        except: # pylint: disable=W0702
+            for name, outfile in outfiles.items():
+                outfile.close()
+                os.remove(self.path(seed, key, name + temp_suffix))
+            raise
+        for outfile in outfiles.values():
+            outfile.close()
+        for name in compressors:
+            os.replace(self.path(seed, key, name + temp_suffix), self.path(seed, key, name))
+
+        info = {'etag': content_hash.hexdigest(), 'encodings': list(compressors)}
+        with open(self.path(seed, key, 'json' + temp_suffix), 'w') as outfile:
+            json.dump(info, outfile)
+            outfile.close()
+        os.replace(self.path(seed, key, 'json' + temp_suffix), self.path(seed, key, 'json'))
+        self.evict()
+
+    def artifacts(self):
+        """
+        Returns the seed, key, total size and last use time of every stored
+        artifact
+        """
+        artifacts = []
+        if not os.path.exists(self.directory):
+            return artifacts
+        for seed in os.listdir(self.directory):
+            if seed.startswith('.'):
+                continue
+            directory = os.path.join(self.directory, seed, 'artifacts')
+            try:
+                filenames = os.listdir(directory)
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+            sizes = {}
+            used = {}
+            for filename in filenames:
+                key, _, suffix = filename.partition('.')
+                if suffix not in STORED_SUFFIXES:
+                    continue # being written
+                try:
+                    stat = os.stat(os.path.join(directory, filename))
+                except FileNotFoundError: # evicted in the meantime
+                    continue
+                sizes[key] = sizes.get(key, 0) + stat.st_size
+                if suffix == 'json':
+                    used[key] = stat.st_mtime
+            for key, last_used in used.items():
+                artifacts.append((seed, key, sizes[key], last_used))
+        return artifacts
+
+    def evict(self):
+        """
+        Removes the least recently used artifacts until the cache fits in
+        max_size. Their info goes first, so they stop being served before
+        their encodings disappear (responses already reading one keep it)
+        """
+        artifacts = sorted(self.artifacts(), key=lambda artifact: artifact[3])
+        size = sum(artifact[2] for artifact in artifacts)
+        for seed, key, artifact_size, _ in artifacts:
+            if size <= self.max_size:
+                break
+            for suffix in sorted(STORED_SUFFIXES, key=lambda suffix: suffix != 'json'):
+                try:
+                    os.remove(self.path(seed, key, suffix))
+                except FileNotFoundError:
+                    pass
+            size -= artifact_size
+
+    def stats(self):
+        """
+        Returns the number and total size of the stored artifacts
+        """
+        artifacts = self.artifacts()
+        return {
+            'artifacts': len(artifacts),
+            'size': sum(artifact[2] for artifact in artifacts),
+            'max_size': self.max_size
+        }
@@ -0,0 +1,311 @@
+"""
+In-process Delaunay triangulation of a planar point set (replaces the
+external "triangle" binary)
+"""
+
+from collections import namedtuple
+from fractions import Fraction
+
+import numpy as np
+
+# nodes:       (n, 2) array of coordinates (same order as the input points)
+# edges:       (e, 2) array of node indexes, each undirected edge once, sorted
+# is_boundary: (n,) boolean array, True for nodes on the convex hull
+# triangles:   (t, 3) array of node indexes, counter clockwise
+Triangulation = namedtuple('Triangulation', ['nodes', 'edges', 'is_boundary', 'triangles'])
+
+# vertex id used for the "point at infinity" of ghost triangles. Every edge on
+# the convex hull has a ghost triangle on its outer side, which lets points
+# outside the current hull be inserted exactly like points inside it
+GHOST = -1
+
+EPSILON = np.finfo(np.float64).eps / 2
+ORIENT_ERROR_BOUND = (3 + 16 * EPSILON) * EPSILON
+INCIRCLE_ERROR_BOUND = (10 + 96 * EPSILON) * EPSILON
+
+HILBERT_ORDER = 16
+
+
+def hilbert_order(points):
+    """
+    Returns the indexes of the given points sorted along a hilbert curve, so
+    consecutive insertions land close to each other
+    """
+    points = np.asarray(points, dtype=np.float64)
+    side = (1 << HILBERT_ORDER) - 1
+    minimum = points.min(axis=0)
+    extent = (points.max(axis=0) - minimum).max() or 1.0
+    grid = np.floor((points - minimum) / extent * side).astype(np.int64)
+    x_coords, y_coords = grid[:, 0].copy(), grid[:, 1].copy()
+
+    index = np.zeros(len(points), dtype=np.int64)
+    step = 1 << (HILBERT_ORDER - 1)
+    while step > 0:
+        x_bit = (x_coords & step) > 0
+        y_bit = (y_coords & step) > 0
+        index += step * step * ((3 * x_bit) ^ y_bit)
+        # rotate the quadrant so the curve stays continuous
+        flip = ~y_bit & x_bit
+        x_coords = np.where(flip, side - x_coords, x_coords)
+        y_coords = np.where(flip, side - y_coords, y_coords)
+        swap = ~y_bit
+        x_coords, y_coords = np.where(swap, y_coords, x_coords), np.where(swap, x_coords, y_coords)
+        step >>= 1
+    return np.argsort(index, kind='stable')
+
+
+def orient(a_x, a_y, b_x, b_y, c_x, c_y):
+    """
+    Positive if a, b, c are counter clockwise, negative if clockwise and zero
+    if they are collinear (falls back to exact arithmetic when rounding could
+    change the sign)
+    """
+    det_left = (a_x - c_x) * (b_y - c_y)
+    det_right = (a_y - c_y) * (b_x - c_x)
+    det = det_left - det_right
+    if abs(det) > ORIENT_ERROR_BOUND * (abs(det_left) + abs(det_right)):
+        return det
+    a_x, a_y, b_x, b_y, c_x, c_y = map(Fraction, (a_x, a_y, b_x, b_y, c_x, c_y))
+    return float((a_x - c_x) * (b_y - c_y) - (a_y - c_y) * (b_x - c_x))
+
+
+def incircle(a_x, a_y, b_x, b_y, c_x, c_y, d_x, d_y): # pylint: disable=R0913,R0914
+    """
+    Positive if d lies inside the circle through the counter clockwise
+    triangle a, b, c, negative if outside and zero if cocircular
+    """
+    adx, ady = a_x - d_x, a_y - d_y
+    bdx, bdy = b_x - d_x, b_y - d_y
+    cdx, cdy = c_x - d_x, c_y - d_y
+    alift = adx * adx + ady * ady
+    blift = bdx * bdx + bdy * bdy
+    clift = cdx * cdx + cdy * cdy
+    det = (
+        alift * (bdx * cdy - cdx * bdy) +
+        blift * (cdx * ady - adx * cdy) +
+        clift * (adx * bdy - bdx * ady)
+    )
+    permanent = (
+        alift * (abs(bdx * cdy) + abs(cdx * bdy)) +
+        blift * (abs(cdx * ady) + abs(adx * cdy)) +
+        clift * (abs(adx * bdy) + abs(bdx * ady))
+    )
+    if abs(det) > INCIRCLE_ERROR_BOUND * permanent:
+        return det
+    adx, ady, bdx, bdy, cdx, cdy = (
+        Fraction(a_x) - Fraction(d_x), Fraction(a_y) - Fraction(d_y),
+        Fraction(b_x) - Fraction(d_x), Fraction(b_y) - Fraction(d_y),
+        Fraction(c_x) - Fraction(d_x), Fraction(c_y) - Fraction(d_y),
+    )
+    return float(
+        (adx * adx + ady * ady) * (bdx * cdy - cdx * bdy) +
+        (bdx * bdx + bdy * bdy) * (cdx * ady - adx * cdy) +
+        (cdx * cdx + cdy * cdy) * (adx * bdy - bdx * ady)
+    )
+
+
+class _Mesh(): # pylint: disable=R0902
+    """
+    Bowyer-Watson triangulation using flat vertex/adjacency lists, where
+    triangle t has vertices verts[3t:3t+3] (counter clockwise) and adj[3t+i]
+    is the triangle across the edge verts[3t+i] -> verts[3t+(i+1)%3].
+    Ghost triangles always keep the GHOST vertex in their last slot
+    """
+    def __init__(self, x_coords, y_coords):
+        self.x_coords = x_coords
+        self.y_coords = y_coords
+        self.verts = []
+        self.adj = []
+        self.alive = []
+        self.free = []
+        self.last = 0
+
+    def add_triangle(self, a, b, c):
+        """
+        Creates a triangle (rotated so a ghost vertex comes last) and returns
+        its id
+        """
+        if a == GHOST:
+            a, b, c = b, c, a
+        elif b == GHOST:
+            a, b, c = c, a, b
+        if self.free:
+            tri = self.free.pop()
+            self.verts[3 * tri:3 * tri + 3] = [a, b, c]
+            self.adj[3 * tri:3 * tri + 3] = [-1, -1, -1]
+            self.alive[tri] = True
+        else:
+            tri = len(self.alive)
+            self.verts.extend((a, b, c))
+            self.adj.extend((-1, -1, -1))
+            self.alive.append(True)
+        return tri
+
+    def in_circumcircle(self, tri, point):
+        """
+        True if point lies strictly inside the circumcircle of the triangle.
+        For ghost triangles the "circumcircle" is the open half plane outside
+        the hull edge plus the open hull edge itself
+        """
+        x_coords, y_coords = self.x_coords, self.y_coords
+        a, b, c = self.verts[3 * tri:3 * tri + 3]
+        p_x, p_y = x_coords[point], y_coords[point]
+        if c != GHOST:
+            return incircle(
+                x_coords[a], y_coords[a], x_coords[b], y_coords[b],
+                x_coords[c], y_coords[c], p_x, p_y
+            ) > 0
+        side = orient(x_coords[a], y_coords[a], x_coords[b], y_coords[b], p_x, p_y)
+        if side != 0:
+            return side > 0
+        # collinear with the hull edge: inside only when strictly between a and b
+        return (
+            min(x_coords[a], x_coords[b]) <= p_x <= max(x_coords[a], x_coords[b]) and
+            min(y_coords[a], y_coords[b]) <= p_y <= max(y_coords[a], y_coords[b]) and
+            (p_x, p_y) != (x_coords[a], y_coords[a]) and
+            (p_x, p_y) != (x_coords[b], y_coords[b])
+        )
+
+    def locate(self, point):
+        """
+        Walks from the last created triangle towards the point and returns a
+        triangle whose circumcircle contains it (None for duplicate points)
+        """
+        x_coords, y_coords = self.x_coords, self.y_coords
+        verts, adj = self.verts, self.adj
+        p_x, p_y = x_coords[point], y_coords[point]
+        tri = self.last
+        if verts[3 * tri + 2] == GHOST:
+            tri = adj[3 * tri]
+        start = 0
+        while True:
+            for offset in range(3):
+                i = (start + offset) % 3
+                a = verts[3 * tri + i]
+                b = verts[3 * tri + (i + 1) % 3]
+                if orient(x_coords[a], y_coords[a], x_coords[b], y_coords[b], p_x, p_y) < 0:
+                    tri = adj[3 * tri + i]
+                    break
+            else:
+                for vert in verts[3 * tri:3 * tri + 3]:
+                    if x_coords[vert] == p_x and y_coords[vert] == p_y:
+                        return None
+                return tri
+            if verts[3 * tri + 2] == GHOST:
+                return tri
+            start = (start + 1) % 3
+
+    def insert(self, point):
+        """
+        Inserts a point by removing every triangle whose circumcircle contains
+        it and connecting the boundary of that cavity to the point
+        """
+        tri = self.locate(point)
+        if tri is None:
+            return
+        verts, adj = self.verts, self.adj
+
+        cavity = [tri]
+        self.alive[tri] = False
+        boundary = []
+        stack = [tri]
+        while stack:
+            current = stack.pop()
+            for i in range(3):
+                neighbor = adj[3 * current + i]
+                if not self.alive[neighbor]:
+                    continue
+                if self.in_circumcircle(neighbor, point):
+                    self.alive[neighbor] = False
+                    cavity.append(neighbor)
+                    stack.append(neighbor)
+                else:
+                    boundary.append((verts[3 * current + i], verts[3 * current + (i + 1) % 3], neighbor))
+        self.free.extend(cavity)
+
+        half_edges = {}
+        for start, end, outside in boundary:
+            new_tri = self.add_triangle(start, end, point)
+            for i in range(3):
+                edge = (verts[3 * new_tri + i], verts[3 * new_tri + (i + 1) % 3])
+                if edge == (start, end):
+                    adj[3 * new_tri + i] = outside
+                    for j in range(3):
+                        if verts[3 * outside + j] == end and verts[3 * outside + (j + 1) % 3] == start:
+                            adj[3 * outside + j] = new_tri
+                else:
+                    half_edges[edge] = 3 * new_tri + i
+        for (start, end), slot in half_edges.items():
+            adj[slot] = half_edges[(end, start)] // 3
+        self.last = new_tri
+
+    def seed_triangle(self, a, b, c):
+        """
+        Creates the first triangle (and its three ghost triangles)
+        """
+        x_coords, y_coords = self.x_coords, self.y_coords
+        if orient(x_coords[a], y_coords[a], x_coords[b], y_coords[b], x_coords[c], y_coords[c]) < 0:
+            b, c = c, b
+        real = self.add_triangle(a, b, c)
+        ghosts = [self.add_triangle(b, a, GHOST), self.add_triangle(c, b, GHOST), self.add_triangle(a, c, GHOST)]
+        self.adj[3 * real:3 * real + 3] = ghosts
+        # ghost (b, a) is followed by (a, c) and preceded by (c, b) around the hull
+        for i, ghost in enumerate(ghosts):
+            self.adj[3 * ghost:3 * ghost + 3] = [real, ghosts[(i - 1) % 3], ghosts[(i + 1) % 3]]
+        self.last = real
+
+
+def triangulate(points):
+    """
+    Returns the Delaunay triangulation of an (n, 2) array of distinct points.
+    Points are inserted along a hilbert curve and located by walking from the
+    previous insertion, giving expected O(n log n) time overall
+    """
+    nodes = np.asarray(points)
+    if nodes.ndim != 2 or nodes.shape[1] != 2:
+        raise ValueError('points must be an (n, 2) array')
+    # a repeated point would be left out of every triangle, as an isolated node
+    if len(np.unique(nodes, axis=0)) != len(nodes):
+        raise ValueError('points must be distinct')
+    x_coords = nodes[:, 0].astype(np.float64).tolist()
+    y_coords = nodes[:, 1].astype(np.float64).tolist()
+    order = hilbert_order(nodes).tolist() if len(nodes) else []
+
+    # the first triangle needs three distinct, non collinear points
+    seed = None
+    for i, first in enumerate(order):
+        for j in range(i + 1, len(order)):
+            second = order[j]
+            if (x_coords[second], y_coords[second]) == (x_coords[first], y_coords[first]):
+                continue
+            for third in order[j + 1:]:
+                if orient(
+                        x_coords[first], y_coords[first], x_coords[second], y_coords[second],
+                        x_coords[third], y_coords[third]
+                ) != 0:
+                    seed = (first, second, third)
+                    break
+            break
+        if seed:
+            break
+    if not seed:
+        raise ValueError('points must contain at least three non collinear points')
+
+    mesh = _Mesh(x_coords, y_coords)
+    mesh.seed_triangle(*seed)
+    for point in order:
+        if point not in seed:
+            mesh.insert(point)
+
+    verts = np.array(mesh.verts, dtype=np.int64).reshape(-1, 3)
+    alive = np.array(mesh.alive, dtype=bool)
+    ghosts = alive & (verts[:, 2] == GHOST)
+    triangles = verts[alive & ~ghosts]
+
+    is_boundary = np.zeros(len(nodes), dtype=bool)
+    is_boundary[verts[ghosts, :2].ravel()] = True
+
+    edges = np.concatenate([triangles[:, [0, 1]], triangles[:, [1, 2]], triangles[:, [2, 0]]])
+    edges = np.unique(np.sort(edges, axis=1), axis=0)
+
+    return Triangulation(nodes, edges, is_boundary, triangles)
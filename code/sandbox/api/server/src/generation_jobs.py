@@ -0,0 +1,275 @@
+"""
+Asynchronous generation of planar graphs on a local pool of worker processes
+
+Every job is a json file in the jobs directory (so any server process can
+report on it), and a seed with a queued, running or failed job has a
+pointer file holding the job's id, only changed while holding the seed's
+lock. A failed job stays the seed's job until another one is submitted
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import json
+import os
+import threading
+import time
+import traceback
+import uuid
+
+from .maximally_connected_planar_graph import MaximallyConnectedPlanarGraph
+from .metrics import METRICS
+from .single_flight import file_lock
+
+JOBS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../jobs/')
+
+# a running job that has not been updated for this long is dead (even if the
+# server process that queued it is still alive)
+STALE_AFTER = 600
+# minimum number of seconds between two progress updates of a running job
+PROGRESS_INTERVAL = 1.0
+
+
+def write_file(filepath, text):
+    """
+    Writes a file atomically (to a temporary file which is renamed)
+    """
+    temp_filepath = '{}.{}.{}.tmp'.format(filepath, os.getpid(), threading.get_ident())
+    with open(temp_filepath, 'w') as outfile:
+        outfile.write(text)
+        outfile.close()
+    os.replace(temp_filepath, filepath)
+
+
+def write_json(filepath, data):
+    """
+    Writes a json file atomically
+    """
+    write_file(filepath, json.dumps(data))
+
+
+def read_json(filepath):
+    """
+    Reads a json file, None if it is missing
+    """
+    try:
+        with open(filepath, 'r') as infile:
+            return json.load(infile)
+    except (OSError, ValueError):
+        return None
+
+
+def process_exists(pid):
+    """
+    Checks whether a process is running
+    """
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def run_job(jobs, job):
+    """
+    Generates the graph of a job (runs in a worker process), recording its
+    stage and progress in the job file, and the time spent in each pipeline
+    stage once it is over. The seed keeps pointing to the job if it fails.
+    Returns the metrics recorded meanwhile (see Metrics.changes)
+    """
+    last_update = [0.0]
+
+    def update(**changes):
+        job.update(changes, updated=time.time())
+        write_json(jobs.path(job['id']), job)
+
+    def progress(stage, fraction):
+        now = time.time()
+        if stage != job['stage'] or now - last_update[0] >= PROGRESS_INTERVAL:
+            last_update[0] = now
+            update(stage=stage, progress=round(fraction, 3))
+
+    update(status='running')
+    before = METRICS.snapshot()
+    METRICS.start_profile()
+    try:
+        MaximallyConnectedPlanarGraph(job['seed'], num_points=job['num_points'], progress=progress)
+    except Exception: # pylint: disable=W0703
+        update(status='failed', error=traceback.format_exc(), stages=METRICS.stop_profile())
+    else:
+        update(status='done', stage=None, progress=1.0, stages=METRICS.stop_profile())
+        jobs.release(job)
+    return METRICS.changes(before)
+
+
+class GenerationJobs():
+    """
+    Queues graph generations on a pool of worker processes (created on the
+    first submission) and reports their status
+    """
+    def __init__(self, directory=JOBS_DIR, workers=None):
+        self.directory = directory
+        self.workers = workers
+        self.executor = None
+        self.lock = threading.Lock()
+
+    def path(self, job_id):
+        """
+        Returns the path of a job file
+        """
+        return os.path.join(self.directory, '{}.json'.format(job_id))
+
+    def seed_path(self, seed):
+        """
+        Returns the path of the file pointing to the active job of a seed
+        """
+        return os.path.join(self.directory, 'seeds', seed)
+
+    def seed_lock(self, seed):
+        """
+        Locks the pointer file of a seed (across threads and processes)
+        """
+        return file_lock(os.path.join(self.directory, 'locks', seed))
+
+    def get(self, job_id):
+        """
+        Returns the status of a job, None if there is no such job
+        """
+        if not job_id or not all(character in '0123456789abcdef' for character in job_id):
+            return None
+        return read_json(self.path(job_id))
+
+    def current(self, seed):
+        """
+        Returns the status of the job a seed points to, None if there is none
+        """
+        try:
+            with open(self.seed_path(seed), 'r') as infile:
+                return self.get(infile.read().strip())
+        except OSError:
+            return None
+
+    def active(self, seed):
+        """
+        Returns the status of the queued or running job of a seed, None if
+        there is none
+        """
+        job = self.current(seed)
+        if (
+                job is None or
+                job['status'] not in ('queued', 'running') or
+                not process_exists(job['server_pid']) or
+                (job['status'] == 'running' and time.time() - job['updated'] > STALE_AFTER)
+        ):
+            return None
+        return job
+
+    def failed(self, seed):
+        """
+        Returns the status of the last job of a seed if it failed, None
+        otherwise
+        """
+        job = self.current(seed)
+        if job is None or job['status'] != 'failed':
+            return None
+        return job
+
+    def submit(self, seed, num_points):
+        """
+        Queues the generation of a seed's graph, returning the status of the
+        new job (or of the seed's active job if it already has one). If the
+        pool cannot take the job, it is marked as failed without becoming
+        the seed's job and the error is raised
+        """
+        os.makedirs(os.path.dirname(self.seed_path(seed)), exist_ok=True)
+        now = time.time()
+        job = {
+            'id': uuid.uuid4().hex,
+            'seed': seed,
+            'num_points': num_points,
+            'status': 'queued',
+            'stage': None,
+            'progress': 0.0,
+            'error': None,
+            # (stage, seconds) pairs, once the job is over
+            'stages': None,
+            'created': now,
+            'updated': now,
+            # the job dies with the server process whose pool runs it
+            'server_pid': os.getpid()
+        }
+        with self.seed_lock(seed):
+            active = self.active(seed)
+            if active is not None:
+                return active
+            write_json(self.path(job['id']), job)
+            write_file(self.seed_path(seed), job['id'])
+
+        try:
+            with self.lock:
+                if self.executor is None:
+                    self.executor = ProcessPoolExecutor(self.workers)
+                executor = self.executor
+                try:
+                    future = executor.submit(run_job, self, job)
+                except BrokenProcessPool:
+                    future = None
+                if future is None:
+                    # a worker died since the last job: start over with a new pool
+                    executor = self.executor = ProcessPoolExecutor(self.workers)
+                    future = executor.submit(run_job, self, job)
+        except Exception as error:
+            job.update(status='failed', error=repr(error), updated=time.time())
+            write_json(self.path(job['id']), job)
+            self.release(job)
+            raise
+        future.add_done_callback(lambda future: self.check(future, job, executor))
+        return job
+
+    def discard(self, executor):
+        """
+        Drops a pool whose worker died (it takes no more jobs), so the next
+        submission creates a new one. Call with the lock held
+        """
+        if self.executor is executor:
+            self.executor = None
+
+    def check(self, future, job, executor):
+        """
+        Adds the metrics recorded by a job's worker to the ones of this
+        process, or marks the job as failed if its worker process died
+        before finishing it
+        """
+        error = future.exception()
+        if error is None:
+            METRICS.merge(future.result())
+            return
+        if isinstance(error, BrokenProcessPool):
+            with self.lock:
+                self.discard(executor)
+        stored = self.get(job['id'])
+        if stored is not None and stored['status'] in ('queued', 'running'):
+            stored.update(status='failed', error=repr(error), updated=time.time())
+            write_json(self.path(job['id']), stored)
+
+    def release(self, job):
+        """
+        Removes the seed's pointer to a job (if it still points to it)
+        """
+        with self.seed_lock(job['seed']):
+            try:
+                with open(self.seed_path(job['seed']), 'r') as infile:
+                    if infile.read().strip() != job['id']:
+                        return
+                os.remove(self.seed_path(job['seed']))
+            except OSError:
+                pass
+
+    def __getstate__(self):
+        # workers only need the directory
+        return {'directory': self.directory, 'workers': None, 'executor': None}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
@@ -0,0 +1,381 @@
+"""
+Compact array representation of a maximally planar graph
+"""
+
+import numpy as np
+
+INDEX_DTYPE = np.int32
+
+
+class Ragged():
+    """
+    A list of variable length rows stored as two flat arrays (the same layout
+    as CSR adjacency): row i is values[offsets[i]:offsets[i + 1]]
+    """
+    def __init__(self, offsets, values):
+        self.offsets = offsets
+        self.values = values
+
+    @staticmethod
+    def from_lists(rows):
+        """
+        Builds a ragged array from a list of lists
+        """
+        offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(row) for row in rows])
+        values = np.fromiter(
+            (value for row in rows for value in row), dtype=INDEX_DTYPE, count=int(offsets[-1])
+        )
+        return Ragged(offsets, values)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        return self.values[self.offsets[index]:self.offsets[index + 1]]
+
+    def tolist(self):
+        """
+        Returns the rows as a list of lists
+        """
+        values = self.values.tolist()
+        offsets = self.offsets.tolist()
+        return [values[offsets[i]:offsets[i + 1]] for i in range(len(self))]
+
+
+def clockwise_adjacency(coords, edges):
+    """
+    Returns the CSR adjacency for a list of undirected edges, with every
+    node's neighbours sorted clockwise (starting from the vector [0, 1]).
+    Every edge's angle is computed at once and a single lexsort on
+    (node, angle, length) does the per node sorting
+    """
+    coords = np.asarray(coords, dtype=np.float64)
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    # both directions of an edge, kept next to each other so ties are broken
+    # by the order of the edges
+    directed = np.stack([edges, edges[:, ::-1]], axis=1).reshape(-1, 2)
+    sources, targets = directed[:, 0], directed[:, 1]
+
+    # Vector between spoke and center: v = p - o, and its length ||v||
+    vectors = coords[targets] - coords[sources]
+    lengths = np.hypot(vectors[:, 0], vectors[:, 1])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        normalized = vectors / lengths[:, None]
+    # angle with [0, 1]: atan2(x1*y2 - y1*x2, x1*x2 + y1*y2) for the
+    # normalized vector. Negative angles represent counter-clockwise angles
+    # so we need to subtract them from 2*pi (360 degrees)
+    angles = np.arctan2(normalized[:, 0], normalized[:, 1])
+    angles = np.where(angles < 0, 2 * np.pi + angles, angles)
+    # If length is zero there is no angle
+    angles = np.where(lengths == 0, -np.pi, angles)
+
+    # angle is the primary sorting criterium but if two vectors have the same
+    # angle then the shorter distance should come first
+    order = np.lexsort((lengths, angles, sources))
+    offsets = np.zeros(len(coords) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(np.bincount(sources, minlength=len(coords)))
+    return Ragged(offsets, targets[order].astype(INDEX_DTYPE))
+
+
+def half_edge_embedding(coords, adjacency, triangles=None): # pylint: disable=R0914
+    """
+    Returns the half-edge pointers of a clockwise CSR adjacency, where
+    half-edge h is the CSR slot h (from the row's node to values[h]):
+        twin:           the half-edge going the other way
+        next:           the next half-edge around h's face (the one after
+                        the twin in the target's clockwise row)
+        face:           id of the triangle on h's side (-1 for the outer face)
+        triangles:      (faces, 3) node indexes, counter clockwise
+        face_adjacency: (faces, 3) face across each triangle edge
+                        (vertex i to vertex i + 1), -1 on the outer face
+    If triangles is None, the faces are read off the embedding instead
+    """
+    size = len(adjacency)
+    offsets = adjacency.offsets
+    targets = adjacency.values.astype(np.int64)
+    origins = np.repeat(np.arange(size, dtype=np.int64), np.diff(offsets))
+
+    keys = origins * size + targets
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+
+    def find(origin, target):
+        return order[np.searchsorted(sorted_keys, origin * size + target)]
+
+    twin = find(targets, origins)
+    next_half_edge = twin + 1
+    wrap = next_half_edge == offsets[targets + 1]
+    next_half_edge[wrap] = offsets[targets[wrap]]
+
+    coords = np.asarray(coords, dtype=np.float64)
+
+    def signed_areas(triangles):
+        a, b, c = coords[triangles[:, 0]], coords[triangles[:, 1]], coords[triangles[:, 2]]
+        return (b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1]) - (b[:, 1] - a[:, 1]) * (c[:, 0] - a[:, 0])
+
+    if triangles is None:
+        # inner faces are the orbits of next of length 3 that are counter
+        # clockwise (the outer face goes around clockwise), each listed
+        # once from its smallest half-edge
+        half_edges = np.arange(len(targets))
+        second = next_half_edge
+        third = next_half_edge[second]
+        first = np.flatnonzero(
+            (next_half_edge[third] == half_edges) & (half_edges < second) & (half_edges < third)
+        )
+        triangles = np.stack([origins[first], origins[second[first]], origins[third[first]]], axis=1)
+        triangles = triangles[signed_areas(triangles) > 0]
+    triangles = np.asarray(triangles, dtype=np.int64).reshape(-1, 3)
+    area = signed_areas(triangles)
+    # drop degenerate triangles and make sure the rest are counter clockwise
+    triangles, area = triangles[area != 0], area[area != 0]
+    triangles[area < 0] = triangles[area < 0][:, [0, 2, 1]]
+
+    sides = np.stack([
+        find(triangles[:, i], triangles[:, (i + 1) % 3]) for i in range(3)
+    ], axis=1)
+    face = np.full(len(targets), -1, dtype=np.int64)
+    face[sides] = np.arange(len(triangles))[:, None]
+
+    return (
+        twin.astype(INDEX_DTYPE),
+        next_half_edge.astype(INDEX_DTYPE),
+        face.astype(INDEX_DTYPE),
+        triangles.astype(INDEX_DTYPE),
+        face[twin[sides]].astype(INDEX_DTYPE)
+    )
+
+
+# fields of the columnar format (see GraphArrays.to_columns): name, attribute,
+# whether its values are node indexes (sent as node ids) and the attribute
+# splitting its rows by level
+COLUMNS = (
+    ('coords', 'coords', False, None),
+    ('distance', 'distance', False, None),
+    ('is_boundary', 'is_boundary', False, None),
+    ('is_root_element', 'is_root_element', False, None),
+    ('relations', 'adjacency', True, None),
+    ('triangles', 'triangles', True, None),
+    ('levels', 'levels', True, None),
+    ('cycles', 'cycles', True, 'level_cycle_offsets'),
+    ('paths', 'paths', True, 'level_path_offsets'),
+    ('level_cycles', 'node_cycles', False, None),
+    ('level_paths', 'node_paths', False, None),
+    ('betweener_paths', 'betweener_paths', False, None)
+)
+COLUMN_FIELDS = tuple(column[0] for column in COLUMNS)
+
+
+class GraphArrays(): # pylint: disable=R0902
+    """
+    Coordinates, flags and CSR adjacency (neighbours in clockwise order) for
+    every node, plus the levels and level elements computed from them.
+    Nodes are referred to by index (node id - 1)
+    """
+    def __init__(self, coords, is_boundary, adjacency, triangles=None):
+        size = len(coords)
+        self.coords = coords
+        self.is_boundary = is_boundary
+        self.adjacency = adjacency
+        # face table and half-edge pointers (see half_edge_embedding)
+        self.twin, self.next, self.face, self.triangles, self.face_adjacency = (
+            half_edge_embedding(coords, adjacency, triangles)
+        )
+        # -1 until the distance from the outer boundary has been computed
+        self.distance = np.full(size, -1, dtype=INDEX_DTYPE)
+        self.is_root_element = np.zeros(size, dtype=bool)
+        # node indexes of every level, level cycle and level path
+        self.levels = Ragged.from_lists([])
+        self.cycles = Ragged.from_lists([])
+        self.paths = Ragged.from_lists([])
+        # level n owns cycles[level_cycle_offsets[n]:level_cycle_offsets[n + 1]]
+        self.level_cycle_offsets = np.zeros(1, dtype=np.int64)
+        self.level_path_offsets = np.zeros(1, dtype=np.int64)
+        # per node: level local ids of its level cycles / paths and betweener paths
+        self.node_cycles = Ragged.from_lists([[]] * size)
+        self.node_paths = Ragged.from_lists([[]] * size)
+        self.betweener_paths = Ragged.from_lists([[]] * size)
+
+    # array attributes, in the order they are stored (Ragged attributes are
+    # stored as two arrays: "<name>.offsets" and "<name>.values")
+    FIELDS = (
+        'coords', 'is_boundary', 'adjacency', 'twin', 'next', 'face', 'triangles',
+        'face_adjacency', 'distance', 'is_root_element', 'levels', 'cycles', 'paths',
+        'level_cycle_offsets', 'level_path_offsets', 'node_cycles', 'node_paths',
+        'betweener_paths'
+    )
+
+    def __len__(self):
+        return len(self.coords)
+
+    def to_arrays(self):
+        """
+        Returns a flat dictionary of every array in the graph
+        """
+        arrays = {}
+        for name in GraphArrays.FIELDS:
+            value = getattr(self, name)
+            if isinstance(value, Ragged):
+                arrays['{}.offsets'.format(name)] = value.offsets
+                arrays['{}.values'.format(name)] = value.values
+            else:
+                arrays[name] = value
+        return arrays
+
+    def to_columns(self, fields=None):
+        """
+        Returns the arrays of the columnar format for some fields (all of
+        COLUMN_FIELDS by default), in that order: a flat dictionary where
+        ragged fields are stored as "<field>.offsets" and "<field>.values"
+        (plus "<field>.level_offsets" for level cycles and paths). Node i
+        has id i + 1, and nodes are referred to by id
+        """
+        columns = {}
+        for field, name, is_node, level_offsets in COLUMNS:
+            if fields is not None and field not in fields:
+                continue
+            value = getattr(self, name)
+            if isinstance(value, Ragged):
+                columns['{}.offsets'.format(field)] = value.offsets
+                columns['{}.values'.format(field)] = value.values + 1 if is_node else value.values
+            else:
+                columns[field] = value + 1 if is_node else value
+            if level_offsets:
+                columns['{}.level_offsets'.format(field)] = getattr(self, level_offsets)
+        return columns
+
+    @staticmethod
+    def from_arrays(arrays):
+        """
+        Builds the graph from the output of to_arrays (the arrays are used as
+        they are, without copying or recomputing anything)
+        """
+        graph = GraphArrays.__new__(GraphArrays)
+        for name in GraphArrays.FIELDS:
+            if name in arrays:
+                setattr(graph, name, arrays[name])
+            else:
+                setattr(graph, name, Ragged(
+                    arrays['{}.offsets'.format(name)], arrays['{}.values'.format(name)]
+                ))
+        return graph
+
+    def reordered(self, order):
+        """
+        Returns a copy of the graph whose node i is the node order[i] of this
+        one (order is a permutation of the node indexes). Rows of per node
+        arrays, and the half-edges leaving a node, move with it
+        """
+        order = np.asarray(order, dtype=np.int64)
+        new_index = np.empty_like(order)
+        new_index[order] = np.arange(len(order))
+
+        def move_rows(ragged):
+            # slots[i] is the old position of the value at position i
+            lengths = np.diff(ragged.offsets)[order]
+            offsets = np.zeros(len(order) + 1, dtype=np.int64)
+            offsets[1:] = np.cumsum(lengths)
+            slots = np.arange(offsets[-1]) + np.repeat(ragged.offsets[:-1][order] - offsets[:-1], lengths)
+            return Ragged(offsets, ragged.values[slots]), slots
+
+        def renumber(values):
+            return new_index[values].astype(values.dtype)
+
+        graph = GraphArrays.__new__(GraphArrays)
+        for name in ('coords', 'is_boundary', 'distance', 'is_root_element'):
+            setattr(graph, name, getattr(self, name)[order])
+        adjacency, slots = move_rows(self.adjacency)
+        graph.adjacency = Ragged(adjacency.offsets, renumber(adjacency.values))
+        new_slot = np.empty_like(slots)
+        new_slot[slots] = np.arange(len(slots))
+        graph.twin = new_slot[self.twin[slots]].astype(self.twin.dtype)
+        graph.next = new_slot[self.next[slots]].astype(self.next.dtype)
+        graph.face = self.face[slots]
+        graph.triangles = renumber(self.triangles)
+        graph.face_adjacency = self.face_adjacency
+        for name in ('levels', 'cycles', 'paths'):
+            ragged = getattr(self, name)
+            setattr(graph, name, Ragged(ragged.offsets, renumber(ragged.values)))
+        graph.level_cycle_offsets = self.level_cycle_offsets
+        graph.level_path_offsets = self.level_path_offsets
+        for name in ('node_cycles', 'node_paths', 'betweener_paths'):
+            setattr(graph, name, move_rows(getattr(self, name))[0])
+        return graph
+
+    @staticmethod
+    def from_json(data):
+        """
+        Builds the arrays from the serialized json format (see to_nodes and
+        to_levels)
+        """
+        nodes = [data['nodes'][key] for key in sorted(data['nodes'], key=int)]
+        graph = GraphArrays(
+            np.array([node['coords'] for node in nodes]).reshape(-1, 2),
+            np.isin(np.arange(1, len(nodes) + 1), data['boundary_nodes']),
+            Ragged.from_lists([[related - 1 for related in node['relations']] for node in nodes])
+        )
+        graph.distance[:] = [-1 if node['distance'] is None else node['distance'] for node in nodes]
+        graph.is_root_element[:] = [node['is_root_element'] for node in nodes]
+        graph.levels = Ragged.from_lists([[i - 1 for i in level['node_ids']] for level in data['levels']])
+        graph.cycles = Ragged.from_lists([
+            [i - 1 for i in cycle] for level in data['levels'] for cycle in level['cycles']
+        ])
+        graph.paths = Ragged.from_lists([
+            [i - 1 for i in path] for level in data['levels'] for path in level['paths']
+        ])
+        graph.level_cycle_offsets = np.cumsum([0] + [len(level['cycles']) for level in data['levels']])
+        graph.level_path_offsets = np.cumsum([0] + [len(level['paths']) for level in data['levels']])
+        graph.node_cycles = Ragged.from_lists([node['level_cycles'] for node in nodes])
+        graph.node_paths = Ragged.from_lists([node['level_paths'] for node in nodes])
+        graph.betweener_paths = Ragged.from_lists([node['betweener_paths'] for node in nodes])
+        return graph
+
+    def to_nodes(self):
+        """
+        Returns the dictionary of node dictionaries (keyed by node id) used by
+        the json format
+        """
+        coords = self.coords.tolist()
+        relations = self.adjacency.tolist()
+        distance = self.distance.tolist()
+        is_root_element = self.is_root_element.tolist()
+        node_cycles = self.node_cycles.tolist()
+        node_paths = self.node_paths.tolist()
+        betweener_paths = self.betweener_paths.tolist()
+        nodes = {}
+        for index in range(len(self)):
+            nodes[index + 1] = {
+                'id': index + 1,
+                'coords': coords[index],
+                'distance': None if distance[index] == -1 else distance[index],
+                'relations': [related + 1 for related in relations[index]],
+                'level_cycles': node_cycles[index], # ids of any level cycles this node is a part of
+                'level_paths': node_paths[index],   # ids of any level paths this node is a part of
+                'is_root_element': is_root_element[index],
+                'betweener_paths': betweener_paths[index]
+            }
+        return nodes
+
+    def to_levels(self):
+        """
+        Returns the list of level dictionaries used by the json format
+        """
+        cycles = [[i + 1 for i in cycle] for cycle in self.cycles.tolist()]
+        paths = [[i + 1 for i in path] for path in self.paths.tolist()]
+        cycle_offsets = self.level_cycle_offsets.tolist()
+        path_offsets = self.level_path_offsets.tolist()
+        return [
+            {
+                'node_ids': [i + 1 for i in node_ids],
+                'cycles': cycles[cycle_offsets[level]:cycle_offsets[level + 1]],
+                'paths': paths[path_offsets[level]:path_offsets[level + 1]]
+            }
+            for level, node_ids in enumerate(self.levels.tolist())
+        ]
+
+    def boundary_node_ids(self):
+        """
+        Returns the ids of the nodes on the outer boundary
+        """
+        return (np.flatnonzero(self.is_boundary) + 1).tolist()
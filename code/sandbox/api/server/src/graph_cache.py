@@ -0,0 +1,78 @@
+"""
+Process level LRU cache of constructed graphs
+"""
+
+from collections import OrderedDict
+import threading
+
+
+class GraphCache():
+    """
+    Keeps the most recently used graphs in memory, evicting the least
+    recently used ones once their approximate total size goes over max_size
+    (bytes). Counts hits and misses
+    """
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict() # key -> (graph, approximate size)
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, build):
+        """
+        Returns the cached graph for a key, calling build() to construct it
+        on a miss
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                # views built since the last access make the graph bigger
+                self.resize(key, entry[0])
+                return entry[0]
+            self.misses += 1
+
+        graph = build()
+
+        with self.lock:
+            if key in self.entries:
+                self.size -= self.entries[key][1]
+            self.entries[key] = (graph, 0)
+            self.resize(key, graph)
+            while self.size > self.max_size and len(self.entries) > 1:
+                _, (_, size) = self.entries.popitem(last=False)
+                self.size -= size
+        return graph
+
+    def resize(self, key, graph):
+        """
+        Updates the stored size of an entry (lock must be held)
+        """
+        size = graph.approximate_size()
+        self.size += size - self.entries[key][1]
+        self.entries[key] = (graph, size)
+
+    def invalidate(self, seed=None):
+        """
+        Drops every cached graph for a seed (or every graph if no seed is given)
+        """
+        with self.lock:
+            for key in list(self.entries):
+                if seed is None or key[0] == seed:
+                    self.size -= self.entries.pop(key)[1]
+
+    def stats(self):
+        """
+        Returns the hit/miss counters and the current size of the cache
+        """
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self.entries),
+                'size': self.size,
+                'max_size': self.max_size
+            }
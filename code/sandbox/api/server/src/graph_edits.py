@@ -0,0 +1,705 @@
+"""
+Incremental editing of a graph: inserting or removing a point only
+re-triangulates the cavity around it and repairs the distances, levels,
+level elements and betweener paths where they can change
+
+The python level work (walking the triangulation, the cavity, relinking the
+half-edges around it, the distance repair and the level elements of the
+touched levels) grows with the size of the change. The arrays themselves are
+rebuilt with vectorized copies, as stored graphs are read-only memory maps
+"""
+
+from collections import defaultdict
+import heapq
+
+import numpy as np
+
+from .delaunay import incircle, orient
+from .graph_arrays import INDEX_DTYPE, GraphArrays, Ragged, clockwise_adjacency
+from .level_elements import LevelElementFinder
+
+# distance of the nodes whose distance is being recomputed
+UNKNOWN = np.iinfo(INDEX_DTYPE).max
+
+
+def splice_rows(ragged, rows, removed=None):
+    """
+    Returns a copy of a ragged array with optionally one row removed (the
+    rows after it move up) and some rows replaced (rows maps row indexes,
+    after the removal, to lists; indexes past the end append rows)
+    """
+    size = len(ragged)
+    row_ids = np.repeat(np.arange(size), np.diff(ragged.offsets))
+    values = ragged.values
+    if removed is not None:
+        keep = row_ids != removed
+        row_ids, values = row_ids[keep], values[keep]
+        row_ids -= row_ids > removed
+        size -= 1
+    changed = sorted(rows)
+    keep = ~np.isin(row_ids, changed)
+    new_ids = np.array([row for row in changed for _ in rows[row]], dtype=np.int64)
+    new_values = np.array([value for row in changed for value in rows[row]], dtype=np.int64)
+
+    ids = np.concatenate([row_ids[keep], new_ids])
+    values = np.concatenate([values[keep], new_values]).astype(ragged.values.dtype)
+    # a row is either kept or replaced as a whole, so a stable sort keeps the
+    # order within every row
+    order = np.argsort(ids, kind='stable')
+    ids, values = ids[order], values[order]
+    new_size = max([size] + [row + 1 for row in changed])
+    offsets = np.zeros(new_size + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(np.bincount(ids, minlength=new_size))
+    return Ragged(offsets, values)
+
+
+def splice_groups(ragged, group_offsets, groups, group_count):
+    """
+    Returns a copy of a ragged array whose rows are grouped in consecutive
+    blocks (group g owns rows group_offsets[g]:group_offsets[g + 1], like
+    the level elements of a level) with the rows of some groups replaced
+    (groups maps group indexes to lists of rows), keeping group_count
+    groups. Returns the new ragged array and group offsets
+    """
+    group_offsets = np.asarray(group_offsets, dtype=np.int64)
+    old_groups = np.repeat(np.arange(len(group_offsets) - 1), np.diff(group_offsets))
+    keep_rows = ~np.isin(old_groups, list(groups)) & (old_groups < group_count)
+    lengths = np.diff(ragged.offsets)
+    keep_values = np.repeat(keep_rows, lengths)
+
+    new_rows = [(group, row) for group in sorted(groups) for row in groups[group]]
+    row_groups = np.concatenate([
+        old_groups[keep_rows], np.array([group for group, _ in new_rows], dtype=np.int64)
+    ])
+    row_lengths = np.concatenate([
+        lengths[keep_rows], np.array([len(row) for _, row in new_rows], dtype=np.int64)
+    ])
+    value_groups = np.concatenate([
+        np.repeat(old_groups, lengths)[keep_values],
+        np.array([group for group, row in new_rows for _ in row], dtype=np.int64)
+    ])
+    values = np.concatenate([
+        ragged.values[keep_values],
+        np.array([value for _, row in new_rows for value in row], dtype=np.int64)
+    ]).astype(ragged.values.dtype)
+
+    # same as splice_rows: groups are kept or replaced as a whole
+    row_order = np.argsort(row_groups, kind='stable')
+    value_order = np.argsort(value_groups, kind='stable')
+    offsets = np.zeros(len(row_order) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(row_lengths[row_order])
+    new_group_offsets = np.zeros(group_count + 1, dtype=np.int64)
+    new_group_offsets[1:] = np.cumsum(np.bincount(row_groups, minlength=group_count))
+    return Ragged(offsets, values[value_order]), new_group_offsets
+
+
+class GraphEditor():
+    """
+    Inserts and removes points of the graph of a MaximallyConnectedPlanarGraph
+    (whose identify_level_elements and identify_special_nodes are used to
+    repair the levels). Both return new graph arrays, leaving the old ones
+    untouched. Level elements are only recomputed for the levels that
+    changed, new nodes of a level coming after its old ones, so element ids
+    can differ from the ones of a graph built from scratch
+    """
+    def __init__(self, planar_graph):
+        self.planar_graph = planar_graph
+        self.graph = planar_graph.graph
+        self.coords = planar_graph.graph.coords
+
+    def point(self, index):
+        """
+        Coordinates of a node (as python numbers)
+        """
+        return self.coords[index].tolist()
+
+    def triangle(self, face):
+        """
+        Node indexes of a triangle (counter clockwise)
+        """
+        return self.graph.triangles[face].tolist()
+
+    def in_circumcircle(self, face, point):
+        """
+        True if the point lies strictly inside the circumcircle of a triangle
+        """
+        a, b, c = (self.point(index) for index in self.triangle(face))
+        return incircle(a[0], a[1], b[0], b[1], c[0], c[1], point[0], point[1]) > 0
+
+    def sees(self, a, b, point):
+        """
+        True if a point conflicts with the hull edge a -> b (inside on the
+        left): it lies strictly outside of it, or strictly between a and b
+        (the same rule as the ghost triangles of the triangulation)
+        """
+        a_x, a_y = self.point(a)
+        b_x, b_y = self.point(b)
+        side = orient(a_x, a_y, b_x, b_y, point[0], point[1])
+        if side != 0:
+            return side < 0
+        return (
+            min(a_x, b_x) <= point[0] <= max(a_x, b_x) and
+            min(a_y, b_y) <= point[1] <= max(a_y, b_y) and
+            tuple(point) not in ((a_x, a_y), (b_x, b_y))
+        )
+
+    def hull_neighbors(self, a, b):
+        """
+        Returns the hull edges before and after the hull edge a -> b (going
+        counter clockwise around the hull)
+        """
+        graph = self.graph
+        previous = following = None
+        for slot in range(graph.adjacency.offsets[a], graph.adjacency.offsets[a + 1]):
+            # a -> x on the outer face: the hull edge x -> a comes before
+            if graph.face[slot] == -1:
+                previous = (int(graph.adjacency.values[slot]), a)
+        for slot in range(graph.adjacency.offsets[b], graph.adjacency.offsets[b + 1]):
+            # b -> x whose twin is on the outer face: the hull edge after
+            if graph.face[graph.twin[slot]] == -1:
+                following = (b, int(graph.adjacency.values[slot]))
+        return previous, following
+
+    def locate(self, point):
+        """
+        Walks the triangulation towards a point. Returns (face, None) for the
+        triangle containing it, or (face, i) if it is outside the hull edge i
+        of the triangle face
+        """
+        graph = self.graph
+        face = 0
+        start = 0
+        while True:
+            vertices = self.triangle(face)
+            for offset in range(3):
+                i = (start + offset) % 3
+                a_x, a_y = self.point(vertices[i])
+                b_x, b_y = self.point(vertices[(i + 1) % 3])
+                if orient(a_x, a_y, b_x, b_y, point[0], point[1]) < 0:
+                    across = int(graph.face_adjacency[face, i])
+                    if across == -1:
+                        return face, i
+                    face = across
+                    break
+            else:
+                for vertex in vertices:
+                    if self.point(vertex) == list(point):
+                        raise ValueError('Point {} is already in the graph'.format(point))
+                return face, None
+            start = (start + 1) % 3
+
+    def cavity(self, point):
+        """
+        Returns the triangles whose circumcircle contains a point and the
+        hull edges (a, b) it conflicts with (see sees), which together form a
+        connected region
+        """
+        graph = self.graph
+        face, outside = self.locate(point)
+        faces = set()
+        hull_edges = {}
+        stack = []
+        if outside is None:
+            faces.add(face)
+            stack.append(('face', face))
+        else:
+            vertices = self.triangle(face)
+            edge = (vertices[outside], vertices[(outside + 1) % 3])
+            hull_edges[edge] = face
+            stack.append(('hull', edge))
+
+        while stack:
+            kind, item = stack.pop()
+            if kind == 'face':
+                vertices = self.triangle(item)
+                for i in range(3):
+                    across = int(graph.face_adjacency[item, i])
+                    if across == -1:
+                        edge = (vertices[i], vertices[(i + 1) % 3])
+                        if edge not in hull_edges and self.sees(edge[0], edge[1], point):
+                            hull_edges[edge] = item
+                            stack.append(('hull', edge))
+                    elif across not in faces and self.in_circumcircle(across, point):
+                        faces.add(across)
+                        stack.append(('face', across))
+                continue
+            face = hull_edges[item]
+            if face not in faces and self.in_circumcircle(face, point):
+                faces.add(face)
+                stack.append(('face', face))
+            for edge in self.hull_neighbors(*item):
+                if edge not in hull_edges and self.sees(edge[0], edge[1], point):
+                    hull_edges[edge] = self.hull_face(edge)
+                    stack.append(('hull', edge))
+        return faces, hull_edges
+
+    def hull_face(self, edge):
+        """
+        Returns the triangle on the inner side of a hull edge
+        """
+        graph = self.graph
+        a, b = edge
+        row = graph.adjacency[a]
+        slot = int(graph.adjacency.offsets[a]) + int(np.flatnonzero(row == b)[0])
+        return int(graph.face[slot])
+
+    def insert(self, x_coord, y_coord):
+        """
+        Inserts a point (Bowyer-Watson: the triangles whose circumcircle
+        contains it are replaced by a fan around it) and returns the new
+        graph arrays. The new node is the last one
+        """
+        point = [x_coord, y_coord]
+        new_index = len(self.graph)
+        faces, hull_edges = self.cavity(point)
+        new_triangles = []
+        for face in faces:
+            vertices = self.triangle(face)
+            for i in range(3):
+                edge = (vertices[i], vertices[(i + 1) % 3])
+                across = int(self.graph.face_adjacency[face, i])
+                if (across == -1 and edge not in hull_edges) or (across != -1 and across not in faces): # pylint: disable=C0301
+                    new_triangles.append([edge[0], edge[1], new_index])
+        for (a, b), face in hull_edges.items():
+            if face not in faces:
+                new_triangles.append([b, a, new_index])
+
+        coords = np.concatenate([
+            self.coords, np.array([point], dtype=np.result_type(self.coords, *point))
+        ])
+        return self.apply(coords, sorted(faces), new_triangles, added=new_index)
+
+    def star(self, index):
+        """
+        Returns the triangles around a node and its neighbours counter
+        clockwise (for a hull node, from the hull neighbour after it to the
+        one before it)
+        """
+        graph = self.graph
+        start = int(graph.adjacency.offsets[index])
+        neighbors = graph.adjacency[index].tolist()
+        faces = [int(graph.face[slot]) for slot in range(start, start + len(neighbors))]
+        ring = neighbors[::-1]
+        if -1 in faces:
+            # index -> x is on the outer face: the hull goes x -> index -> ...
+            outer = ring.index(neighbors[faces.index(-1)])
+            ring = ring[outer + 1:] + ring[:outer + 1]
+        return [face for face in faces if face != -1], ring, -1 in faces
+
+    def fill(self, ring, closed):
+        """
+        Returns the Delaunay triangles filling the hole left by a removed
+        node, given its neighbours counter clockwise: ears (three consecutive
+        neighbours, convex, with no other neighbour in their circumcircle)
+        are cut off one at a time. For a hull node the hole is only filled up
+        to the convex hull of the neighbours
+        """
+        ring = list(ring)
+        triangles = []
+        while len(ring) >= 3:
+            positions = range(len(ring)) if closed else range(1, len(ring) - 1)
+            for position in positions:
+                a, b, c = ring[position - 1], ring[position], ring[(position + 1) % len(ring)]
+                (a_x, a_y), (b_x, b_y), (c_x, c_y) = self.point(a), self.point(b), self.point(c)
+                if orient(a_x, a_y, b_x, b_y, c_x, c_y) <= 0:
+                    continue
+                if any(
+                        incircle(a_x, a_y, b_x, b_y, c_x, c_y, *self.point(other)) > 0
+                        for other in ring if other not in (a, b, c)
+                ):
+                    continue
+                triangles.append([a, b, c])
+                del ring[position]
+                break
+            else:
+                if closed:
+                    raise RuntimeError('No ear left in the hole of a removed node')
+                break
+        return triangles
+
+    def remove(self, index):
+        """
+        Removes a node (its triangles are replaced by a Delaunay
+        triangulation of the hole) and returns the new graph arrays. The
+        last node takes its index, every other node keeps its own
+        """
+        if len(self.graph) <= 3:
+            raise ValueError('Cannot remove a node from a single triangle')
+        node_id = index + 1
+        last = len(self.graph) - 1
+        if index != last:
+            # swapped with the last node, whose removal renumbers nothing
+            order = np.arange(len(self.graph))
+            order[[index, last]] = [last, index]
+            self.graph = self.graph.reordered(order)
+            self.coords = self.graph.coords
+        faces, ring, on_hull = self.star(last)
+        new_triangles = self.fill(ring, not on_hull)
+        if len(self.graph.triangles) == len(faces) and not new_triangles:
+            raise ValueError('Removing node {} leaves only collinear points'.format(node_id))
+        coords = np.delete(self.coords, last, axis=0)
+        return self.apply(coords, faces, new_triangles, removed=last)
+
+    def apply(self, coords, removed_faces, new_triangles, added=None, removed=None): # pylint: disable=R0913,R0914
+        """
+        Returns the new graph arrays once some triangles have been replaced,
+        with the levels repaired around the nodes whose neighbours changed
+        """
+        graph = self.graph
+
+        def sides(triangles):
+            return {
+                (min(t[i], t[(i + 1) % 3]), max(t[i], t[(i + 1) % 3]))
+                for t in triangles for i in range(3)
+            }
+        old_sides = sides(self.triangle(face) for face in removed_faces)
+        new_sides = sides(new_triangles)
+        added_edges = new_sides - old_sides
+        if removed is None:
+            removed_edges = old_sides - new_sides
+        else:
+            # the edges around the hole stay, even those no new triangle uses
+            # (they are on the hull or belong to triangles outside the hole)
+            removed_edges = {
+                (min(index, removed), max(index, removed))
+                for index in graph.adjacency[removed].tolist()
+            }
+
+        # nodes whose neighbours changed (old indexes), and their new neighbours
+        touched = {index for edge in removed_edges | added_edges for index in edge} - {removed}
+        rows = {}
+        for index in touched:
+            neighbors = set() if index == added else set(graph.adjacency[index].tolist())
+            neighbors -= {b if a == index else a for a, b in removed_edges if index in (a, b)}
+            neighbors |= {b if a == index else a for a, b in added_edges if index in (a, b)}
+            rows[index] = neighbors
+
+        def renumber(values):
+            values = np.asarray(values, dtype=np.int64)
+            return values if removed is None else values - (values > removed)
+
+        # clockwise order of the touched rows, with the new numbering
+        new_touched = renumber(sorted(touched)).tolist()
+        edges = {
+            (min(a, b), max(a, b))
+            for index, neighbors in rows.items() for a, b in ((index, other) for other in neighbors)
+        }
+        sorted_rows = clockwise_adjacency(
+            coords, renumber(sorted(edges)).reshape(-1, 2)
+        )
+        adjacency = splice_rows(graph.adjacency, {}, removed)
+        adjacency.values = renumber(adjacency.values).astype(INDEX_DTYPE)
+        adjacency = splice_rows(
+            adjacency, {index: sorted_rows[index].tolist() for index in new_touched}
+        )
+
+        keep = np.ones(len(graph.triangles), dtype=bool)
+        keep[list(removed_faces)] = False
+        new_graph = GraphArrays.__new__(GraphArrays)
+        new_graph.coords = coords
+        new_graph.adjacency = adjacency
+        self.patch_embedding(
+            new_graph, keep, renumber(new_triangles).reshape(-1, 3), new_touched,
+            sorted((touched | {removed}) - {None, added}), removed
+        )
+        origins = np.repeat(np.arange(len(coords)), np.diff(adjacency.offsets))
+        new_graph.is_boundary = np.zeros(len(coords), dtype=bool)
+        new_graph.is_boundary[origins[new_graph.face == -1]] = True
+
+        LevelRepair(self.planar_graph, graph, new_graph, added, removed).run(set(new_touched))
+        return new_graph
+
+    def patch_embedding(self, new_graph, keep, new_triangles, touched, old_touched, removed): # pylint: disable=R0913,R0914
+        """
+        Fills in the half-edge embedding of the edited graph (see
+        half_edge_embedding) from the old one: the half-edges of untouched
+        rows only move (vectorized), while the ones of the touched rows and
+        the triangles around them are linked up again one by one.
+        old_touched holds the old indexes of the touched (and removed) rows
+        """
+        graph = self.graph
+        old_offsets, offsets = graph.adjacency.offsets, new_graph.adjacency.offsets
+        values = new_graph.adjacency.values
+        rows = {}
+
+        def slot(origin, target):
+            if origin not in rows:
+                rows[origin] = values[offsets[origin]:offsets[origin + 1]].tolist()
+            return int(offsets[origin]) + rows[origin].index(target)
+
+        # new index of every old node
+        new_row = np.arange(len(graph))
+        if removed is not None:
+            new_row -= new_row > removed
+
+        # new slot of every half-edge of an untouched row
+        old_origins = np.repeat(np.arange(len(graph)), np.diff(old_offsets))
+        is_touched = np.zeros(len(graph), dtype=bool)
+        is_touched[old_touched] = True
+        moved = np.flatnonzero(~is_touched[old_origins])
+        slot_map = np.full(len(old_origins), -1, dtype=np.int64)
+        slot_map[moved] = (
+            offsets[new_row[old_origins[moved]]] + moved - old_offsets[old_origins[moved]]
+        )
+
+        twin = np.empty(len(values), dtype=np.int64)
+        linked = moved[~is_touched[graph.adjacency.values[moved]]]
+        twin[slot_map[linked]] = slot_map[graph.twin[linked]]
+        for origin in touched:
+            for half_edge in range(offsets[origin], offsets[origin + 1]):
+                opposite = slot(int(values[half_edge]), origin)
+                twin[half_edge] = opposite
+                twin[opposite] = half_edge
+        targets = values.astype(np.int64)
+        next_half_edge = twin + 1
+        wrap = next_half_edge == offsets[targets + 1]
+        next_half_edge[wrap] = offsets[targets[wrap]]
+
+        face_map = np.full(len(keep), -1, dtype=np.int64)
+        face_map[keep] = np.arange(np.count_nonzero(keep))
+        old_face = graph.face[moved]
+        face = np.full(len(values), -1, dtype=np.int64)
+        face[slot_map[moved]] = np.where(old_face == -1, -1, face_map[old_face])
+        old_adjacency = graph.face_adjacency[keep]
+        face_adjacency = np.where(old_adjacency == -1, -1, face_map[old_adjacency])
+        triangles = np.concatenate([
+            new_row[graph.triangles[keep]], new_triangles
+        ]).astype(np.int64)
+        face_adjacency = np.concatenate([
+            face_adjacency, np.full((len(new_triangles), 3), -1, dtype=np.int64)
+        ])
+
+        # triangles with a touched corner: every face and face across is
+        # looked up again
+        around = np.flatnonzero(np.isin(triangles, touched).any(axis=1)).tolist()
+        for origin in touched:
+            face[offsets[origin]:offsets[origin + 1]] = -1
+        corners = triangles[around].tolist()
+        for face_id, corner in zip(around, corners):
+            for i in range(3):
+                face[slot(corner[i], corner[(i + 1) % 3])] = face_id
+        for face_id, corner in zip(around, corners):
+            for i in range(3):
+                face_adjacency[face_id, i] = face[twin[slot(corner[i], corner[(i + 1) % 3])]]
+
+        new_graph.twin = twin.astype(INDEX_DTYPE)
+        new_graph.next = next_half_edge.astype(INDEX_DTYPE)
+        new_graph.face = face.astype(INDEX_DTYPE)
+        new_graph.triangles = triangles.astype(INDEX_DTYPE)
+        new_graph.face_adjacency = face_adjacency.astype(INDEX_DTYPE)
+
+
+class LevelRepair(): # pylint: disable=R0902
+    """
+    Carries the distances, levels, level elements and betweener paths of a
+    graph over to an edited copy of it, recomputing them only around the
+    nodes whose neighbours changed
+    """
+    def __init__(self, planar_graph, old_graph, new_graph, added=None, removed=None): # pylint: disable=R0913
+        self.planar_graph = planar_graph
+        self.old_graph = old_graph
+        self.graph = new_graph
+        self.added = added
+        self.removed = removed
+        self.neighbor_rows = {}
+        # old distances with the new numbering (-1 for an added node)
+        old_distance = old_graph.distance
+        if removed is not None:
+            old_distance = np.delete(old_distance, removed)
+        if added is not None:
+            old_distance = np.append(old_distance, -1)
+        self.old_distance = old_distance.astype(INDEX_DTYPE)
+
+    def neighbors(self, index):
+        """
+        Neighbours of a node in the edited graph (as a python list)
+        """
+        if index not in self.neighbor_rows:
+            self.neighbor_rows[index] = self.graph.adjacency[index].tolist()
+        return self.neighbor_rows[index]
+
+    def renumber(self, values):
+        """
+        Maps old node indexes to the new ones
+        """
+        values = np.asarray(values, dtype=np.int64)
+        return values if self.removed is None else values - (values > self.removed)
+
+    def run(self, touched):
+        """
+        Repairs everything, given the nodes whose neighbours changed (new
+        indexes)
+        """
+        changed = self.repair_distances(touched)
+        affected = touched | changed
+        levels = {int(self.old_distance[index]) for index in affected} | {
+            int(self.graph.distance[index]) for index in affected
+        }
+        if self.removed is not None:
+            levels.add(int(self.old_graph.distance[self.removed]))
+        levels.discard(-1)
+        self.repair_levels(levels, changed)
+        self.repair_betweener_paths(affected)
+
+    def repair_distances(self, touched):
+        """
+        Computes the new distances from the outer boundary: the nodes that
+        lost every neighbour one step closer to the boundary are invalidated
+        (in order of distance, so the ones relying on them are checked after
+        them), then distances are relaxed outwards from the touched and
+        invalidated nodes. Returns the nodes whose distance changed
+        """
+        graph = self.graph
+        distance = self.old_distance.copy()
+        old_distance = self.old_distance
+
+        invalid = set()
+        checked = set()
+        queue = [(int(old_distance[index]), index) for index in touched]
+        heapq.heapify(queue)
+        while queue:
+            level, index = heapq.heappop(queue)
+            if index in checked:
+                continue
+            checked.add(index)
+            if graph.is_boundary[index]:
+                distance[index] = 0
+                continue
+            if level > 0 and any(
+                    old_distance[other] == level - 1 and other not in invalid
+                    for other in self.neighbors(index)
+            ):
+                continue
+            invalid.add(index)
+            distance[index] = UNKNOWN
+            for other in self.neighbors(index):
+                if level >= 0 and old_distance[other] == level + 1 and other not in checked:
+                    heapq.heappush(queue, (level + 1, other))
+
+        queue = []
+        for index in invalid:
+            candidates = [
+                int(distance[other]) + 1 for other in self.neighbors(index) if other not in invalid
+            ]
+            if candidates:
+                distance[index] = min(candidates)
+                queue.append((int(distance[index]), index))
+        queue.extend((int(distance[index]), index) for index in touched - invalid)
+        heapq.heapify(queue)
+        while queue:
+            level, index = heapq.heappop(queue)
+            if level != distance[index]:
+                continue
+            for other in self.neighbors(index):
+                if distance[other] > level + 1:
+                    distance[other] = level + 1
+                    heapq.heappush(queue, (level + 1, other))
+
+        graph.distance = distance
+        return set(np.flatnonzero(distance != old_distance).tolist())
+
+    def repair_levels(self, levels, changed): # pylint: disable=R0914
+        """
+        Recomputes the node lists, level elements, node element ids and root
+        element flags of some levels, keeping everything else
+        """
+        old_graph, graph = self.old_graph, self.graph
+        distance = graph.distance
+        level_count = int(distance.max()) + 1
+        finder = LevelElementFinder(
+            graph.adjacency.offsets, graph.adjacency.values, graph.twin, local_ids={}
+        )
+
+        old_levels = Ragged(old_graph.levels.offsets, self.renumber_values(old_graph.levels.values))
+        level_rows, cycle_groups, path_groups = {}, {}, {}
+        node_cycles, node_paths = {}, {}
+        is_root_element = np.delete(old_graph.is_root_element, self.removed) if self.removed is not None else old_graph.is_root_element.copy() # pylint: disable=C0301
+        if self.added is not None:
+            is_root_element = np.append(is_root_element, False)
+
+        for level in sorted(levels):
+            if level >= level_count:
+                continue
+            old_nodes = (
+                old_levels[level].tolist() if level < len(old_levels) else []
+            )
+            if self.removed is not None and level == self.old_graph.distance[self.removed]:
+                old_nodes = [
+                    index for index in old_graph.levels[level].tolist() if index != self.removed
+                ]
+                old_nodes = self.renumber(old_nodes).tolist()
+            node_ids = [index for index in old_nodes if distance[index] == level]
+            present = set(node_ids)
+            node_ids.extend(sorted(
+                index for index in changed if distance[index] == level and index not in present
+            ))
+
+            level_cycles, level_paths = self.planar_graph.identify_level_elements(finder, node_ids)
+            level_rows[level] = [node_ids]
+            cycle_groups[level] = level_cycles
+            path_groups[level] = level_paths
+            for index in node_ids:
+                node_cycles[index] = []
+                node_paths[index] = []
+                is_root_element[index] = False
+            # same as get_levels
+            for cycle_id, level_cycle in enumerate(level_cycles):
+                for index in level_cycle:
+                    if not cycle_id in node_cycles[index]:
+                        node_cycles[index].append(cycle_id)
+                        if len(level_cycle) == 3:
+                            is_root_element[index] = True
+            for path_id, level_path in enumerate(level_paths):
+                for index in level_path:
+                    if not path_id in node_paths[index]:
+                        node_paths[index].append(path_id)
+                        is_root_element[index] = True
+
+        def renumbered(ragged):
+            return Ragged(ragged.offsets, self.renumber_values(ragged.values))
+
+        graph.levels, _ = splice_groups(
+            old_levels, np.arange(len(old_levels) + 1), level_rows, level_count
+        )
+        graph.cycles, graph.level_cycle_offsets = splice_groups(
+            renumbered(old_graph.cycles), old_graph.level_cycle_offsets, cycle_groups, level_count
+        )
+        graph.paths, graph.level_path_offsets = splice_groups(
+            renumbered(old_graph.paths), old_graph.level_path_offsets, path_groups, level_count
+        )
+        graph.node_cycles = splice_rows(old_graph.node_cycles, node_cycles, self.removed)
+        graph.node_paths = splice_rows(old_graph.node_paths, node_paths, self.removed)
+        graph.is_root_element = is_root_element
+
+    def renumber_values(self, values):
+        """
+        Node indexes of the old graph with the new numbering (the removed
+        node only appears in rows that are replaced)
+        """
+        return self.renumber(values).astype(INDEX_DTYPE)
+
+    def repair_betweener_paths(self, affected):
+        """
+        Recomputes the betweener paths of the nodes a changed node can add
+        to: a node's contributions depend on its neighbours and their
+        distances, and go to itself and to its neighbours
+        """
+        sources = set(affected)
+        for index in affected:
+            sources.update(self.neighbors(index))
+        receivers = set(sources)
+        for index in sources:
+            receivers.update(self.neighbors(index))
+        contributors = set(receivers)
+        for index in receivers:
+            contributors.update(self.neighbors(index))
+
+        betweener_paths = defaultdict(list)
+        for index in contributors:
+            self.planar_graph.identify_special_nodes(self.graph, index, betweener_paths)
+        # lists built level by level are sorted
+        self.graph.betweener_paths = splice_rows(
+            self.old_graph.betweener_paths,
+            {index: sorted(betweener_paths[index]) for index in receivers},
+            self.removed
+        )
@@ -0,0 +1,110 @@
+"""
+Versioned, memory-mappable binary file holding the arrays of a graph
+
+Layout: MAGIC, the length of the header (8 bytes, little endian), the json
+header and then every array's raw bytes (aligned to ALIGNMENT bytes). The
+header holds the format version, the generation parameters and the dtype,
+shape and offset of every array, so loading only parses the header and maps
+the arrays straight from the page cache
+"""
+
+import json
+import os
+import threading
+
+import numpy as np
+
+FORMAT_VERSION = 1
+MAGIC = b'MCPGRAPH'
+ALIGNMENT = 64
+
+
+def iter_graph_file(arrays, params):
+    """
+    Generates the contents of a graph file for a dictionary of arrays and
+    the generation parameters that produced them, chunk by chunk (bytes)
+    """
+    table = {}
+    offset = 0
+    for name, array in arrays.items():
+        offset += -offset % ALIGNMENT
+        table[name] = {
+            'dtype': np.asarray(array).dtype.str,
+            'shape': list(np.shape(array)),
+            'offset': offset
+        }
+        offset += np.asarray(array).nbytes
+    header = json.dumps({'version': FORMAT_VERSION, 'params': params, 'arrays': table}).encode()
+    start = len(MAGIC) + 8 + len(header)
+    padding = -start % ALIGNMENT
+
+    yield MAGIC + len(header).to_bytes(8, 'little') + header + bytes(padding)
+    position = 0
+    for name, array in arrays.items():
+        yield bytes(table[name]['offset'] - position)
+        data = np.ascontiguousarray(array).tobytes()
+        yield data
+        position = table[name]['offset'] + len(data)
+
+
+def save_graph_file(filepath, arrays, params):
+    """
+    Writes a dictionary of arrays and the generation parameters that
+    produced them (written to a temporary file and renamed, so readers
+    never see a partial file)
+    """
+    temp_filepath = '{}.{}.{}.tmp'.format(filepath, os.getpid(), threading.get_ident())
+    with open(temp_filepath, 'wb') as outfile:
+        for chunk in iter_graph_file(arrays, params):
+            outfile.write(chunk)
+        outfile.close()
+    os.replace(temp_filepath, filepath)
+
+
+def read_header(filepath):
+    """
+    Returns the header of a graph file and the position of its first array
+    (None if the file is missing or is not a graph file)
+    """
+    if not os.path.exists(filepath):
+        return None, None
+    with open(filepath, 'rb') as infile:
+        if infile.read(len(MAGIC)) != MAGIC:
+            return None, None
+        length = int.from_bytes(infile.read(8), 'little')
+        header = json.loads(infile.read(length).decode())
+        infile.close()
+    start = len(MAGIC) + 8 + length
+    return header, start + (-start % ALIGNMENT)
+
+
+def is_current(header, params):
+    """
+    Checks whether a graph file header was written by this format version
+    for the given generation parameters (every key in params must match)
+    """
+    return (
+        header is not None and
+        header['version'] == FORMAT_VERSION and
+        all(header['params'].get(key) == value for key, value in params.items())
+    )
+
+
+def load_graph_file(filepath, params):
+    """
+    Returns the arrays of a graph file as read only memory-mapped arrays,
+    or None if the file is missing, was written by another format version
+    or for different generation parameters (every key in params must match)
+    """
+    header, start = read_header(filepath)
+    if not is_current(header, params):
+        return None
+
+    data = np.memmap(filepath, dtype=np.uint8, mode='r')
+    arrays = {}
+    for name, entry in header['arrays'].items():
+        dtype = np.dtype(entry['dtype'])
+        size = int(np.prod(entry['shape'], dtype=np.int64)) * dtype.itemsize
+        begin = start + entry['offset']
+        arrays[name] = data[begin:begin + size].view(dtype).reshape(entry['shape'])
+    return arrays
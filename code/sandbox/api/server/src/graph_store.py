@@ -0,0 +1,206 @@
+"""
+Read only arrays shared by every server process through memory-mapped files
+
+Arrays derived from a stored graph (its spatial index, its distance DAGs...)
+are materialized once, by the first process that needs them, as a segment:
+a graph file (see graph_file) in the store directory. Every other process
+maps the same file, so the arrays live once in the page cache however many
+processes use them.
+
+Every process attached to a segment holds a shared lock on it for as long as
+the object it attached it for lives. The kernel counts these locks (and
+drops them when a process exits), so a segment is only evicted once no
+process holds it: eviction takes an exclusive lock without waiting, which
+fails while any attachment is left. Processes still mapping an evicted
+segment keep using it, the file is only gone for newcomers
+"""
+
+import fcntl
+import mmap
+import os
+import shutil
+import threading
+import weakref
+
+import numpy as np
+
+from .graph_file import load_graph_file, save_graph_file
+from .single_flight import file_lock
+
+SEGMENT_EXTENSION = '.bin'
+
+
+def is_mapped(array):
+    """
+    Checks whether an array is backed by a memory-mapped file, in which case
+    its memory is shared with every process mapping the same file
+    """
+    while array is not None:
+        if isinstance(array, (np.memmap, mmap.mmap)):
+            return True
+        array = getattr(array, 'base', None)
+    return False
+
+
+def private_nbytes(array):
+    """
+    Number of bytes of an array held by this process alone
+    """
+    return 0 if is_mapped(array) else np.asarray(array).nbytes
+
+
+class GraphStore():
+    """
+    Directory of segments shared by the server processes, evicting the least
+    recently attached segments nobody is attached to once their total size
+    goes over max_size (bytes)
+    """
+    def __init__(self, directory, max_size):
+        self.directory = directory
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.attachments = 0 # held by this process
+
+    def segment_path(self, seed, name):
+        """
+        Returns the path of a segment of a seed
+        """
+        return os.path.join(self.directory, seed, name + SEGMENT_EXTENSION)
+
+    def attach(self, owner, seed, name, params, build):
+        """
+        Returns the arrays of a segment as read only memory-mapped arrays,
+        attached until owner is garbage collected. If the segment is missing
+        or was written for other params, one process materializes it (build()
+        returns its dictionary of arrays) while the others wait for it
+        """
+        filepath = self.segment_path(seed, name)
+        arrays = self.open(owner, filepath, params)
+        if arrays is not None:
+            return arrays
+        with file_lock(os.path.join(self.directory, '.locks', seed, name)):
+            arrays = self.open(owner, filepath, params)
+            if arrays is None:
+                os.makedirs(os.path.dirname(filepath), exist_ok=True)
+                save_graph_file(filepath, build(), params)
+                arrays = self.open(owner, filepath, params)
+        self.evict()
+        return arrays
+
+    def open(self, owner, filepath, params):
+        """
+        Attaches an existing segment (None if it is missing or stale)
+        """
+        try:
+            descriptor = os.open(filepath, os.O_RDONLY)
+        except FileNotFoundError:
+            return None
+        fcntl.flock(descriptor, fcntl.LOCK_SH)
+        arrays = load_graph_file(filepath, params)
+        if arrays is None:
+            os.close(descriptor)
+            return None
+        # attaching makes a segment the most recently used one
+        os.utime(descriptor)
+        with self.lock:
+            self.attachments += 1
+        weakref.finalize(owner, self.detach, descriptor)
+        return arrays
+
+    def detach(self, descriptor):
+        """
+        Releases the lock of an attachment
+        """
+        os.close(descriptor)
+        with self.lock:
+            self.attachments -= 1
+
+    def segments(self):
+        """
+        Returns the path, size and last attachment time of every segment
+        """
+        segments = []
+        if not os.path.exists(self.directory):
+            return segments
+        for seed in os.listdir(self.directory):
+            if seed.startswith('.'):
+                continue
+            directory = os.path.join(self.directory, seed)
+            for filename in os.listdir(directory):
+                if not filename.endswith(SEGMENT_EXTENSION):
+                    continue
+                filepath = os.path.join(directory, filename)
+                try:
+                    stat = os.stat(filepath)
+                except FileNotFoundError: # evicted in the meantime
+                    continue
+                segments.append((filepath, stat.st_size, stat.st_mtime))
+        return segments
+
+    @staticmethod
+    def try_remove(filepath):
+        """
+        Removes a segment unless a process is attached to it. Returns whether
+        it was removed
+        """
+        try:
+            descriptor = os.open(filepath, os.O_RDONLY)
+        except FileNotFoundError:
+            return False
+        try:
+            fcntl.flock(descriptor, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        else:
+            os.remove(filepath)
+            return True
+        finally:
+            os.close(descriptor)
+
+    def evict(self):
+        """
+        Removes the least recently attached segments nobody is attached to
+        until the store fits in max_size
+        """
+        segments = sorted(self.segments(), key=lambda segment: segment[2])
+        size = sum(segment[1] for segment in segments)
+        for filepath, segment_size, _ in segments:
+            if size <= self.max_size:
+                break
+            if GraphStore.try_remove(filepath):
+                size -= segment_size
+
+    def delete(self, seed):
+        """
+        Removes every segment of a seed, attached or not (processes mapping
+        them keep their arrays)
+        """
+        shutil.rmtree(os.path.join(self.directory, seed), ignore_errors=True)
+
+    def stats(self):
+        """
+        Returns the number and size of the segments, how many of them some
+        process is attached to and how many attachments this process holds
+        """
+        segments = self.segments()
+        attached = 0
+        for filepath, _, _ in segments:
+            try:
+                descriptor = os.open(filepath, os.O_RDONLY)
+            except FileNotFoundError:
+                continue
+            try:
+                fcntl.flock(descriptor, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                attached += 1
+            finally:
+                os.close(descriptor)
+        with self.lock:
+            attachments = self.attachments
+        return {
+            'segments': len(segments),
+            'attached': attached,
+            'attachments': attachments,
+            'size': sum(segment[1] for segment in segments),
+            'max_size': self.max_size
+        }
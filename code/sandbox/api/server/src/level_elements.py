@@ -0,0 +1,139 @@
+"""
+Half-edge based detection of the level cycles and level paths of a level
+"""
+
+
+class LevelHalfEdges(): # pylint: disable=R0903
+    """
+    Half-edges of the subgraph induced by one level. Half-edge h goes from
+    origin[h] to target[h], and the half-edges leaving a node are stored next
+    to each other in clockwise order (same layout as the CSR adjacency).
+    Walking a face, the half-edge taken after (w -> x) is the one following
+    (x -> w) in x's row: next[h]
+    """
+    def __init__(self, finder, node_ids_in_level):
+        offsets, neighbors = finder.offsets, finder.neighbors
+        level = set(node_ids_in_level)
+        self.node_ids = node_ids_in_level
+        self.row_offsets = [0]
+        self.origin = []
+        self.target = []
+        slots = []
+        for node_id in node_ids_in_level:
+            for slot in range(offsets[node_id], offsets[node_id + 1]):
+                if neighbors[slot] in level:
+                    finder.local_ids[slot] = len(slots)
+                    slots.append(slot)
+                    self.origin.append(node_id)
+                    self.target.append(neighbors[slot])
+            self.row_offsets.append(len(self.target))
+
+        # the twin of a level half-edge is in the level as well
+        self.twin = [finder.local_ids[finder.twin[slot]] for slot in slots]
+
+        self.next = [0] * len(self.origin)
+        for position in range(len(node_ids_in_level)):
+            start, end = self.row_offsets[position], self.row_offsets[position + 1]
+            for h in range(start, end):
+                # h leaves this node, so its twin arrives here
+                self.next[self.twin[h]] = h + 1 if h + 1 < end else start
+
+    def untraversed_order(self):
+        """
+        Order in which half-edges are picked to start a cycle: for every node
+        (in level order) and every level neighbour (clockwise), first the
+        half-edge arriving from the neighbour, then the one leaving to it
+        """
+        seen = bytearray(len(self.origin))
+        for h in range(len(self.origin)):
+            for half_edge in (self.twin[h], h):
+                if not seen[half_edge]:
+                    seen[half_edge] = 1
+                    yield half_edge
+
+    def trace_cycles(self):
+        """
+        Returns every level cycle found by walking faces from each untraversed
+        half-edge. A walk stops as soon as it reaches a node it has already
+        visited: if that node is not the one it just came from, the part of the
+        walk starting at that node is a level cycle
+        """
+        level_cycles = []
+        traversed = bytearray(len(self.origin))
+        for start in self.untraversed_order():
+            if traversed[start]:
+                continue
+            traversed[start] = 1
+            path = [self.origin[start], self.target[start]]
+            positions = {path[0]: 0, path[1]: 1}
+            half_edge = start
+            while True:
+                half_edge = self.next[half_edge]
+                traversed[half_edge] = 1
+                next_node_id = self.target[half_edge]
+                if next_node_id in positions:
+                    if next_node_id != path[-2]:
+                        level_cycles.append(path[positions[next_node_id]:])
+                    break
+                positions[next_node_id] = len(path)
+                path.append(next_node_id)
+        return level_cycles
+
+    def trace_paths(self, cycle_node_ids):
+        """
+        Returns the level paths: starting from each node (in level order)
+        that is neither in a level cycle nor already claimed by a path, the
+        path is that node followed by all of its level neighbours (clockwise),
+        which are claimed by it
+        """
+        level_paths = []
+        claimed = set(cycle_node_ids)
+        for position, node_id in enumerate(self.node_ids):
+            if node_id in claimed:
+                continue
+            level_path = [node_id] + self.target[self.row_offsets[position]:self.row_offsets[position + 1]]
+            claimed.update(level_path)
+            level_paths.append(level_path)
+        return level_paths
+
+
+def remove_duplicates(elements):
+    """
+    Keeps the first of every group of elements made up of the same nodes
+    """
+    seen = set()
+    non_duplicate_elements = []
+    for element in elements:
+        key = frozenset(element)
+        if key not in seen:
+            seen.add(key)
+            non_duplicate_elements.append(element)
+    return non_duplicate_elements
+
+
+class LevelElementFinder(): # pylint: disable=R0903
+    """
+    Finds the level elements of the levels of one graph, given its clockwise
+    CSR adjacency and half-edge twins as python lists (or arrays). The
+    scratch map from graph half-edges to level half-edges is a list covering
+    every half-edge unless another mapping (e.g. a dictionary, when only a
+    few levels are looked at) is given
+    """
+    def __init__(self, offsets, neighbors, twin, local_ids=None):
+        self.offsets = offsets
+        self.neighbors = neighbors
+        self.twin = twin
+        # scratch map from graph half-edges to the half-edges of the current level
+        self.local_ids = [0] * len(neighbors) if local_ids is None else local_ids
+
+    def find(self, node_ids_in_level):
+        """
+        Returns the level cycles and level paths of a level (lists of node
+        indexes). Runs in time linear in the size of the level
+        """
+        half_edges = LevelHalfEdges(self, node_ids_in_level)
+        level_cycles = half_edges.trace_cycles()
+        level_paths = half_edges.trace_paths(
+            node_id for level_cycle in level_cycles for node_id in level_cycle
+        )
+        return remove_duplicates(level_cycles), remove_duplicates(level_paths)
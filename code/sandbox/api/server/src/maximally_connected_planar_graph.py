@@ -2,15 +2,45 @@
 Class for defining and manipulating triangle files
 """
 
-from subprocess import call
-import random
 import os
 import json
 import shutil
-import math
+import time
+
+import numpy as np
+
+from .delaunay import Triangulation, triangulate
+from .graph_arrays import GraphArrays, Ragged, clockwise_adjacency
+from .graph_edits import GraphEditor
+from .graph_file import (
+    is_current, iter_graph_file, load_graph_file, read_header, save_graph_file
+)
+from .graph_store import GraphStore, private_nbytes
+from .level_elements import LevelElementFinder
+from .metrics import METRICS
+from .point_sampler import sample_points
+from .single_flight import SingleFlight, file_lock
+from .slices import SliceEngine, distance_dags
+from .spatial_index import SpatialIndex
+from .tiles import iter_tile_svg, tile_grid
+from .triangle_files import read_triangle_files, write_triangle_files
 
 DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../data/')
 
+# bump whenever a change to the pipeline (levels, level elements, special
+# nodes...) makes previously stored graph files stale
+PIPELINE_VERSION = 1
+
+# generations and rebuilds of graphs running in this process, by seed
+BUILDS = SingleFlight()
+
+# arrays derived from stored graphs, shared by every process (the server sets
+# its size)
+GRAPH_STORE = GraphStore(os.path.join(DATA_DIR, '.store'), 1024 * 1024 * 1024)
+
+# rough memory used by one node of the dictionary views (nodes and levels)
+NODE_VIEW_SIZE = 1024
+
 # Ducktype for level
 # {
 #     node_ids: [],
@@ -35,7 +65,43 @@ class MaximallyConnectedPlanarGraph():
         """
         Deletes the stored planar graph corresponding to the given seed value
         """
+        if not MaximallyConnectedPlanarGraph.is_valid_seed(seed):
+            raise ValueError('Invalid seed: {}'.format(seed))
         shutil.rmtree(os.path.join(DATA_DIR, seed))
+        GRAPH_STORE.delete(seed)
+
+    @staticmethod
+    def is_valid_seed(seed):
+        """
+        Checks whether a seed can name a graph directory in DATA_DIR (names
+        starting with a dot are used for locks and unfinished graphs)
+        """
+        return bool(seed) and not ('/' in seed or '\0' in seed or seed.startswith('.'))
+
+    @staticmethod
+    def is_complete(seed):
+        """
+        Checks whether the graph for a seed is stored with an up to date
+        graph file (loading it will not recompute anything)
+        """
+        header, _ = read_header(os.path.join(DATA_DIR, seed, 'graph.bin'))
+        return is_current(header, {'seed': seed, 'pipeline_version': PIPELINE_VERSION})
+
+    @staticmethod
+    def revision(seed):
+        """
+        Number of edits saved to the stored graph of a seed (see save_edits)
+        """
+        header, _ = read_header(os.path.join(DATA_DIR, seed, 'graph.bin'))
+        return header['params'].get('revision', 0) if header else 0
+
+    @staticmethod
+    def num_nodes(seed):
+        """
+        Number of nodes of the stored graph of a seed (0 if there is none)
+        """
+        header, _ = read_header(os.path.join(DATA_DIR, seed, 'graph.bin'))
+        return header['params'].get('num_points', 0) if header else 0
 
     @staticmethod
     def list_all():
@@ -43,456 +109,581 @@ class MaximallyConnectedPlanarGraph():
         List all stored planar graphs by their seed
         """
         if os.path.exists(DATA_DIR):
-            return os.listdir(DATA_DIR)
+            return [
+                seed for seed in os.listdir(DATA_DIR)
+                if MaximallyConnectedPlanarGraph.is_valid_seed(seed)
+            ]
         return []
 
     @staticmethod
-    def generate_triangle(seed, num_points=200):
+    def generate_triangle(seed, num_points=200, export=False):
         """
         Generates a random maximally planar graph for a given seed value
-        using the "triangle" library (output stored in triagle format)
-        """
-        points = {
-            0: 750,
-            750: 0,
-            1500: 751
-        }
-        random.seed(seed)
-        while len(points) < num_points:
-            y_coord = (random.randrange(500) or 1) + 200
-            x_coord = random.randrange(round(y_coord*4/3)) + round((500 - y_coord)*(3/4)) + 400
-            if (not points.get(x_coord)) and (x_coord != 750):
-                points[x_coord] = y_coord
-
-        os.makedirs(os.path.join(DATA_DIR, seed), exist_ok=True)
-        filepath = os.path.join(DATA_DIR, '{}/triangle.node'.format(seed))
-
-        # creates the input nodes used by triangle to create delauney graph
-        with open(filepath, 'w') as node_file:
-            header = "{}  2  0  0\n".format(len(points))
-            node_file.write(header)
-            i = 1
-            for x_coord, y_coord in points.items():
-                node_file.write("   {}    {}  {}\n".format(i, x_coord, y_coord))
-                i += 1
-            node_file.close()
-
-        call(['triangle', '-e', filepath])
-
-    def __init__(self, seed, num_points=None):
-        self.files = {
-            'node': os.path.join(DATA_DIR, '{}/triangle.1.node'.format(seed)),
-            'edge': os.path.join(DATA_DIR, '{}/triangle.1.edge'.format(seed)),
-            'ele': os.path.join(DATA_DIR, '{}/triangle.1.ele'.format(seed)),
-            'data': os.path.join(DATA_DIR, '{}/data.json'.format(seed))
-        }
-
-        self.boundary_nodes = []
-        self.nodes = {}
-        self.levels = []
-
-        if not os.path.exists(os.path.join(DATA_DIR, seed)):
-            MaximallyConnectedPlanarGraph.generate_triangle(seed, num_points)
-            self.nodes, self.boundary_nodes, self.levels = self.parse_triangle_files()
-            self.save_data_file()
-        else:
+        (delaunay triangulation of the points of sample_points). If export
+        is set, the triangulation is also stored in triangle format
+        """
+        triangulation = triangulate(sample_points(seed, num_points))
+
+        if export:
+            os.makedirs(os.path.join(DATA_DIR, seed), exist_ok=True)
+            write_triangle_files(os.path.join(DATA_DIR, seed), triangulation)
+
+        return triangulation
+
+    def __init__(self, seed, num_points=None, progress=None):
+        if not MaximallyConnectedPlanarGraph.is_valid_seed(seed):
+            raise ValueError('Invalid seed: {}'.format(seed))
+        self.files = MaximallyConnectedPlanarGraph.file_paths(os.path.join(DATA_DIR, seed))
+
+        self.seed = seed
+        self.graph = None
+        # number of saved edits (see save_edits)
+        self.revision = 0
+        # whether self.graph is mapped from the stored graph file, so the
+        # arrays derived from it can be shared through GRAPH_STORE
+        self.is_stored = False
+        # dictionary views of self.graph, only built when they are asked for
+        self._nodes = None
+        self._levels = None
+        self._slices = None
+        self._spatial_index = None
+        # called with the name of the current stage and the fraction of it done
+        self.progress = progress
+
+        if os.path.exists(os.path.join(DATA_DIR, seed)):
             # NB: this is bad design. We should be explicitly creating graphs with points,
             #     and loading separately, not overloading initializiation like this,
             #     but it doesn't seem worth fixing
             if num_points:
                 print('Ignoring num_points (retrieving existing graph)')
-            self.load_data_file()
-            # TEMP
-            self.nodes, self.boundary_nodes, self.levels = self.parse_triangle_files()
-            self.save_data_file()
+            with METRICS.timed('load_graph_file'):
+                if self.load_graph_file():
+                    return
+        # one caller at a time generates or rebuilds a graph, the others wait
+        # for it and then load what it stored
+        _, built = BUILDS.run(seed, lambda: self.build(num_points))
+        if not built:
+            self.build(num_points)
+
+    @staticmethod
+    def file_paths(directory):
+        """
+        Returns the paths of the files of a graph stored in a directory
+        """
+        return {
+            'node': os.path.join(directory, 'triangle.1.node'),
+            'edge': os.path.join(directory, 'triangle.1.edge'),
+            'ele': os.path.join(directory, 'triangle.1.ele'),
+            'data': os.path.join(directory, 'data.json'),
+            'graph': os.path.join(directory, 'graph.bin')
+        }
+
+    def build(self, num_points):
+        """
+        Generates the graph of a new seed, or rebuilds the graph file of a
+        stored one, unless another process did it while this one waited for
+        the seed's lock. A new graph is saved in a temporary directory which
+        is renamed once it is complete, so graph directories never hold a
+        partial graph
+        """
+        directory = os.path.join(DATA_DIR, self.seed)
+        with file_lock(os.path.join(DATA_DIR, '.locks', self.seed)):
+            if os.path.exists(directory):
+                with METRICS.timed('load_graph_file'):
+                    if self.load_graph_file():
+                        return
+                self.graph = self.rebuild_graph()
+                with METRICS.timed('save'):
+                    self.save_graph_file()
+                # mapped like in any other process
+                self.load_graph_file()
+                return
+
+            temp_directory = os.path.join(DATA_DIR, '.tmp', self.seed)
+            # left behind by a generation that did not finish
+            shutil.rmtree(temp_directory, ignore_errors=True)
+            os.makedirs(temp_directory)
+            self.report('triangulating')
+            with METRICS.timed('generate_triangle'):
+                triangulation = MaximallyConnectedPlanarGraph.generate_triangle(self.seed, num_points)
+            self.graph = self.parse_triangulation(triangulation)
+            self.report('saving')
+            self.files = MaximallyConnectedPlanarGraph.file_paths(temp_directory)
+            try:
+                with METRICS.timed('save'):
+                    self.save_graph_file()
+                os.rename(temp_directory, directory)
+            finally:
+                self.files = MaximallyConnectedPlanarGraph.file_paths(directory)
+            self.load_graph_file()
+
+    def report(self, stage, fraction=0.0):
+        """
+        Reports the progress of the pipeline (if anyone is listening)
+        """
+        if self.progress:
+            self.progress(stage, fraction)
+
+    @property
+    def nodes(self):
+        """
+        Dictionary of node dictionaries keyed by node id (built on first use)
+        """
+        if self._nodes is None:
+            self._nodes = self.graph.to_nodes()
+        return self._nodes
+
+    @property
+    def levels(self):
+        """
+        List of level dictionaries (built on first use)
+        """
+        if self._levels is None:
+            self._levels = self.graph.to_levels()
+        return self._levels
+
+    @property
+    def boundary_nodes(self):
+        """
+        Ids of the nodes on the outer boundary
+        """
+        return self.graph.boundary_node_ids()
+
+    def approximate_size(self):
+        """
+        Rough number of bytes held by this graph in this process (arrays plus
+        any dictionary views and spatial index that have been built, without
+        the memory-mapped arrays every process shares)
+        """
+        size = sum(private_nbytes(array) for array in self.graph.to_arrays().values())
+        if self._nodes is not None:
+            size += len(self.graph) * NODE_VIEW_SIZE
+        if self._levels is not None:
+            size += len(self.graph) * NODE_VIEW_SIZE // 4
+        if self._spatial_index is not None:
+            size += self._spatial_index.nbytes()
+        return size
 
     def load_data_file(self):
         """
-        Loads the data in this class from a serialized json file
+        Loads the data in this class from a serialized json file (only
+        stored by graphs generated before graph files existed)
         """
         with open(self.files['data'], 'r') as infile:
             data = json.load(infile)
-            self.boundary_nodes = data['boundary_nodes']
-            self.nodes = {int(k): v for k, v in data['nodes'].items()}
-            self.levels = data['levels']
+            self.graph = GraphArrays.from_json(data)
+            self.is_stored = False
+            self._nodes = None
+            self._levels = None
+            self._slices = None
+            self._spatial_index = None
             infile.close()
 
-    def save_data_file(self):
+    def graph_file_params(self):
+        """
+        Generation parameters stored with (and checked against) the graph file
+        """
+        return {'seed': self.seed, 'pipeline_version': PIPELINE_VERSION}
+
+    def load_graph_file(self):
         """
-        Saves the json data for this triangle in a file on disk
+        Maps the arrays of this graph from its binary graph file. Returns
+        False if the file is missing or stale
         """
-        with open(self.files['data'], 'w') as outfile:
-            outfile.write(self.to_json())
-            outfile.close()
+        arrays = load_graph_file(self.files['graph'], self.graph_file_params())
+        if arrays is None:
+            return False
+        self.graph = GraphArrays.from_arrays(arrays)
+        self.revision = MaximallyConnectedPlanarGraph.revision(self.seed)
+        self.is_stored = True
+        self._nodes = None
+        self._levels = None
+        self._slices = None
+        self._spatial_index = None
+        return True
+
+    def save_graph_file(self):
+        """
+        Saves the arrays of this graph in its binary graph file
+        """
+        params = self.graph_file_params()
+        params['num_points'] = len(self.graph)
+        params['revision'] = self.revision
+        save_graph_file(self.files['graph'], self.graph.to_arrays(), params)
+
+    def rebuild_graph(self):
+        """
+        Recomputes the graph from its stored triangulation (the triangle
+        files if there are any, otherwise the coordinates, adjacency and
+        triangles of the graph file, even if it was written by another
+        pipeline version, otherwise, for graphs older than graph files, the
+        coordinates and relations in the data file)
+        """
+        if os.path.exists(self.files['node']):
+            return self.parse_triangle_files()
+        arrays = load_graph_file(self.files['graph'], {'seed': self.seed})
+        self.revision = MaximallyConnectedPlanarGraph.revision(self.seed)
+        if arrays is not None:
+            graph = GraphArrays.from_arrays(arrays)
+        else:
+            self.load_data_file()
+            graph = self.graph
+        origins = np.repeat(np.arange(len(graph)), np.diff(graph.adjacency.offsets))
+        edges = np.stack([origins, graph.adjacency.values], axis=1)
+        return self.parse_triangulation(Triangulation(
+            graph.coords,
+            edges[edges[:, 0] < edges[:, 1]],
+            graph.is_boundary,
+            graph.triangles
+        ))
+
+    def reset_views(self):
+        """
+        Drops the dictionary views, slice engine and spatial index built for
+        the graph
+        """
+        self._nodes = None
+        self._levels = None
+        self._slices = None
+        self._spatial_index = None
+
+    def insert_point(self, x_coord, y_coord):
+        """
+        Adds a point to the graph, re-triangulating and repairing the levels
+        only around it (see GraphEditor). Returns the id of the new node,
+        which comes after every other node. Edits stay in memory until
+        save_edits is called
+        """
+        self.graph = GraphEditor(self).insert(x_coord, y_coord)
+        self.is_stored = False
+        self.reset_views()
+        return len(self.graph)
+
+    def remove_point(self, node_id):
+        """
+        Removes a node from the graph, re-triangulating and repairing the
+        levels only around it (see GraphEditor). The last node takes its id
+        and every other node keeps its own. Returns the id the last node had
+        (None if it was the one removed). Edits stay in memory until
+        save_edits is called
+        """
+        if not 0 < node_id <= len(self.graph):
+            raise ValueError('No node {}'.format(node_id))
+        last_id = len(self.graph)
+        self.graph = GraphEditor(self).remove(node_id - 1)
+        self.is_stored = False
+        self.reset_views()
+        return None if node_id == last_id else last_id
+
+    def save_edits(self):
+        """
+        Stores an edited graph. Its graph file (with the revision bumped)
+        becomes the stored triangulation: the triangle and data files, which
+        no longer match it, are removed along with its rendered artifacts
+        """
+        self.revision += 1
+        self.save_graph_file()
+        for filepath in [self.files[name] for name in ('node', 'edge', 'ele', 'data')] + [
+                os.path.join(DATA_DIR, self.seed, 'triangle.node')
+        ]:
+            if os.path.exists(filepath):
+                os.remove(filepath)
+        shutil.rmtree(os.path.join(DATA_DIR, self.seed, 'artifacts'), ignore_errors=True)
+        # derived from the previous revision
+        GRAPH_STORE.delete(self.seed)
 
     def to_json(self):
         """
         Serializes the data for this triangle into a json file
         """
-        return json.dumps({
-            'boundary_nodes': self.boundary_nodes,
-            'nodes': self.nodes,
-            'levels': self.levels,
-        }, indent=4)
-
-    def calculate_clockwise_angle_and_distance(self, center_node, spoke_node): # pylint: disable=R0201
-        """
-        Given a center_node_id and with a related spoke_node_id, this will
-        find the angle between the vector formed by edge between the center
-        and the spoke and the vector [0, 1]
-        """
-        if not spoke_node['id'] in center_node['relations']:
-            raise Exception('spoke_node_id must be related to center node')
-
-        refvec = [0, 1]
-        point = spoke_node['coords']
-        origin = center_node['coords']
-
-        # Vector between point and the origin: v = p - o
-        vector = [point[0] - origin[0], point[1] - origin[1]]
-        # Length of vector: ||v||
-        lenvector = math.hypot(vector[0], vector[1])
-        # If length is zero there is no angle
-        if lenvector == 0:
-            return -math.pi, 0
-
-        # Normalize vector: v/||v||
-        normalized = [vector[0]/lenvector, vector[1]/lenvector]
-        dotprod = normalized[0]*refvec[0] + normalized[1]*refvec[1]     # x1*x2 + y1*y2
-        diffprod = refvec[1]*normalized[0] - refvec[0]*normalized[1]     # x1*y2 - y1*x2
-        angle = math.atan2(diffprod, dotprod)
-
-        # Negative angles represent counter-clockwise angles so we need to subtract them
-        # from 2*pi (360 degrees)
-        if angle < 0:
-            return 2 * math.pi + angle, lenvector
-
-        # I return first the angle because that's the primary sorting criterium
-        # but if two vectors have the same angle then the shorter distance should come first.
-        # (lenvector should never really be needed, however, since that would mean edges overlap)
-        return angle, lenvector
+        with METRICS.timed('to_json'):
+            return json.dumps({
+                'boundary_nodes': self.boundary_nodes,
+                'nodes': self.nodes,
+                'levels': self.levels,
+            }, separators=(',', ':'))
+
+    def to_columnar_json(self, fields=None):
+        """
+        Serializes some fields of the graph (all by default, see
+        GraphArrays.to_columns) into compact json: one flat array per field
+        (coordinates and triangles row after row, flags as 0 or 1) and an
+        {"offsets": [...], "values": [...]} object per ragged field, row i
+        being values[offsets[i]:offsets[i + 1]]
+        """
+        with METRICS.timed('to_columnar_json'):
+            data = {'num_nodes': len(self.graph), 'revision': self.revision}
+            for name, array in self.graph.to_columns(fields).items():
+                field, _, part = name.partition('.')
+                array = np.asarray(array)
+                if array.dtype == bool:
+                    array = array.astype(np.uint8)
+                if part:
+                    data.setdefault(field, {})[part] = array.tolist()
+                else:
+                    data[field] = array.ravel().tolist()
+            return json.dumps(data, separators=(',', ':'))
+
+    def iter_columnar_binary(self, fields=None):
+        """
+        Generates some fields of the graph (all by default, see
+        GraphArrays.to_columns) in the binary graph file format (see
+        graph_file), where the header lists the dtype, shape and offset of
+        every array. 64 bit integers are sent as 32 bit ones when they fit
+        """
+        params = self.graph_file_params()
+        params['num_nodes'] = len(self.graph)
+        params['revision'] = self.revision
+        columns = self.graph.to_columns(fields)
+        for name, array in columns.items():
+            array = np.asarray(array)
+            if array.dtype == np.int64 and (not array.size or (
+                    array.min() >= np.iinfo(np.int32).min and array.max() <= np.iinfo(np.int32).max
+            )):
+                columns[name] = array.astype(np.int32)
+        return iter_graph_file(columns, params)
 
     # reads nodes from a triangle file
     def parse_triangle_files(self):
         """
-        returns dictonary of nodes and array of boundary node ids based on the
-        contents of the node file
-        """
-        nodes = {}
-        boundary_nodes = []
-
-        # parse node file into nodes
-        with open(self.files['node']) as node_file:
-            header = True
-            for line in node_file:
-                if header:
-                    header = False
-                    continue
-                content = list(filter(lambda a: bool(a), line.split(' '))) # pylint: disable=W0108
-                if not '#' in content[0]:
-                    is_boundary = content[3] == '1\n'
-                    nodes[int(content[0])] = {
-                        'id': int(content[0]),
-                        'coords': [int(content[1]), int(content[2])],
-                        'distance': 0 if is_boundary else None,
-                        'relations': [],
-                        'level_cycles': [], # ids of any level cycles this node is a part of
-                        'level_paths': [],  # ids of any level paths this node is a part of
-                        'is_root_element': False,
-                        'betweener_paths': []
-                    }
-                    if is_boundary:
-                        boundary_nodes.append(int(content[0]))
-            node_file.close()
-
-        # parse edge files into node relations
-        with open(self.files['edge']) as edge_file:
-            header = True
-            for line in edge_file:
-                if header:
-                    header = False
-                    continue
-                content = list(filter(bool, line.split(' ')))
-                if not '#' in content[0]:
-                    nodes[int(content[1])]['relations'].append(int(content[2]))
-                    nodes[int(content[2])]['relations'].append(int(content[1]))
-            edge_file.close()
-
-        # with open(self.files['ele']) as ele_file:
-        #     header = True
-        #     for line in edge_file:
-        #         if header:
-        #             header = False
-        #             continue
-        #         content = list(filter(bool, line.split(' ')))
-        #         if not '#' in content[0]:
-        #             nodes[int(content[1])]['relations'].append(int(content[2]))
-        #             nodes[int(content[2])]['relations'].append(int(content[1]))
-        #     edge_file.close()
-
-        # sorts relations clockwise
-        for node_id, node in nodes.items():
-            nodes[node_id]['relations'] = sorted(node['relations'], key=(
-                lambda related_node_id: (
-                    self.calculate_clockwise_angle_and_distance(node, nodes.get(related_node_id)) # pylint: disable=W0640
-                )
-            ))
-
-        levels = self.get_levels(nodes, boundary_nodes)
-
-        for level in levels:
-            for node_id in level['node_ids']:
-                self.identify_special_nodes(nodes, node_id)
-
-        return nodes, boundary_nodes, levels
-
-
-    def identify_special_nodes(self, nodes, node_id): # pylint: disable=R0201
-        """
-        Identifies all of the special nodes in a given level
-        """
-        node = nodes[node_id]
+        returns the graph arrays for the triangulation stored in the triangle
+        files (see read_triangle_files)
+        """
+        parse_start = time.perf_counter()
+        triangulation = read_triangle_files(self.files['node'], self.files['edge'], self.files['ele'])
+        METRICS.record_stage('parse_triangle_files', time.perf_counter() - parse_start)
+        return self.parse_triangulation(triangulation)
+
+    def parse_triangulation(self, triangulation):
+        """
+        returns the graph arrays (clockwise adjacency, levels and level
+        elements) for a triangulation (node ids are the triangulation indexes + 1)
+        """
+        with METRICS.timed('clockwise_sort'):
+            adjacency = clockwise_adjacency(triangulation.nodes, triangulation.edges)
+        with METRICS.timed('half_edge_embedding'):
+            graph = GraphArrays(
+                triangulation.nodes,
+                np.asarray(triangulation.is_boundary, dtype=bool),
+                adjacency,
+                triangulation.triangles
+            )
+        self.report('levels')
+        with METRICS.timed('get_levels'):
+            self.get_levels(graph)
+
+        self.report('special_nodes')
+        with METRICS.timed('identify_special_nodes'):
+            betweener_paths = [[] for _ in range(len(graph))]
+            for node_ids in graph.levels.tolist():
+                for node_id in node_ids:
+                    self.identify_special_nodes(graph, node_id, betweener_paths)
+            graph.betweener_paths = Ragged.from_lists(betweener_paths)
+
+        METRICS.observe('planar_graph_size', len(graph), kind='nodes')
+        METRICS.observe('planar_graph_size', len(graph.adjacency.values) // 2, kind='edges')
+        METRICS.observe('planar_graph_size', len(graph.levels), kind='levels')
+        return graph
+
+
+    def identify_special_nodes(self, graph, node_id, betweener_paths): # pylint: disable=R0201
+        """
+        Identifies all of the special nodes in a given level (appending to the
+        per node betweener_paths lists)
+        """
+        relations = graph.adjacency[node_id].tolist()
+        distance = graph.distance
 
         start_node_id = None
         end_node_id = None
 
-        for index, related_node_id in enumerate(node['relations']):
-            related_node = nodes[related_node_id]
-            previous_node_id = node['relations'][(index - 1) % len(node['relations'])]
-            previous_node = nodes[previous_node_id]
+        for index, related_node_id in enumerate(relations):
+            previous_node_id = relations[(index - 1) % len(relations)]
             if (
-                    (previous_node['distance'] == node['distance']) and
-                    (related_node['distance'] > node['distance'])
+                    (distance[previous_node_id] == distance[node_id]) and
+                    (distance[related_node_id] > distance[node_id])
             ):
                 start_node_id = related_node_id
             elif (
-                    (related_node['distance'] == node['distance']) and
-                    (previous_node['distance'] > node['distance'])
+                    (distance[related_node_id] == distance[node_id]) and
+                    (distance[previous_node_id] > distance[node_id])
             ):
                 end_node_id = previous_node_id
 
-            if (start_node_id and end_node_id) and (start_node_id != end_node_id):
-                nodes[start_node_id]['betweener_paths'].append(node['distance'])
-                nodes[end_node_id]['betweener_paths'].append(node['distance'])
-                nodes[node_id]['betweener_paths'].append(node['distance'])
+            if (
+                    (start_node_id is not None and end_node_id is not None) and
+                    (start_node_id != end_node_id)
+            ):
+                betweener_paths[start_node_id].append(int(distance[node_id]))
+                betweener_paths[end_node_id].append(int(distance[node_id]))
+                betweener_paths[node_id].append(int(distance[node_id]))
 
 
-    def identify_level_elements(self, nodes, node_ids_in_level):  # pylint: disable=R0914,R0201,R0915,R0912
+    def identify_level_elements(self, finder, node_ids_in_level): # pylint: disable=R0201
         """
         Identifies all of the level cycles and level paths in a given level
         """
-        # assume all node ids are NOT in a chordless cycle to begin with
-        non_cycle_node_ids = dict(zip(node_ids_in_level, map(lambda i: True, node_ids_in_level)))
-
-        level_cycles = []
-        level_paths = []
-
-        # Step 1: Define all edges and declare them as untraversed
-        untraversed_edges = {}
-        for node_id in node_ids_in_level:
-            node = nodes.get(node_id)
-            related_node_ids = list(filter(lambda id: id in node_ids_in_level, node['relations']))
-            for related_node_id in related_node_ids:
-                untraversed_edges["{}-{}".format(related_node_id, node_id)] = True
-                untraversed_edges["{}-{}".format(node_id, related_node_id)] = True
-
-        # given a starting path (array of two connected points), this will
-        # traverse all connected points in a counter clockwise fashion
-        def traverse_edges_for_cycles(path):
-            # get next edge counter clockwise
-            last_node = nodes.get(path[-1])
-            second_to_last_node = nodes.get(path[-2])
-
-            # NB: this relies on relations already having been sorted clockwise
-            related_node_ids = list(filter(lambda id: id in node_ids_in_level, last_node['relations'])) # pylint: disable=C0301
-            second_to_last_node_index = related_node_ids.index(second_to_last_node['id'])
-            index = (second_to_last_node_index + 1) % len(related_node_ids)
-            next_node_id = related_node_ids[index]
-
-            # remove from traversed edges
-            edge_id = "{}-{}".format(last_node['id'], next_node_id)
-            if untraversed_edges.get(edge_id):
-                del untraversed_edges[edge_id]
-
-            if next_node_id in path:
-                if next_node_id != second_to_last_node['id']:
-                    level_cycle = path[path.index(next_node_id):]
-                    for node_id in level_cycle:
-                        # remove new node from traversed nodes
-                        if non_cycle_node_ids.get(node_id):
-                            del non_cycle_node_ids[node_id]
-                    level_cycles.append(level_cycle)
-            else:
-                path.append(next_node_id)
-                traverse_edges_for_cycles(path)
-
-        def traverse_edges_for_path(path, prev_node_id=None):
-            last_node = nodes.get(path[-1])
-            if non_cycle_node_ids.get(last_node['id']):
-                del non_cycle_node_ids[last_node['id']]
-            related_node_ids = list(filter(lambda id: id in node_ids_in_level, last_node['relations'])) # pylint: disable=C0301
-            for node_id in related_node_ids:
-                if non_cycle_node_ids.get(node_id):
-                    del non_cycle_node_ids[node_id]
-                if node_id != prev_node_id:
-                    path.append(node_id)
-                    if node_id in non_cycle_node_ids:
-                        traverse_edges_for_path(path, prev_node_id=node_id)
-            return path
-
-        # this loop identifies all level cycles
-        while untraversed_edges:
-            # pick an edge and add to the path, delete from traversed
-            current_edge = next(iter(untraversed_edges))
-            del untraversed_edges[current_edge]
-            starting_path = list(map(int, current_edge.split('-')))
-            traverse_edges_for_cycles(path=starting_path)
-
-        # this loop identifies all level paths
-        while non_cycle_node_ids:
-            current_node_id = next(iter(non_cycle_node_ids))
-            level_path = traverse_edges_for_path([current_node_id])
-            level_paths.append(level_path)
-
-
-        # remove duplicate cycles
-        non_duplicate_cycles = []
-        existing_cycles_as_sets = []
-        for level_cycle in level_cycles:
-            if set(level_cycle) not in existing_cycles_as_sets:
-                non_duplicate_cycles.append(level_cycle)
-            existing_cycles_as_sets.append(set(level_cycle))
-
-        # remove duplicate paths
-        non_duplicate_paths = []
-        existing_paths_as_sets = []
-        for level_path in level_paths:
-            if set(level_path) not in existing_paths_as_sets:
-                non_duplicate_paths.append(level_path)
-            existing_paths_as_sets.append(set(level_path))
-
-
-        # adds ids to nodes for level paths and level cycles
-        for cycle_id, level_cycle in enumerate(non_duplicate_cycles):
-            for node_id in level_cycle:
-                node = nodes.get(node_id)
-                if not cycle_id in node['level_cycles']:
-                    node['level_cycles'].append(cycle_id)
-                    if len(level_cycle) == 3:
-                        node['is_root_element'] = True
-
-        for path_id, level_path in enumerate(non_duplicate_paths):
-            for node_id in level_path:
-                node = nodes.get(node_id)
-                if not path_id in node['level_paths']:
-                    node['level_paths'].append(path_id)
-                    node['is_root_element'] = True
-
-        return non_duplicate_cycles, non_duplicate_paths
-
-    def get_levels(self, nodes, boundary_nodes): # pylint: disable=R0201
-        """
-        returns an array of levels
+        return finder.find(node_ids_in_level)
+
+    def get_levels(self, graph): # pylint: disable=R0201,R0914
+        """
+        computes the levels of the graph
         (level == nodes that all share the same minimum distance from the outer region)
-        WARNING: mutates the "nodes" parameter and add a "distance" parameter to
-        each node based on the distance from the boundary
+        WARNING: mutates the "graph" parameter, filling in the distance of
+        each node from the boundary, the levels and the level elements
         """
+        offsets = graph.adjacency.offsets.tolist()
+        neighbors = graph.adjacency.values.tolist()
+        distances = np.where(graph.is_boundary, 0, -1).tolist()
+        finder = LevelElementFinder(offsets, neighbors, graph.twin.tolist())
+
         # current distance = collection of all node ids with same minimum distance
         # from the outermost boundary
         levels = []
-
-        nodes_with_same_distance = boundary_nodes
+        cycles = []
+        paths = []
+        level_cycle_offsets = [0]
+        level_path_offsets = [0]
+        node_cycles = [[] for _ in distances]
+        node_paths = [[] for _ in distances]
+
+        nodes_with_same_distance = np.flatnonzero(graph.is_boundary).tolist()
+        nodes_in_levels = 0
+        level_elements_time = 0.0
         distance = 0
         # keep the process going until we have gone through all the possible distances
         while nodes_with_same_distance:
             next_nodes_with_same_distance = []
             for node_id in nodes_with_same_distance:
-                nodes[node_id]['distance'] = distance # this is only needed for 1st step
+                distances[node_id] = distance # this is only needed for 1st step
                 # relations = all nodes connected to the node in question by a single edge
-                for related_node_id in nodes[node_id]['relations']:
+                for related_node_id in neighbors[offsets[node_id]:offsets[node_id + 1]]:
                     # if we have not labeled this node yet, that means it must
                     # have a distance 1 greater than the nodes we're iterating over
-                    if nodes[related_node_id].get('distance') is None:
-                        nodes[related_node_id]['distance'] = distance + 1
+                    if distances[related_node_id] == -1:
+                        distances[related_node_id] = distance + 1
                         next_nodes_with_same_distance.append(related_node_id)
 
-            level_cycles, level_paths = self.identify_level_elements(nodes, nodes_with_same_distance) # pylint: disable=C0301
-            levels.append({
-                'node_ids': nodes_with_same_distance,
-                'cycles': level_cycles,
-                'paths': level_paths
-            })
+            level_start = time.perf_counter()
+            level_cycles, level_paths = self.identify_level_elements(finder, nodes_with_same_distance) # pylint: disable=C0301
+            level_elements_time += time.perf_counter() - level_start
+
+            # adds ids to nodes for level paths and level cycles
+            for cycle_id, level_cycle in enumerate(level_cycles):
+                for node_id in level_cycle:
+                    if not cycle_id in node_cycles[node_id]:
+                        node_cycles[node_id].append(cycle_id)
+                        if len(level_cycle) == 3:
+                            graph.is_root_element[node_id] = True
+
+            for path_id, level_path in enumerate(level_paths):
+                for node_id in level_path:
+                    if not path_id in node_paths[node_id]:
+                        node_paths[node_id].append(path_id)
+                        graph.is_root_element[node_id] = True
+
+            levels.append(nodes_with_same_distance)
+            cycles.extend(level_cycles)
+            paths.extend(level_paths)
+            level_cycle_offsets.append(len(cycles))
+            level_path_offsets.append(len(paths))
+            nodes_in_levels += len(nodes_with_same_distance)
+            self.report('levels', nodes_in_levels / len(distances))
             distance += 1
             nodes_with_same_distance = next_nodes_with_same_distance
 
-        return levels
+        graph.distance[:] = distances
+        graph.levels = Ragged.from_lists(levels)
+        graph.cycles = Ragged.from_lists(cycles)
+        graph.paths = Ragged.from_lists(paths)
+        graph.level_cycle_offsets = np.array(level_cycle_offsets, dtype=np.int64)
+        graph.level_path_offsets = np.array(level_path_offsets, dtype=np.int64)
+        graph.node_cycles = Ragged.from_lists(node_cycles)
+        graph.node_paths = Ragged.from_lists(node_paths)
+        # part of get_levels, recorded on its own as well
+        METRICS.record_stage('identify_level_elements', level_elements_time)
+
+    def shared_arrays(self, name, build):
+        """
+        Returns arrays derived from the graph (build() computes them): from
+        GRAPH_STORE for a stored graph, so every process shares them,
+        computed for this process alone for a graph with unsaved edits
+        """
+        if not self.is_stored:
+            return build()
+        params = self.graph_file_params()
+        params['revision'] = self.revision
+        return GRAPH_STORE.attach(
+            self, self.seed, '{}.{}.{}'.format(name, PIPELINE_VERSION, self.revision), params, build
+        )
 
-    # get a "slice" of nodes
-    def get_slice(self, node_id, nodes_in_slice, is_origin=False, is_reverse=False):
+    @property
+    def slices(self):
         """
-        Generate a "slice" of nodes given a starting node
+        Slice engine for this graph (built on first use)
         """
-        if is_reverse:
-            return self.get_reverse_slice(node_id, nodes_in_slice)
-        return self.get_level_element_slice(node_id, nodes_in_slice, is_origin=is_origin)
+        if self._slices is None:
+            self._slices = SliceEngine(
+                self.graph, dags=self.shared_arrays('distance_dags', lambda: distance_dags(self.graph))
+            )
+        return self._slices
 
-    def get_level_element_slice(self, node_id, nodes_in_slice, is_origin=False):
+    @property
+    def spatial_index(self):
         """
-        Generate a "slice" of nodes given a starting node id, which we then use
-        to find the first level element containing that node. We then move outward
-        from each node in the level element to generate the slice
+        Spatial index of the nodes and faces of this graph (built on first use)
         """
-        node = self.nodes[node_id]
-        if node['distance'] == 0:
-            nodes_in_slice[node_id] = []
+        if self._spatial_index is None:
+            with METRICS.timed('spatial_index'):
+                self._spatial_index = SpatialIndex.from_arrays(self.graph, self.shared_arrays(
+                    'spatial_index', lambda: SpatialIndex(self.graph).to_arrays()
+                ))
+        return self._spatial_index
 
-        origin_node_ids = [node_id]
-        if is_origin and node['level_cycles']:
-            level_cycle_id = node['level_cycles'][0]
-            origin_node_ids = self.levels[node['distance']]['cycles'][level_cycle_id]
-        elif is_origin and node['level_paths']:
-            level_path_id = node['level_paths'][0]
-            origin_node_ids = self.levels[node['distance']]['paths'][level_path_id]
+    def nearest_node(self, x_coord, y_coord):
+        """
+        Returns the id of the node nearest to a point and its distance to it
+        """
+        index, distance = self.spatial_index.nearest(x_coord, y_coord)
+        return (None, None) if index is None else (index + 1, distance)
 
-        for origin_node_id in origin_node_ids:
-            for related_node_id in self.nodes[origin_node_id]['relations']:
-                if self.nodes[related_node_id]['distance'] < self.nodes[origin_node_id]['distance']:
-                    related_node_ids = nodes_in_slice.get(origin_node_id, [])
-                    related_node_ids.append(related_node_id)
-                    nodes_in_slice[origin_node_id] = related_node_ids
-                    nodes_in_slice = self.get_slice(related_node_id, nodes_in_slice)
-        return nodes_in_slice
+    def containing_triangle(self, x_coord, y_coord):
+        """
+        Returns the ids of the nodes (counter clockwise) of the triangle
+        containing a point, None if the point is outside the graph
+        """
+        face = self.spatial_index.containing_face(x_coord, y_coord)
+        return None if face is None else (self.graph.triangles[face] + 1).tolist()
 
-    def get_reverse_slice(self, node_id, nodes_in_slice):
+    def nodes_in_rect(self, min_x, min_y, max_x, max_y):
         """
-        Generate a reverse "slice" of nodes given a starting node. We will move
-        inward from a starting outer node in order to generate the slice.
+        Returns the ids of the nodes inside a rectangle (edges included)
         """
-        node = self.nodes[node_id]
+        return (self.spatial_index.in_rect(min_x, min_y, max_x, max_y) + 1).tolist()
 
-        for related_node_id in node['relations']:
-            if self.nodes[related_node_id]['distance'] > node['distance']:
-                if not nodes_in_slice.get(node_id):
-                    nodes_in_slice[node_id] = [related_node_id]
-                else:
-                    nodes_in_slice[node_id].append(related_node_id)
-                if not nodes_in_slice.get(related_node_id):
-                    nodes_in_slice[related_node_id] = []
-                self.get_reverse_slice(related_node_id, nodes_in_slice)
-        return nodes_in_slice
+    # get a "slice" of nodes
+    def get_slice(self, node_id, is_origin=False, is_reverse=False):
+        """
+        Generate a "slice" of nodes given a starting node
+        (node indexes, see GraphArrays and SliceEngine)
+        """
+        with METRICS.timed('get_slice'):
+            return self.slices.get_slice(node_id, is_origin=is_origin, is_reverse=is_reverse)
 
-    def generate_line(self, node_id_1, node_id_2, nodes_in_slice):
+    def generate_line(self, node_id_1, node_id_2, nodes_in_slice, colors): # pylint: disable=R0913
         """
         Returns an SVG line element for two nodes that form an edge
+        (node indexes, see GraphArrays)
         """
-        coords1 = self.nodes[node_id_1]['coords']
-        coords2 = self.nodes[node_id_2]['coords']
+        graph = self.graph
+        coords1 = graph.coords[node_id_1].tolist()
+        coords2 = graph.coords[node_id_2].tolist()
         color = '#222'
 
-        if self.nodes[node_id_1]['distance'] == self.nodes[node_id_2]['distance']:
+        if graph.distance[node_id_1] == graph.distance[node_id_2]:
             color = 'white'
         else:
-            betweener_path = set(self.nodes[node_id_1]['betweener_paths']).intersection(set(self.nodes[node_id_2]['betweener_paths'])) # pylint: disable=C0301
+            betweener_path = set(graph.betweener_paths[node_id_1].tolist()).intersection(set(graph.betweener_paths[node_id_2].tolist())) # pylint: disable=C0301
             if betweener_path:
                 if (list(betweener_path)[0] % 2) == 1:
                     color = 'purple'
@@ -502,13 +693,13 @@ class MaximallyConnectedPlanarGraph():
             color = '#42b983'
 
         if (
-                (self.nodes[node_id_1].get('color', None) in ['yellow', 'green']) and
-                (self.nodes[node_id_2].get('color', None) in ['yellow', 'green'])
+                (colors.get(node_id_1, None) in ['yellow', 'green']) and
+                (colors.get(node_id_2, None) in ['yellow', 'green'])
         ):
             color = 'lightgreen'
         if (
-                (self.nodes[node_id_1].get('color', None) in ['red', 'blue']) and
-                (self.nodes[node_id_2].get('color', None) in ['red', 'blue'])
+                (colors.get(node_id_1, None) in ['red', 'blue']) and
+                (colors.get(node_id_2, None) in ['red', 'blue'])
         ):
             color = 'purple'
         return (
@@ -516,26 +707,84 @@ class MaximallyConnectedPlanarGraph():
             .format(coords1[0], coords1[1], coords2[0], coords2[1], color)
         )
 
+    def generate_node(self, node_id, fill):
+        """
+        Returns the SVG rectangle and label (its distance) of a node
+        (node index, see GraphArrays)
+        """
+        graph = self.graph
+        coords = graph.coords[node_id].tolist()
+        level_cycles = ','.join(map(str, graph.node_cycles[node_id].tolist()))
+        level_paths = ','.join(map(str, graph.node_paths[node_id].tolist()))
+        return (
+            "    <rect class=\"node\" id=\"{}\" x=\"{}\" y=\"{}\" height=\"8\" width=\"10\" style=\"stroke: {}; fill: {};\"/>\n" # pylint: disable=C0301
+            .format(node_id + 1, coords[0]-6, coords[1]-3, 'black', fill)
+        ) + (
+            "    <text class=\"node\" id=\"{}\" level_cycles=\"{}\" level_paths=\"{}\" x=\"{}\" y=\"{}\" style=\"fill: {}; font-size: 8px;\">{}</text>\n" # pylint: disable=C0301
+            .format(node_id + 1, level_cycles, level_paths, coords[0]-5, coords[1]+4, 'black', graph.distance[node_id]) # pylint: disable=C0301
+        )
+
+    def tile_grid(self):
+        """
+        Returns the origin and side of the square split into tiles (see
+        iter_tile_svg)
+        """
+        return tile_grid(self.spatial_index)
+
+    def iter_tile_svg(self, zoom, column, row):
+        """
+        Generates the svg of a tile of the graph (see tiles.iter_tile_svg)
+        """
+        return iter_tile_svg(self, zoom, column, row)
+
     def generate_svg(
             self, nodes=None, slice_origin_id=None, reverse_slice=False, colored_nodes=None
-    ): # pylint: disable=R0914
+    ):
         """
         Generate svg based on nodes
         """
-        _nodes = nodes if nodes else self.nodes
+        return ''.join(self.iter_svg(
+            nodes=nodes,
+            slice_origin_id=slice_origin_id,
+            reverse_slice=reverse_slice,
+            colored_nodes=colored_nodes
+        ))
+
+    def iter_svg(
+            self, nodes=None, slice_origin_id=None, reverse_slice=False, colored_nodes=None
+    ): # pylint: disable=R0914
+        """
+        Generate svg based on nodes, yielding it element by element (one
+        chunk per edge and per node) so it can be streamed. The time recorded
+        for the generate_svg stage includes the time spent by the consumer
+        """
+        render_start = time.perf_counter()
+        graph = self.graph
+        node_ids = list(nodes) if nodes else range(1, len(graph) + 1)
 
-        nodes_in_slice = self.get_slice(slice_origin_id, {}, is_origin=True, is_reverse=reverse_slice) if slice_origin_id else {} # pylint: disable=C0301
-        html = "<svg xmlns=\"http://www.w3.org/2000/svg\" xmlns:xlink=\"http://www.w3.org/1999/xlink\" width=\"1500px\" height=\"1000px\">\n" # pylint: disable=C0301
-        html += "  <g>\n"
+        nodes_in_slice = self.get_slice(slice_origin_id - 1, is_origin=True, is_reverse=reverse_slice) if slice_origin_id else {} # pylint: disable=C0301
 
-        drawn_edges = {}
+        # colors only apply to this render (keyed by node index)
+        colors = {}
+        if colored_nodes:
+            for key, color in colored_nodes.items():
+                if key.isdigit() and 0 < int(key) <= len(graph):
+                    colors[int(key) - 1] = color
+            if nodes:
+                colors = {index: color for index, color in colors.items() if index + 1 in nodes}
 
-        for node_id, node in _nodes.items():
+        yield "<svg xmlns=\"http://www.w3.org/2000/svg\" xmlns:xlink=\"http://www.w3.org/1999/xlink\" width=\"1500px\" height=\"1000px\">\n" # pylint: disable=C0301
+        yield "  <g>\n"
+
+        # half-edges already drawn (or whose twin was), see GraphArrays.twin
+        drawn_edges = bytearray(len(graph.adjacency.values))
+
+        for node_id in node_ids:
+            index = node_id - 1
 
             # if node_id % 2 == 0:
-            if colored_nodes and (str(node_id) in colored_nodes):
-                self.nodes[node_id]['color'] = colored_nodes.get(str(node_id), None)
-                fill = self.nodes[node_id]['color']
+            if index in colors:
+                fill = colors[index]
             # elif node_id in nodes_in_slice:
             #     fill = '#42b983'
             # elif node['is_root_element']:
@@ -545,25 +794,14 @@ class MaximallyConnectedPlanarGraph():
             else:
                 fill = 'white'
 
-            for related_node_id in node['relations']:
-                edge1 = "{}-{}".format(node_id, related_node_id)
-                edge2 = "{}-{}".format(related_node_id, node_id)
-                if not drawn_edges.get(edge1):
-                    html += self.generate_line(node_id, related_node_id, nodes_in_slice)
-                    drawn_edges[edge1] = True
-                    drawn_edges[edge2] = True
-
-            level_cycles = ','.join(map(str, node['level_cycles']))
-            level_paths = ','.join(map(str, node['level_paths']))
-
-            html += (
-                "    <rect class=\"node\" id=\"{}\" x=\"{}\" y=\"{}\" height=\"8\" width=\"10\" style=\"stroke: {}; fill: {};\"/>\n" # pylint: disable=C0301
-                .format(node['id'], node['coords'][0]-6, node['coords'][1]-3, 'black', fill)
-            )
-            html += (
-                "    <text class=\"node\" id=\"{}\" level_cycles=\"{}\" level_paths=\"{}\" x=\"{}\" y=\"{}\" style=\"fill: {}; font-size: 8px;\">{}</text>\n" # pylint: disable=C0301
-                .format(node['id'], level_cycles, level_paths, node['coords'][0]-5, node['coords'][1]+4, 'black', node['distance']) # pylint: disable=C0301
-            )
-        html += "  </g>\n"
-        html += "</svg>"
-        return html
+            start = int(graph.adjacency.offsets[index])
+            for slot, related_index in enumerate(graph.adjacency[index].tolist(), start):
+                if not drawn_edges[slot]:
+                    yield self.generate_line(index, related_index, nodes_in_slice, colors)
+                    drawn_edges[slot] = 1
+                    drawn_edges[graph.twin[slot]] = 1
+
+            yield self.generate_node(index, fill)
+        yield "  </g>\n"
+        yield "</svg>"
+        METRICS.record_stage('generate_svg', time.perf_counter() - render_start)
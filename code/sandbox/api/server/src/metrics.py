@@ -0,0 +1,228 @@
+"""
+Process level metrics (counters and histograms) exported in the Prometheus
+text format, and per-request profiling of the pipeline stages
+"""
+
+from contextlib import contextmanager
+import threading
+import time
+
+# seconds
+TIME_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300)
+# numbers of nodes, edges or levels
+SIZE_BUCKETS = (10, 100, 1000, 10000, 100000, 1000000)
+
+
+def format_labels(labels, extra=None):
+    """
+    Returns the label set of a sample ('{name="value",...}')
+    """
+    labels = list(labels) + ([extra] if extra else [])
+    if not labels:
+        return ''
+    return '{' + ','.join(
+        '{}="{}"'.format(
+            name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        )
+        for name, value in labels
+    ) + '}'
+
+
+def format_value(value):
+    """
+    Formats a sample value (integers without a decimal point)
+    """
+    if isinstance(value, float) and value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metrics():
+    """
+    Counters and histograms keyed by name and labels. Metrics must be
+    described (type, help text and, for histograms, buckets) before use
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.descriptions = {} # name -> (type, help, buckets)
+        self.values = {}       # name -> {labels: value or [bucket counts, sum, count]}
+        # stages timed by the current thread's request, if it is being profiled
+        self.local = threading.local()
+
+    def describe(self, name, kind, text, buckets=None):
+        """
+        Declares a metric ('counter' or 'histogram')
+        """
+        with self.lock:
+            self.descriptions[name] = (kind, text, buckets)
+            self.values.setdefault(name, {})
+
+    def inc(self, name, amount=1, **labels):
+        """
+        Adds to a counter
+        """
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            values = self.values[name]
+            values[key] = values.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        """
+        Records an observation in a histogram
+        """
+        key = tuple(sorted(labels.items()))
+        buckets = self.descriptions[name][2]
+        with self.lock:
+            values = self.values[name]
+            if key not in values:
+                values[key] = [[0] * len(buckets), 0, 0]
+            histogram = values[key]
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram[0][index] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    @contextmanager
+    def timed(self, stage):
+        """
+        Times a pipeline stage (see record_stage)
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_stage(stage, time.perf_counter() - start)
+
+    def record_stage(self, stage, seconds):
+        """
+        Records the duration of a pipeline stage, and adds it to the profile
+        of the current request if it is being profiled
+        """
+        self.observe('planar_graph_stage_seconds', seconds, stage=stage)
+        stages = getattr(self.local, 'stages', None)
+        if stages is not None:
+            stages.append((stage, seconds))
+
+    def start_profile(self):
+        """
+        Starts collecting the stages timed by the current thread
+        """
+        self.local.stages = []
+
+    def stop_profile(self):
+        """
+        Returns the (stage, seconds) pairs collected since start_profile (None
+        if the thread was not being profiled) and stops collecting them
+        """
+        stages = getattr(self.local, 'stages', None)
+        self.local.stages = None
+        return stages
+
+    def snapshot(self):
+        """
+        Returns a copy of every value (see changes)
+        """
+        with self.lock:
+            return {
+                name: {
+                    labels: [list(value[0])] + value[1:] if isinstance(value, list) else value
+                    for labels, value in values.items()
+                }
+                for name, values in self.values.items()
+            }
+
+    def changes(self, snapshot):
+        """
+        Returns what was recorded since a snapshot, as a list of json values
+        [name, labels, value] to merge into the metrics of another process
+        """
+        changes = []
+        current = self.snapshot()
+        for name, values in sorted(current.items()):
+            for labels, value in sorted(values.items()):
+                previous = snapshot.get(name, {}).get(labels)
+                if isinstance(value, list):
+                    if previous is not None:
+                        value = [
+                            [count - before for count, before in zip(value[0], previous[0])],
+                            value[1] - previous[1],
+                            value[2] - previous[2]
+                        ]
+                    if value[2]:
+                        changes.append([name, [list(label) for label in labels], value])
+                elif value != (previous or 0):
+                    value -= previous or 0
+                    changes.append([name, [list(label) for label in labels], value])
+        return changes
+
+    def merge(self, changes):
+        """
+        Adds the changes recorded by another process (see changes)
+        """
+        with self.lock:
+            for name, labels, change in changes:
+                key = tuple(tuple(label) for label in labels)
+                values = self.values[name]
+                if not isinstance(change, list):
+                    values[key] = values.get(key, 0) + change
+                    continue
+                if key not in values:
+                    values[key] = [[0] * len(change[0]), 0, 0]
+                histogram = values[key]
+                histogram[0] = [count + added for count, added in zip(histogram[0], change[0])]
+                histogram[1] += change[1]
+                histogram[2] += change[2]
+
+    def render(self, extra=None):
+        """
+        Returns every metric in the Prometheus text exposition format. extra
+        is a list of (name, type, help, {labels: value}) to export as well
+        (e.g. values read from elsewhere at scrape time)
+        """
+        lines = []
+        with self.lock:
+            metrics = [
+                (name, kind, text, buckets, dict(self.values[name]))
+                for name, (kind, text, buckets) in sorted(self.descriptions.items())
+            ]
+        for name, kind, text, values in extra or []:
+            metrics.append((name, kind, text, None, values))
+
+        for name, kind, text, buckets, values in metrics:
+            lines.append('# HELP {} {}'.format(name, text))
+            lines.append('# TYPE {} {}'.format(name, kind))
+            for labels, value in sorted(values.items()):
+                if kind != 'histogram':
+                    lines.append('{}{} {}'.format(name, format_labels(labels), format_value(value)))
+                    continue
+                counts, total, count = value
+                for bound, bucket_count in zip(buckets, counts):
+                    lines.append('{}_bucket{} {}'.format(
+                        name, format_labels(labels, ('le', format_value(bound))), bucket_count
+                    ))
+                lines.append('{}_bucket{} {}'.format(
+                    name, format_labels(labels, ('le', '+Inf')), count
+                ))
+                lines.append('{}_sum{} {}'.format(name, format_labels(labels), format_value(total)))
+                lines.append('{}_count{} {}'.format(name, format_labels(labels), count))
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = Metrics()
+METRICS.describe(
+    'planar_graph_stage_seconds', 'histogram',
+    'Time spent in each stage of the planar graph pipeline', TIME_BUCKETS
+)
+METRICS.describe(
+    'planar_graph_size', 'histogram',
+    'Number of nodes, edges and levels of the graphs built', SIZE_BUCKETS
+)
+METRICS.describe(
+    'slice_cache_requests_total', 'counter', 'Slice queries by result in the slice cache'
+)
+METRICS.describe(
+    'artifact_cache_requests_total', 'counter', 'Artifact requests by result in the artifact cache'
+)
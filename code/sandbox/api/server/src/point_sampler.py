@@ -0,0 +1,80 @@
+"""
+Seeded sampling of the random points graphs are generated from
+"""
+
+import hashlib
+
+import numpy as np
+
+# corners of the outer triangle, always part of the points
+CORNERS = ((0, 750), (750, 0), (1500, 751))
+# rows the other points are drawn from (y, inclusive)
+FIRST_ROW = 201
+LAST_ROW = 699
+# draws per missing point (some are duplicates)
+OVERDRAW = 1.25
+
+
+def seeded_random_state(seed):
+    """
+    Returns a random number generator for a seed (any string). RandomState
+    streams do not change between numpy versions
+    """
+    digest = hashlib.sha256(str(seed).encode()).digest()
+    return np.random.RandomState(np.frombuffer(digest, dtype=np.uint32))
+
+
+def row_bounds(rows, scale):
+    """
+    Returns where the rows of a grid refined scale times start (x) and how
+    many points wide they are. Row y of the unrefined grid starts at
+    round((500 - y) * 3/4) + 400 and is round(y * 4/3) points wide
+    """
+    return (
+        np.round((500 * scale - rows) * 3 / 4).astype(np.int64) + 400 * scale,
+        np.round(rows * 4 / 3).astype(np.int64)
+    )
+
+
+def grid_scale(num_points):
+    """
+    Returns the smallest power of two the integer grid must be refined by to
+    hold num_points with room to spare (at least twice as many points)
+    """
+    scale = 1
+    while True:
+        _, widths = row_bounds(np.arange(FIRST_ROW * scale, LAST_ROW * scale + 1), scale)
+        if widths.sum() >= 2 * num_points:
+            return scale
+        scale *= 2
+
+
+def sample_points(seed, num_points):
+    """
+    Returns num_points distinct points (at least the 3 corners) for a seed,
+    always the same ones. Besides the corners, points are drawn a row at a
+    time (uniformly) and then within their row (uniformly), in batches.
+    Coordinates are integers unless num_points does not fit in the integer
+    grid, which is then refined by a power of two (so coordinates are still
+    exact floats)
+    """
+    needed = max(num_points - len(CORNERS), 0)
+    scale = grid_scale(needed)
+    random_state = seeded_random_state(seed)
+    width = 1500 * scale + 1
+    keys = np.zeros(0, dtype=np.int64)
+    while len(keys) < needed:
+        count = int((needed - len(keys)) * OVERDRAW) + 16
+        rows = random_state.randint(FIRST_ROW * scale, LAST_ROW * scale + 1, count)
+        starts, widths = row_bounds(rows, scale)
+        columns = starts + (random_state.random_sample(count) * widths).astype(np.int64)
+        # the first draw of every point is kept, in the order they were drawn
+        drawn = np.concatenate([keys, rows * width + columns])
+        _, first = np.unique(drawn, return_index=True)
+        keys = drawn[np.sort(first)][:needed]
+
+    points = np.array(CORNERS, dtype=np.int64) * scale
+    points = np.concatenate([points, np.stack([keys % width, keys // width], axis=1)])
+    if scale == 1:
+        return points
+    return points / scale
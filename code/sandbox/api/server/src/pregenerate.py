@@ -0,0 +1,90 @@
+"""
+Batch generation of planar graphs across a pool of processes
+"""
+
+import multiprocessing
+import sys
+import time
+import traceback
+
+from .maximally_connected_planar_graph import MaximallyConnectedPlanarGraph
+
+
+def parse_seeds(seeds=None, seed_range=None, seed_file=None):
+    """
+    Returns the list of seeds (strings, without duplicates) given as a comma
+    separated list, a start:stop range (stop excluded) and/or a file with
+    one seed per line
+    """
+    parsed = []
+    if seeds:
+        parsed.extend(seed.strip() for seed in seeds.split(','))
+    if seed_range:
+        start, _, stop = seed_range.partition(':')
+        parsed.extend(str(seed) for seed in range(int(start), int(stop)))
+    if seed_file:
+        with open(seed_file, 'r') as infile:
+            parsed.extend(line.strip() for line in infile)
+            infile.close()
+    parsed = list(dict.fromkeys(seed for seed in parsed if seed))
+    for seed in parsed:
+        if not MaximallyConnectedPlanarGraph.is_valid_seed(seed):
+            raise ValueError('Invalid seed: {}'.format(seed))
+    return parsed
+
+
+def generate_graph(task):
+    """
+    Generates and stores the graph for one seed (runs in a worker process).
+    Returns the seed, the formatted error if it failed (None otherwise) and
+    the time it took
+    """
+    seed, num_points = task
+    start = time.time()
+    try:
+        MaximallyConnectedPlanarGraph(seed, num_points=num_points)
+    except Exception: # pylint: disable=W0703
+        return seed, traceback.format_exc(), time.time() - start
+    return seed, None, time.time() - start
+
+
+def pregenerate(seeds, num_points=200, workers=None, resume=False, out=sys.stderr): # pylint: disable=R0913
+    """
+    Generates the graphs for a list of seeds in a pool of worker processes
+    (one per cpu by default), reporting progress as they complete. A seed
+    failing does not stop the others. With resume, seeds that already have
+    an up to date graph are skipped. Returns the seeds that failed
+    """
+    if resume:
+        remaining = [seed for seed in seeds if not MaximallyConnectedPlanarGraph.is_complete(seed)]
+        out.write('Skipping {} complete seeds\n'.format(len(seeds) - len(remaining)))
+        seeds = remaining
+
+    failed = []
+    start = time.time()
+    pool = multiprocessing.Pool(workers)
+    try:
+        tasks = [(seed, num_points) for seed in seeds]
+        results = pool.imap_unordered(generate_graph, tasks)
+        for done, (seed, error, seconds) in enumerate(results, 1):
+            if error:
+                failed.append(seed)
+                out.write('[{}/{}] {} failed after {:.2f}s\n{}'.format(
+                    done, len(seeds), seed, seconds, error
+                ))
+            else:
+                out.write('[{}/{}] {} generated in {:.2f}s\n'.format(
+                    done, len(seeds), seed, seconds
+                ))
+            out.flush()
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+    out.write('Generated {} graphs in {:.2f}s, {} failed\n'.format(
+        len(seeds) - len(failed), time.time() - start, len(failed)
+    ))
+    if failed:
+        out.write('Failed seeds: {}\n'.format(','.join(failed)))
+    return failed
@@ -0,0 +1,63 @@
+"""
+Coordination of expensive work that must only be done once at a time per
+key: within a process (threads) and across processes (file locks)
+"""
+
+from concurrent.futures import Future
+from contextlib import contextmanager
+import fcntl
+import os
+import threading
+
+
+@contextmanager
+def file_lock(filepath):
+    """
+    Holds an exclusive lock on a file (created if needed), blocking until
+    every other process and thread holding it lets go
+    """
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    with open(filepath, 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+            lock.close()
+
+
+class SingleFlight():
+    """
+    Runs at most one call per key at a time in this process: callers that
+    arrive while a call for their key is running wait for it and share its
+    result (or exception) instead of running their own
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {} # key -> Future of the running call
+
+    def run(self, key, function):
+        """
+        Returns the result of function() (or of the running call for key)
+        and whether this caller is the one that ran it
+        """
+        with self.lock:
+            future = self.calls.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self.calls[key] = future
+        if not owner:
+            return future.result(), False
+
+        try:
+            result = function()
+        except BaseException as error:
+            future.set_exception(error)
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            with self.lock:
+                del self.calls[key]
+        return result, True
@@ -0,0 +1,148 @@
+"""
+Slice queries over the distance DAG of a graph
+"""
+
+from collections import OrderedDict
+
+import numpy as np
+
+from .graph_arrays import Ragged
+from .metrics import METRICS
+
+
+def distance_dag(graph, outward):
+    """
+    Returns the CSR adjacency restricted to the edges going outward (to a
+    smaller distance from the boundary) or inward (to a larger one)
+    """
+    offsets = graph.adjacency.offsets
+    targets = graph.adjacency.values
+    origins = np.repeat(np.arange(len(graph)), np.diff(offsets))
+    if outward:
+        keep = graph.distance[targets] < graph.distance[origins]
+    else:
+        keep = graph.distance[targets] > graph.distance[origins]
+    dag_offsets = np.zeros(len(graph) + 1, dtype=np.int64)
+    dag_offsets[1:] = np.cumsum(np.bincount(origins[keep], minlength=len(graph)))
+    return Ragged(dag_offsets, targets[keep])
+
+
+def distance_dags(graph):
+    """
+    Returns the outward and inward distance DAGs as a flat dictionary of
+    arrays
+    """
+    outward = distance_dag(graph, outward=True)
+    inward = distance_dag(graph, outward=False)
+    return {
+        'outward.offsets': outward.offsets,
+        'outward.values': outward.values,
+        'inward.offsets': inward.offsets,
+        'inward.values': inward.values
+    }
+
+
+class SliceEngine():
+    """
+    Answers slice queries for one graph. The outward and inward distance
+    DAGs are built once, every query only visits the nodes in its slice and
+    the most recent results are cached per origin node.
+    A slice maps each node in it to the nodes it leads to in the DAG
+    (node indexes, see GraphArrays). The DAGs can be given (see
+    distance_dags), e.g. as memory-mapped arrays shared between processes
+    """
+    def __init__(self, graph, cache_size=256, dags=None):
+        self.graph = graph
+        if dags is None:
+            dags = distance_dags(graph)
+        # memoryviews are faster to index from python than arrays or lists
+        # and share their memory with the arrays
+        self.outward = (
+            memoryview(np.ascontiguousarray(dags['outward.offsets'])),
+            memoryview(np.ascontiguousarray(dags['outward.values']))
+        )
+        self.inward = (
+            memoryview(np.ascontiguousarray(dags['inward.offsets'])),
+            memoryview(np.ascontiguousarray(dags['inward.values']))
+        )
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+
+    def get_slice(self, node_id, is_origin=False, is_reverse=False):
+        """
+        Returns the (cached) slice starting at a node. Callers must not
+        modify the returned dictionary
+        """
+        key = (node_id, is_origin, is_reverse)
+        nodes_in_slice = self.cache.get(key)
+        if nodes_in_slice is not None:
+            METRICS.inc('slice_cache_requests_total', result='hit')
+            try:
+                self.cache.move_to_end(key)
+            except KeyError: # evicted by another thread in the meantime
+                pass
+            return nodes_in_slice
+        METRICS.inc('slice_cache_requests_total', result='miss')
+        if is_reverse:
+            nodes_in_slice = self.get_reverse_slice(node_id)
+        else:
+            nodes_in_slice = self.get_level_element_slice(node_id, is_origin=is_origin)
+        self.cache[key] = nodes_in_slice
+        while len(self.cache) > self.cache_size:
+            try:
+                self.cache.popitem(last=False)
+            except KeyError:
+                break
+        return nodes_in_slice
+
+    def get_level_element_slice(self, node_id, is_origin=False):
+        """
+        Generate a "slice" of nodes given a starting node id, which we then use
+        to find the first level element containing that node. We then move outward
+        from each node in the level element to generate the slice
+        """
+        graph = self.graph
+        distance = int(graph.distance[node_id])
+
+        origin_node_ids = [node_id]
+        if is_origin and len(graph.node_cycles[node_id]):
+            level_cycle_id = graph.level_cycle_offsets[distance] + graph.node_cycles[node_id][0]
+            origin_node_ids = graph.cycles[level_cycle_id].tolist()
+        elif is_origin and len(graph.node_paths[node_id]):
+            level_path_id = graph.level_path_offsets[distance] + graph.node_paths[node_id][0]
+            origin_node_ids = graph.paths[level_path_id].tolist()
+
+        nodes_in_slice = self.walk(self.outward, origin_node_ids)
+        if distance == 0:
+            nodes_in_slice.setdefault(node_id, [])
+        return nodes_in_slice
+
+    def get_reverse_slice(self, node_id):
+        """
+        Generate a reverse "slice" of nodes given a starting node. We will move
+        inward from a starting outer node in order to generate the slice.
+        """
+        return self.walk(self.inward, [node_id])
+
+    @staticmethod
+    def walk(dag, origin_node_ids):
+        """
+        Visits every node reachable from the origin nodes in the DAG (each
+        once). Origin nodes are only part of the slice if they lead somewhere
+        """
+        offsets, targets = dag
+        nodes_in_slice = {}
+        stack = []
+        for node_id in origin_node_ids:
+            related_node_ids = targets[offsets[node_id]:offsets[node_id + 1]].tolist()
+            if related_node_ids:
+                nodes_in_slice[node_id] = related_node_ids
+                stack.extend(related_node_ids)
+        while stack:
+            node_id = stack.pop()
+            if node_id in nodes_in_slice:
+                continue
+            related_node_ids = targets[offsets[node_id]:offsets[node_id + 1]].tolist()
+            nodes_in_slice[node_id] = related_node_ids
+            stack.extend(related_node_ids)
+        return nodes_in_slice
@@ -0,0 +1,218 @@
+"""
+Point location over the nodes and faces of a graph: the nearest node, the
+triangle containing a point and the nodes inside a rectangle
+"""
+
+import math
+
+import numpy as np
+
+from .delaunay import orient
+from .graph_arrays import INDEX_DTYPE, Ragged
+from .graph_store import private_nbytes
+
+# edges longer than this many times the average edge are indexed on their own
+LONG_EDGE_FACTOR = 4
+
+
+class SpatialIndex():
+    """
+    Uniform grid over the nodes of a graph, built once per graph with
+    vectorized operations. Cells are sized to hold a couple of nodes each
+    and stored like a CSR adjacency (cell c holds nodes[c], row by row), so
+    the nodes in a row of consecutive cells are one contiguous slice. Nodes
+    are referred to by index (see GraphArrays)
+    """
+    def __init__(self, graph, nodes_per_cell=2):
+        self.graph = graph
+        coords = np.asarray(graph.coords, dtype=np.float64).reshape(-1, 2)
+        self.coords = coords
+        size = len(coords)
+        if size:
+            self.origin = coords.min(axis=0)
+            extent = coords.max(axis=0) - self.origin
+        else:
+            self.origin = np.zeros(2)
+            extent = np.zeros(2)
+        area = max(extent[0], 1.0) * max(extent[1], 1.0)
+        self.cell_size = max(math.sqrt(area * nodes_per_cell / max(size, 1)), 1e-9)
+        self.extent = extent
+        self.columns = int(extent[0] // self.cell_size) + 1
+        self.rows = int(extent[1] // self.cell_size) + 1
+
+        columns, rows = self.cell_of(coords)
+        cells = rows * self.columns + columns
+        offsets = np.zeros(self.columns * self.rows + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(cells, minlength=self.columns * self.rows))
+        self.nodes = Ragged(offsets, np.argsort(cells, kind='stable').astype(INDEX_DTYPE))
+
+        origins = np.repeat(np.arange(size), np.diff(graph.adjacency.offsets))
+        vectors = coords[np.asarray(graph.adjacency.values)] - coords[origins]
+        lengths = np.hypot(vectors[:, 0], vectors[:, 1])
+        self.mean_edge_length = float(lengths.mean()) if len(lengths) else 0.0
+        # an edge up to this long that crosses a region has its nodes within
+        # this distance of it. The few longer ones (along the hull of random
+        # points) are kept aside, each once
+        self.edge_margin = LONG_EDGE_FACTOR * self.mean_edge_length
+        long_edges = np.flatnonzero(
+            (lengths > self.edge_margin) & (origins < np.asarray(graph.adjacency.values))
+        )
+        self.long_edges = np.stack([
+            origins[long_edges], np.asarray(graph.adjacency.values)[long_edges]
+        ], axis=1).astype(np.int64)
+
+        # a face of every node to start walking from (-1 for nodes without any)
+        inner = np.flatnonzero(np.asarray(graph.face) != -1)
+        self.node_face = np.full(size, -1, dtype=INDEX_DTYPE)
+        self.node_face[origins[inner]] = np.asarray(graph.face)[inner]
+
+    def __len__(self):
+        return len(self.coords)
+
+    def to_arrays(self):
+        """
+        Returns the index as a flat dictionary of arrays (numbers as 0-d
+        arrays), the inverse of from_arrays
+        """
+        return {
+            'coords': self.coords,
+            'origin': self.origin,
+            'extent': self.extent,
+            'cell_size': np.float64(self.cell_size),
+            'columns': np.int64(self.columns),
+            'rows': np.int64(self.rows),
+            'nodes.offsets': self.nodes.offsets,
+            'nodes.values': self.nodes.values,
+            'mean_edge_length': np.float64(self.mean_edge_length),
+            'edge_margin': np.float64(self.edge_margin),
+            'long_edges': self.long_edges,
+            'node_face': self.node_face
+        }
+
+    @staticmethod
+    def from_arrays(graph, arrays):
+        """
+        Builds the index of a graph from the output of to_arrays (the arrays
+        are used as they are, without copying or recomputing anything)
+        """
+        index = SpatialIndex.__new__(SpatialIndex)
+        index.graph = graph
+        index.coords = arrays['coords']
+        index.origin = arrays['origin']
+        index.extent = arrays['extent']
+        index.cell_size = float(arrays['cell_size'])
+        index.columns = int(arrays['columns'])
+        index.rows = int(arrays['rows'])
+        index.nodes = Ragged(arrays['nodes.offsets'], arrays['nodes.values'])
+        index.mean_edge_length = float(arrays['mean_edge_length'])
+        index.edge_margin = float(arrays['edge_margin'])
+        index.long_edges = arrays['long_edges']
+        index.node_face = arrays['node_face']
+        return index
+
+    def nbytes(self):
+        """
+        Number of bytes held by the index in this process (memory-mapped
+        arrays are shared, see graph_store)
+        """
+        return sum(private_nbytes(array) for array in self.to_arrays().values())
+
+    def cell_of(self, coords):
+        """
+        Returns the (unclamped) columns and rows of the cells of points
+        """
+        cells = np.floor((np.asarray(coords, dtype=np.float64) - self.origin) / self.cell_size)
+        # far away points stay far away without overflowing
+        cells = np.clip(cells, -2 ** 40, 2 ** 40)
+        return cells[..., 0].astype(np.int64), cells[..., 1].astype(np.int64)
+
+    def block(self, column_range, row_range):
+        """
+        Returns the nodes in the cells of a block (inclusive column and row
+        ranges, clamped to the grid)
+        """
+        first_column, last_column = max(column_range[0], 0), min(column_range[1], self.columns - 1)
+        first_row, last_row = max(row_range[0], 0), min(row_range[1], self.rows - 1)
+        if first_column > last_column or first_row > last_row:
+            return np.zeros(0, dtype=INDEX_DTYPE)
+        offsets = self.nodes.offsets
+        return np.concatenate([
+            self.nodes.values[
+                offsets[row * self.columns + first_column]:
+                offsets[row * self.columns + last_column + 1]
+            ]
+            for row in range(first_row, last_row + 1)
+        ])
+
+    def nearest(self, x_coord, y_coord):
+        """
+        Returns the index of the node nearest to a point (the smallest index
+        among nodes at the same distance) and its distance, (None, None) if
+        the graph has no nodes. Only the cells around the point are searched:
+        a node at distance d is at most ceil(d / cell_size) cells away
+        """
+        if not len(self):
+            return None, None
+        column, row = (int(cell) for cell in self.cell_of([x_coord, y_coord]))
+        # start from the first ring of cells that reaches the grid
+        radius = max(
+            0, -column, column - self.columns + 1, -row, row - self.rows + 1
+        )
+        while True:
+            candidates = self.block((column - radius, column + radius), (row - radius, row + radius))
+            if len(candidates):
+                offsets = self.coords[candidates] - (x_coord, y_coord)
+                squared = offsets[:, 0] ** 2 + offsets[:, 1] ** 2
+                best = squared.min()
+                distance = math.sqrt(best)
+                needed = int(math.ceil(distance / self.cell_size))
+                if needed <= radius:
+                    return int(candidates[squared == best].min()), distance
+                radius = needed
+            else:
+                radius += 1
+
+    def containing_face(self, x_coord, y_coord):
+        """
+        Returns the face (see GraphArrays.triangles) containing a point (on
+        its edges included), None if the point is outside the triangulation.
+        Walks the triangulation from a face of the nearest node, which is
+        next to the point in a Delaunay triangulation
+        """
+        index, _ = self.nearest(x_coord, y_coord)
+        if index is None or self.node_face[index] == -1:
+            return None
+        graph = self.graph
+        face = int(self.node_face[index])
+        start = 0
+        for _ in range(len(graph.triangles) + 1):
+            vertices = graph.triangles[face].tolist()
+            for offset in range(3):
+                i = (start + offset) % 3
+                a_x, a_y = graph.coords[vertices[i]].tolist()
+                b_x, b_y = graph.coords[vertices[(i + 1) % 3]].tolist()
+                if orient(a_x, a_y, b_x, b_y, x_coord, y_coord) < 0:
+                    face = int(graph.face_adjacency[face, i])
+                    if face == -1:
+                        return None
+                    break
+            else:
+                return face
+            start = (start + 1) % 3
+        # only reachable if the faces do not form a triangulation
+        return None
+
+    def in_rect(self, min_x, min_y, max_x, max_y):
+        """
+        Returns the indexes (sorted) of the nodes inside a rectangle, its
+        edges included
+        """
+        first_column, first_row = (int(cell) for cell in self.cell_of([min_x, min_y]))
+        last_column, last_row = (int(cell) for cell in self.cell_of([max_x, max_y]))
+        candidates = self.block((first_column, last_column), (first_row, last_row))
+        coords = self.coords[candidates]
+        inside = (
+            (coords[:, 0] >= min_x) & (coords[:, 0] <= max_x) &
+            (coords[:, 1] >= min_y) & (coords[:, 1] <= max_y)
+        )
+        return np.sort(candidates[inside])
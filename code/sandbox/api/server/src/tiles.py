@@ -0,0 +1,146 @@
+"""
+Square SVG tiles of a graph for zoomable viewers. Zoom level z splits the
+bounding square of the graph into 2^z by 2^z tiles, each only holding the
+elements that cross it, with less detail the further out it is
+"""
+
+import math
+import time
+
+import numpy as np
+
+from .metrics import METRICS
+
+# width and height of a tile (pixels)
+TILE_SIZE = 256
+MAX_ZOOM = 20
+# smallest scale (pixels per coordinate unit) at which nodes and their labels
+# are drawn, as they are in the full svg
+LABEL_SCALE = 1.0
+# below this average edge length (pixels), only the edges along every k-th
+# level are drawn, k growing as the edges get shorter
+MIN_EDGE_PIXELS = 4.0
+# how far node rectangles and labels reach from their node (coordinate units)
+NODE_MARGIN = 10
+
+
+def is_tile(zoom, column, row):
+    """
+    Checks whether a tile exists
+    """
+    return 0 <= zoom <= MAX_ZOOM and 0 <= column < 2 ** zoom and 0 <= row < 2 ** zoom
+
+
+def tile_grid(index):
+    """
+    Returns the origin and side of the square covered by the tile of zoom 0
+    (see SpatialIndex)
+    """
+    return index.origin.tolist(), max(float(index.extent.max()), 1.0)
+
+
+def tile_bounds(index, zoom, column, row):
+    """
+    Returns the (min_x, min_y, max_x, max_y) rectangle covered by a tile
+    """
+    (origin_x, origin_y), side = tile_grid(index)
+    size = side / 2 ** zoom
+    min_x, min_y = origin_x + column * size, origin_y + row * size
+    return min_x, min_y, min_x + size, min_y + size
+
+
+def tile_edges(graph, index, bounds):
+    """
+    Returns the nodes (origins and targets, node indexes) of the edges whose
+    bounding box crosses a rectangle, every edge once. Short edges are found
+    from the nodes around the rectangle, long ones are all checked (see
+    SpatialIndex.edge_margin)
+    """
+    min_x, min_y, max_x, max_y = bounds
+    margin = index.edge_margin
+    nodes = index.in_rect(min_x - margin, min_y - margin, max_x + margin, max_y + margin)
+    offsets = np.asarray(graph.adjacency.offsets)
+    starts = offsets[nodes]
+    degrees = offsets[nodes + 1] - starts
+    slots = np.repeat(starts - np.cumsum(degrees) + degrees, degrees) + np.arange(degrees.sum())
+    origins = np.repeat(nodes, degrees).astype(np.int64)
+    targets = np.asarray(graph.adjacency.values)[slots].astype(np.int64)
+
+    coords = index.coords
+    vectors = coords[targets] - coords[origins]
+    short = np.hypot(vectors[:, 0], vectors[:, 1]) <= margin
+    # an edge between two of the nodes is seen from both of them
+    position = np.minimum(np.searchsorted(nodes, targets), max(len(nodes) - 1, 0))
+    both = nodes[position] == targets if len(nodes) else np.zeros(0, dtype=bool)
+    once = short & (~both | (origins < targets))
+    origins = np.concatenate([origins[once], index.long_edges[:, 0]])
+    targets = np.concatenate([targets[once], index.long_edges[:, 1]])
+
+    a, b = coords[origins], coords[targets]
+    crossing = (
+        (np.minimum(a[:, 0], b[:, 0]) <= max_x) & (np.maximum(a[:, 0], b[:, 0]) >= min_x) &
+        (np.minimum(a[:, 1], b[:, 1]) <= max_y) & (np.maximum(a[:, 1], b[:, 1]) >= min_y)
+    )
+    return origins[crossing], targets[crossing]
+
+
+def path(coords, origins, targets, color):
+    """
+    Returns an SVG path drawing edges with a line width of one pixel at any
+    zoom
+    """
+    segments = ''.join(
+        'M{} {}L{} {}'.format(a_x, a_y, b_x, b_y)
+        for (a_x, a_y), (b_x, b_y) in zip(coords[origins].tolist(), coords[targets].tolist())
+    )
+    return (
+        "    <path d=\"{}\" style=\"stroke:{}; stroke-width: 1; fill: none;\" vector-effect=\"non-scaling-stroke\"/>\n" # pylint: disable=C0301
+        .format(segments, color)
+    )
+
+
+def iter_tile_svg(planar_graph, zoom, column, row): # pylint: disable=R0914
+    """
+    Generates the svg of a tile, element by element. Close up, edges and
+    nodes are drawn as in the full svg. Further out, nodes and labels are
+    dropped and edges are merged into one path per color (edges along a
+    level in white, the others in dark gray), and once edges are only a few
+    pixels long, only the edges along every k-th level are kept
+    """
+    render_start = time.perf_counter()
+    graph = planar_graph.graph
+    index = planar_graph.spatial_index
+    bounds = tile_bounds(index, zoom, column, row)
+    min_x, min_y, max_x, max_y = bounds
+    scale = TILE_SIZE / (max_x - min_x)
+
+    yield (
+        "<svg xmlns=\"http://www.w3.org/2000/svg\" xmlns:xlink=\"http://www.w3.org/1999/xlink\" width=\"{}px\" height=\"{}px\" viewBox=\"{} {} {} {}\">\n" # pylint: disable=C0301
+        .format(TILE_SIZE, TILE_SIZE, min_x, min_y, max_x - min_x, max_y - min_y)
+    )
+    yield "  <g>\n"
+
+    origins, targets = tile_edges(graph, index, bounds)
+    coords = np.asarray(graph.coords)
+    distance = np.asarray(graph.distance)
+    same_level = distance[origins] == distance[targets]
+    edge_pixels = index.mean_edge_length * scale
+    if scale >= LABEL_SCALE:
+        for origin, target in zip(origins.tolist(), targets.tolist()):
+            yield planar_graph.generate_line(origin, target, {}, {})
+        nodes = index.in_rect(
+            min_x - NODE_MARGIN, min_y - NODE_MARGIN, max_x + NODE_MARGIN, max_y + NODE_MARGIN
+        )
+        for node_id in nodes.tolist():
+            yield planar_graph.generate_node(node_id, 'white')
+    elif edge_pixels >= MIN_EDGE_PIXELS:
+        yield path(coords, origins[~same_level], targets[~same_level], '#222')
+        yield path(coords, origins[same_level], targets[same_level], 'white')
+    else:
+        stride = int(math.ceil(MIN_EDGE_PIXELS / max(edge_pixels, 1e-9)))
+        kept = same_level & (distance[origins] % stride == 0)
+        yield path(coords, origins[kept], targets[kept], 'white')
+
+    yield "  </g>\n"
+    yield "</svg>"
+    METRICS.record_stage('generate_tile', time.perf_counter() - render_start)
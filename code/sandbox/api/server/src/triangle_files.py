@@ -0,0 +1,215 @@
+"""
+Import and export of triangulations in the file formats used by the
+"triangle" library (https://www.cs.cmu.edu/~quake/triangle.html)
+"""
+
+import mmap
+import os
+
+import numpy as np
+
+from .delaunay import Triangulation
+
+
+def format_coord(value):
+    """
+    Writes whole numbers without a trailing ".0" (like triangle does)
+    """
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def hull_edge_markers(triangulation):
+    """
+    Returns a boundary marker (1 or 0) per edge: hull edges belong to exactly
+    one triangle
+    """
+    triangles = triangulation.triangles
+    sides = np.concatenate([triangles[:, [0, 1]], triangles[:, [1, 2]], triangles[:, [2, 0]]])
+    sides, counts = np.unique(np.sort(sides, axis=1), axis=0, return_counts=True)
+    single = sides[counts == 1]
+    edges = triangulation.edges
+    keys = edges[:, 0] * len(triangulation.nodes) + edges[:, 1]
+    single_keys = single[:, 0] * len(triangulation.nodes) + single[:, 1]
+    return np.isin(keys, single_keys).astype(int)
+
+
+def write_node_file(filepath, nodes, markers=None):
+    """
+    Writes a .node file (ids start at 1). If markers is given a boundary
+    marker column is added
+    """
+    with open(filepath, 'w') as node_file:
+        node_file.write("{}  2  0  {}\n".format(len(nodes), 0 if markers is None else 1))
+        for index, (x_coord, y_coord) in enumerate(nodes.tolist()):
+            line = "{:4d}    {}  {}".format(index + 1, format_coord(x_coord), format_coord(y_coord))
+            if markers is not None:
+                line += "    {}".format(int(markers[index]))
+            node_file.write(line + "\n")
+        node_file.close()
+
+
+def write_triangle_files(directory, triangulation):
+    """
+    Writes the triangulation the same way "triangle -e triangle.node" would:
+    triangle.node (input points), triangle.1.node, triangle.1.edge and
+    triangle.1.ele
+    """
+    write_node_file('{}/triangle.node'.format(directory), triangulation.nodes)
+    write_node_file('{}/triangle.1.node'.format(directory), triangulation.nodes, triangulation.is_boundary)
+
+    with open('{}/triangle.1.edge'.format(directory), 'w') as edge_file:
+        edge_file.write("{}  1\n".format(len(triangulation.edges)))
+        markers = hull_edge_markers(triangulation)
+        for index, (node_1, node_2) in enumerate(triangulation.edges.tolist()):
+            edge_file.write("{:4d}   {}  {}  {}\n".format(index + 1, node_1 + 1, node_2 + 1, markers[index]))
+        edge_file.close()
+
+    with open('{}/triangle.1.ele'.format(directory), 'w') as ele_file:
+        ele_file.write("{}  3  0\n".format(len(triangulation.triangles)))
+        for index, (node_1, node_2, node_3) in enumerate(triangulation.triangles.tolist()):
+            ele_file.write("{:4d}    {:4d}  {:4d}  {:4d}\n".format(index + 1, node_1 + 1, node_2 + 1, node_3 + 1))
+        ele_file.close()
+
+
+def parse_numbers(text, space):
+    """
+    Returns the numbers of a text (array of bytes) separated by the bytes
+    marked in space. Integers are parsed with array operations, anything
+    else (decimals, exponents) falls back to floats
+    """
+    # numbers start and end where space changes
+    bounds = np.flatnonzero(np.diff(np.concatenate([[True], space, [True]])))
+    starts, ends = bounds[0::2], bounds[1::2]
+    first_bytes = text[starts]
+    first = starts + ((first_bytes == ord('-')) | (first_bytes == ord('+')))
+    lengths = ends - first
+    # every byte of the numbers is a digit (but their signs) if they are all
+    # integers. Bytes below "0" wrap around, and digits in comments (marked
+    # in space) do not count
+    if np.count_nonzero(((text - ord('0')) < 10) & ~space) != np.sum(lengths):
+        return np.array(b' '.join(
+            text[start:end].tobytes() for start, end in zip(starts.tolist(), ends.tolist())
+        ).split()).astype(np.float64)
+    numbers = np.zeros(len(starts), dtype=np.int64)
+    # numbers of the same length are gathered into a matrix of digits
+    for length in np.flatnonzero(np.bincount(lengths)).tolist():
+        selected = np.flatnonzero(lengths == length)
+        digits = text[first[selected, None] + np.arange(length)] - np.uint8(ord('0'))
+        numbers[selected] = digits.astype(np.int64) @ 10 ** np.arange(length - 1, -1, -1)
+    numbers[first_bytes == ord('-')] *= -1
+    return numbers
+
+
+def read_numbers(filepath):
+    """
+    Returns every number of a triangle file (comments, from "#" to the end
+    of the line, removed), as integers if they all are and as floats
+    otherwise. The file is memory mapped and parsed with array operations
+    """
+    if os.path.getsize(filepath) == 0:
+        return np.zeros(0, dtype=np.int64)
+    with open(filepath, 'rb') as infile:
+        with mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            text = np.frombuffer(data, dtype=np.uint8)
+            # whitespace (tabs and carriage returns included) and commas separate numbers
+            space = (text <= ord(' ')) | (text == ord(','))
+            if data.find(b'#') != -1:
+                # a byte is in a comment if a "#" came before it on its line
+                is_hash = text == ord('#')
+                is_newline = text == ord('\n')
+                hashes = np.cumsum(is_hash)
+                line_starts = np.flatnonzero(np.concatenate([[True], is_newline[:-1]]))
+                line_ids = np.cumsum(np.concatenate([[False], is_newline[:-1]]))
+                space |= hashes > (hashes - is_hash)[line_starts][line_ids]
+            numbers = parse_numbers(text, space)
+            # the map can only be closed once nothing points into it
+            del text
+        infile.close()
+    return numbers
+
+
+def to_integers(numbers, filepath):
+    """
+    Converts numbers to integers
+    """
+    if numbers.dtype.kind == 'f' and not np.all(numbers == np.round(numbers)):
+        raise ValueError('{}: expected integers'.format(filepath))
+    return numbers.astype(np.int64)
+
+
+def read_table(filepath, header_size, columns):
+    """
+    Returns the header (header_size integers) and the rows of a triangle
+    file. columns(header) is the number of numbers per row
+    """
+    numbers = read_numbers(filepath)
+    if len(numbers) < header_size:
+        raise ValueError('{}: incomplete header'.format(filepath))
+    header = to_integers(numbers[:header_size], filepath).tolist()
+    width = columns(header)
+    body = numbers[header_size:]
+    if len(body) != header[0] * width:
+        raise ValueError('{}: expected {} rows of {} numbers'.format(filepath, header[0], width))
+    return header, body.reshape(-1, width)
+
+
+def read_node_file(filepath):
+    """
+    Reads a .node file. Returns the id of its first node (0 or 1, as
+    triangle -z numbers from 0), the coordinates (integers if they all are),
+    the attributes and the boundary markers (None if there are none)
+    """
+    header, rows = read_table(filepath, 4, lambda header: 3 + header[2] + header[3])
+    ids = to_integers(rows[:, 0], filepath)
+    coords = rows[:, 1:3]
+    if coords.dtype.kind == 'f' and np.all(coords == np.round(coords)):
+        coords = coords.astype(np.int64)
+    attributes = rows[:, 3:3 + header[2]].astype(np.float64)
+    markers = to_integers(rows[:, 3 + header[2]], filepath) if header[3] else None
+    return (int(ids[0]) if len(ids) else 1), coords, attributes, markers
+
+
+def read_edge_file(filepath, first_id=1):
+    """
+    Reads a .edge file. Returns the edges (node indexes, from 0) and the
+    boundary markers (None if there are none)
+    """
+    header, rows = read_table(filepath, 2, lambda header: 3 + header[1])
+    rows = to_integers(rows, filepath)
+    return rows[:, 1:3] - first_id, (rows[:, 3] if header[1] else None)
+
+
+def read_ele_file(filepath, first_id=1):
+    """
+    Reads a .ele file. Returns the triangles (node indexes, from 0: only the
+    corners of second order triangles)
+    """
+    _, rows = read_table(filepath, 3, lambda header: 1 + header[1] + header[2])
+    return to_integers(rows[:, 1:4], filepath) - first_id
+
+
+def read_triangle_files(node_filepath, edge_filepath, ele_filepath=None):
+    """
+    Reads the output of triangle into a triangulation. Nodes with a non
+    zero boundary marker are on the boundary (without markers, the nodes of
+    the triangle sides used once are). The triangles are None if there is
+    no .ele file
+    """
+    first_id, coords, _, markers = read_node_file(node_filepath)
+    edges, _ = read_edge_file(edge_filepath, first_id)
+    triangles = None
+    if ele_filepath is not None and os.path.exists(ele_filepath):
+        triangles = read_ele_file(ele_filepath, first_id)
+
+    if markers is not None:
+        is_boundary = markers != 0
+    else:
+        is_boundary = np.zeros(len(coords), dtype=bool)
+        if triangles is not None:
+            sides = np.sort(np.concatenate([
+                triangles[:, [0, 1]], triangles[:, [1, 2]], triangles[:, [2, 0]]
+            ]), axis=1)
+            sides, counts = np.unique(sides, axis=0, return_counts=True)
+            is_boundary[sides[counts == 1].ravel()] = True
+    return Triangulation(coords, edges, is_boundary, triangles)
@@ -0,0 +1,110 @@
+"""
+Tests of the incremental point insertion and removal
+"""
+
+import random
+import unittest
+
+import numpy as np
+
+from src.delaunay import triangulate
+from src.maximally_connected_planar_graph import MaximallyConnectedPlanarGraph
+
+
+def planar_graph(points):
+    """
+    Builds the graph of some points in memory (without storing it)
+    """
+    graph = MaximallyConnectedPlanarGraph.__new__(MaximallyConnectedPlanarGraph)
+    graph.progress = None
+    graph.is_stored = False
+    graph.reset_views()
+    graph.graph = graph.parse_triangulation(triangulate(np.array(points, dtype=np.float64)))
+    return graph
+
+
+def level_elements(graph, ragged, level_offsets):
+    """
+    Returns the node sets of the level cycles or paths of every level
+    """
+    rows = ragged.tolist()
+    return [
+        sorted(sorted(row) for row in rows[level_offsets[level]:level_offsets[level + 1]])
+        for level in range(len(graph.levels))
+    ]
+
+
+class GraphEditTest(unittest.TestCase):
+    """
+    Edited graphs are the graphs built from scratch from the same points
+    """
+    def assert_same_graph(self, edited, rebuilt):
+        """
+        Compares two graphs, up to the order of the level elements
+        """
+        edited, rebuilt = edited.graph, rebuilt.graph
+        np.testing.assert_array_equal(edited.coords, rebuilt.coords)
+        self.assertEqual(edited.adjacency.tolist(), rebuilt.adjacency.tolist())
+        np.testing.assert_array_equal(edited.is_boundary, rebuilt.is_boundary)
+        np.testing.assert_array_equal(edited.distance, rebuilt.distance)
+        self.assertEqual(
+            [sorted(level) for level in edited.levels.tolist()],
+            [sorted(level) for level in rebuilt.levels.tolist()]
+        )
+        self.assertEqual(
+            level_elements(edited, edited.cycles, edited.level_cycle_offsets),
+            level_elements(rebuilt, rebuilt.cycles, rebuilt.level_cycle_offsets)
+        )
+        self.assertEqual(
+            level_elements(edited, edited.paths, edited.level_path_offsets),
+            level_elements(rebuilt, rebuilt.paths, rebuilt.level_path_offsets)
+        )
+        self.assertEqual(edited.betweener_paths.tolist(), rebuilt.betweener_paths.tolist())
+        self.assertEqual(len(edited.triangles), len(rebuilt.triangles))
+
+    def test_random_edits(self):
+        """
+        random insertions and removals give the graph of the remaining points
+        """
+        rng = random.Random(1)
+        points = [(rng.uniform(0, 1000), rng.uniform(0, 1000)) for _ in range(60)]
+        graph = planar_graph(points)
+        for _ in range(40):
+            if rng.random() < 0.5:
+                point = (rng.uniform(-200, 1200), rng.uniform(-200, 1200))
+                self.assertEqual(graph.insert_point(*point), len(points) + 1)
+                points.append(point)
+            else:
+                node_id = rng.randrange(len(points)) + 1
+                moved_from = graph.remove_point(node_id)
+                # the last node takes the id of the removed one
+                points[node_id - 1] = points[-1]
+                points.pop()
+                self.assertEqual(moved_from, None if node_id == len(points) + 1 else len(points) + 1)
+            self.assert_same_graph(graph, planar_graph(points))
+
+    def test_remove_keeps_ids(self):
+        """
+        removing a node only changes the id of the last node
+        """
+        rng = random.Random(2)
+        points = [(rng.uniform(0, 100), rng.uniform(0, 100)) for _ in range(20)]
+        graph = planar_graph(points)
+        self.assertEqual(graph.remove_point(5), 20)
+        np.testing.assert_array_equal(graph.graph.coords[:4], points[:4])
+        np.testing.assert_array_equal(graph.graph.coords[4], points[19])
+        np.testing.assert_array_equal(graph.graph.coords[5:], points[5:19])
+        self.assertIsNone(graph.remove_point(19))
+        self.assertEqual(len(graph.graph), 18)
+
+    def test_insert_existing_point(self):
+        """
+        a point already in the graph cannot be inserted again
+        """
+        graph = planar_graph([(0, 0), (10, 0), (0, 10), (10, 10)])
+        with self.assertRaises(ValueError):
+            graph.insert_point(10, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+"""
+Tests of the triangle file reader
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from src.triangle_files import read_node_file
+
+
+class ReadNodeFileTest(unittest.TestCase):
+    """
+    Reading .node files with comments
+    """
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, text):
+        """
+        Writes a .node file, returning its path
+        """
+        filepath = os.path.join(self.directory, 'triangle.1.node')
+        with open(filepath, 'w') as outfile:
+            outfile.write(text)
+        return filepath
+
+    def test_decimals_with_commented_digits(self):
+        """
+        digits in comments do not make up for the dots of decimals
+        """
+        filepath = self.write(
+            '2  2  0  0\n'
+            '1 1.5 2\n'
+            '2 3.5 4\n'
+            '# Generated by triangle -q30\n'
+        )
+        _, coords, _, _ = read_node_file(filepath)
+        np.testing.assert_array_equal(coords, [[1.5, 2], [3.5, 4]])
+
+    def test_integers_with_commented_digits(self):
+        """
+        integers are still read as integers with digits in comments
+        """
+        filepath = self.write(
+            '2  2  0  1\n'
+            '   1    10  20    1\n'
+            '   2    30  40    0\n'
+            '# Generated by triangle -e data/41704775293917760/triangle.node\n'
+        )
+        first_id, coords, _, markers = read_node_file(filepath)
+        self.assertEqual(first_id, 1)
+        self.assertEqual(coords.dtype, np.int64)
+        np.testing.assert_array_equal(coords, [[10, 20], [30, 40]])
+        np.testing.assert_array_equal(markers, [1, 0])
+
+
+if __name__ == '__main__':
+    unittest.main()
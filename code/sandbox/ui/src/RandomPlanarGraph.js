@@ -29,6 +29,9 @@ export default class RandomPlanarGraph extends Component {
     sliceOrigin: null,
     mode: this.MODES[0],
     graphData: null,
+    generatedSeed: null,
+    job: null,
+    jobError: null,
   }
 
   componentDidMount() {
@@ -36,14 +39,41 @@ export default class RandomPlanarGraph extends Component {
   }
 
   componentDidUpdate(prevProps, prevState) {
-    if (this.state.seed && (prevState.seed !== this.state.seed)) {
-      this.getGraphs();
-      this.getGraphData(this.state.seed).then(graphData => {
-        this.setState({ graphData });
+    const { seed } = this.state;
+    if (seed && (prevState.seed !== seed)) {
+      this.setState({ generatedSeed: null, graphData: null, job: null, jobError: null });
+      this.generateGraph(seed).then(() => {
+        if (this.state.seed !== seed) return;
+        this.setState({ generatedSeed: seed, job: null });
+        this.getGraphs();
+        return this.getGraphData(seed).then(graphData => {
+          this.setState({ graphData });
+        });
+      }).catch(error => {
+        if (this.state.seed === seed) this.setState({ job: null, jobError: error.message });
       });
     }
   }
 
+  // queues the generation of a graph (answered right away if it is already
+  // stored) and waits for its job
+  generateGraph(seed) {
+    const { numPointsInNewGraph } = this.state;
+    return fetch(api.url + `/planar-graphs/${seed}?num-points=${numPointsInNewGraph}`, {
+      method: 'POST'
+    }).then(res => res.json()).then(job => this.waitForJob(seed, job));
+  }
+
+  waitForJob(seed, job) {
+    if (job.status === 'done') return Promise.resolve(job);
+    if (job.status === 'failed') return Promise.reject(new Error(job.error));
+    if (this.state.seed !== seed) return Promise.resolve(job);
+    this.setState({ job });
+    return new Promise(resolve => setTimeout(resolve, 1000)).then(
+      () => fetch(api.url + `/jobs/${job.id}`)
+    ).then(res => res.json()).then(job => this.waitForJob(seed, job));
+  }
+
   createNewGraph() {
     this.setState({ seed: this.generateSeed() });
   }
@@ -57,12 +87,11 @@ export default class RandomPlanarGraph extends Component {
   }
 
   getUrl() {
-    const { seed, sliceOrigin, colors, numPointsInNewGraph, mode } = this.state;
+    const { seed, sliceOrigin, colors, mode } = this.state;
     let url = api.url + `/planar-graphs/${seed}/graph.svg`;
     const query = [];
     if (sliceOrigin) query.push(`slice-origin-id=${sliceOrigin}`);
     if (mode === 'reverseStrip') query.push('reverse-slice=True');
-    if (numPointsInNewGraph) query.push(`num-points=${numPointsInNewGraph}`);
     if (colors) {
       Object.keys(colors).forEach((id) => {
         query.push(`${id}=${colors[id]}`);
@@ -139,7 +168,9 @@ export default class RandomPlanarGraph extends Component {
   }
 
   render() {
-    const { mode, seed, numPointsInNewGraph, selectedColor, graphData } = this.state;
+    const {
+      mode, seed, numPointsInNewGraph, selectedColor, graphData, generatedSeed, job, jobError
+    } = this.state;
     return (
       <div className='row'>
         <div className='column'>
@@ -161,6 +192,8 @@ export default class RandomPlanarGraph extends Component {
             <label>Points in new graph:</label>
             <input value={numPointsInNewGraph} onChange={this.setNumPointsInNewGraph} />
             <button onClick={this.createNewGraph}>Create Graph</button>
+            { job && <span>Generating ({job.stage || job.status}): {Math.round(job.progress * 100)}%</span> }
+            { jobError && <span>Generation failed: {jobError}</span> }
           </div>
           <div className='row'>
             <button onClick={this.toggleMode}>Mode: {mode}</button>
@@ -180,7 +213,7 @@ export default class RandomPlanarGraph extends Component {
               SVGBackground='transparent'
               background='transparent'>
               <svg width={1500} height={1000}>
-                { seed && <SvgLoader path={this.getUrl()} onSVGReady={this.registerClickHandlers} /> }
+                { seed && seed === generatedSeed && <SvgLoader path={this.getUrl()} onSVGReady={this.registerClickHandlers} /> }
               </svg>
             </UncontrolledReactSVGPanZoom>
           </div>
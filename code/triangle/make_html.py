@@ -1,38 +1,37 @@
+def read_rows(filename):
+    # rows of a triangle file split in columns, header first, without comments
+    with open(filename) as f:
+        rows = [line.split('#')[0].split() for line in f]
+        f.close()
+    return [row for row in rows if row]
+
+def number(text):
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
 nodes = {}
 edges = []
 current_distance = []
 
-with open('test.1.node') as f:
-    header = True
-    for line in f:
-        if header:
-            header = False
-            continue
-        content = list(filter(lambda a: bool(a), line.split(' ')))
-        if not '#' in content[0]:
-            is_boundary = content[3] == '1\n'
-            nodes[content[0]] = {
-                'coords': [int(content[1]), int(content[2])],
-                'is_boundary': is_boundary,
-                'distance': 0 if is_boundary else None,
-                'relations': []
-            }
-            if is_boundary:
-                current_distance.append(content[0])
-    f.close()
-
-with open('test.1.edge') as f:
-    header = True
-    for line in f:
-        if header:
-            header = False
-            continue
-        content = list(filter(lambda a: bool(a), line.split(' ')))
-        if not '#' in content[0]:
-            edges.append([content[1], content[2]])
-            nodes[content[1]]['relations'].append(content[2])
-            nodes[content[2]]['relations'].append(content[1])
-    f.close()
+node_rows = read_rows('test.1.node')
+num_attributes, has_markers = int(node_rows[0][2]), node_rows[0][3] == '1'
+for row in node_rows[1:]:
+    is_boundary = has_markers and row[3 + num_attributes] != '0'
+    nodes[row[0]] = {
+        'coords': [number(row[1]), number(row[2])],
+        'is_boundary': is_boundary,
+        'distance': 0 if is_boundary else None,
+        'relations': []
+    }
+    if is_boundary:
+        current_distance.append(row[0])
+
+for row in read_rows('test.1.edge')[1:]:
+    edges.append([row[1], row[2]])
+    nodes[row[1]]['relations'].append(row[2])
+    nodes[row[2]]['relations'].append(row[1])
 
 
 all = {}